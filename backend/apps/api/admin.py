@@ -1,7 +1,9 @@
 from django.contrib import admin, messages
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from apps.api import models
+from apps.api.utils import certificate_bundle_response
 
 
 @admin.action(description=_("Marcar como presente"))
@@ -30,6 +32,35 @@ def attendee_absent(modeladmin, request, queryset):
     )
 
 
+@admin.action(description=_("Baixar certificados (ZIP)"))
+def download_certificates_zip(modeladmin, request, queryset):
+    """
+    Download the generated certificates of the selected events or tutorials as a ZIP archive.
+    """
+    return certificate_bundle_response(modeladmin.certificate_registrations(queryset), "zip", "certificados")
+
+
+@admin.action(description=_("Baixar certificados (PDF único)"))
+def download_certificates_pdf(modeladmin, request, queryset):
+    """
+    Download the generated certificates of the selected events or tutorials merged in a single PDF.
+    """
+    return certificate_bundle_response(modeladmin.certificate_registrations(queryset), "pdf", "certificados")
+
+
+@admin.action(description=_("Reenviar e-mails"))
+def retry_emails(modeladmin, request, queryset):
+    """
+    Queue the selected emails to be delivered again, right away.
+    """
+    count = queryset.update(status=models.OutboxEmail.Status.PENDING, attempts=0, next_attempt_at=timezone.now())
+    modeladmin.message_user(
+        request,
+        _(f"{count} e-mail(s) na fila para envio."),
+        messages.SUCCESS,
+    )
+
+
 class EventCertificateSignerInline(admin.TabularInline):
     model = models.EventCertificateSigner
     extra = 1
@@ -62,14 +93,41 @@ class AttendeeAdmin(admin.ModelAdmin):
 class EventAdmin(admin.ModelAdmin):
     search_fields = ("title", "slug")
     inlines = [EventCertificateSignerInline]
+    actions = [download_certificates_zip, download_certificates_pdf]
+
+    def certificate_registrations(self, queryset):
+        return models.Registration.objects.filter(tutorial__event__in=queryset)
 
 
 class TutorialAdmin(admin.ModelAdmin):
-    list_display = ("title", "event", "start_datetime", "end_datetime")
+    list_display = ("title", "event", "start_datetime", "end_datetime", "vacancies", "confirmed_count")
     search_fields = ("title", "event__title")
     list_filter = ("event__title",)
     ordering = ("-start_datetime", "title")
     autocomplete_fields = ("event",)
+    actions = [download_certificates_zip, download_certificates_pdf]
+
+    def certificate_registrations(self, queryset):
+        return models.Registration.objects.filter(tutorial__in=queryset)
+
+
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_per_page = 50
+    list_display = ("registration", "kind", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("kind", "status")
+    search_fields = ("registration__attendee__full_name", "registration__attendee__email")
+    ordering = ("-created_at",)
+    readonly_fields = ("registration", "kind", "attempts", "created_at", "sent_at", "last_error")
+    actions = [retry_emails]
+
+
+class SubscriptionRequestAdmin(admin.ModelAdmin):
+    list_per_page = 50
+    list_display = ("cpf", "full_name", "tutorial", "status", "created_at", "processed_at")
+    list_filter = ("status", "tutorial__event__title")
+    search_fields = ("cpf", "full_name", "email")
+    ordering = ("-created_at",)
+    readonly_fields = ("ticket", "registration", "error", "created_at", "processed_at")
 
 
 admin.site.register(models.Tutorial, TutorialAdmin)
@@ -77,3 +135,5 @@ admin.site.register(models.Attendee, AttendeeAdmin)
 admin.site.register(models.Instructor)
 admin.site.register(models.CertificateSigner)
 admin.site.register(models.Registration, RegistrationAdmin)
+admin.site.register(models.OutboxEmail, OutboxEmailAdmin)
+admin.site.register(models.SubscriptionRequest, SubscriptionRequestAdmin)
@@ -8,3 +8,6 @@ class ApiConfig(AppConfig):
     def ready(self):
         # Import signals to ensure they are registered
         import apps.api.signals  # noqa
+        from apps.api.throttling import check_rates
+
+        check_rates()
@@ -0,0 +1,68 @@
+"""Cached event detail documents and the version stamps that invalidate them."""
+
+import secrets
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+def event_document_key(slug):
+    return f"event:{slug}"
+
+
+def event_version_key(slug=None):
+    return f"event-version:{slug or '*'}"
+
+
+def new_event_version():
+    return secrets.token_hex(8)
+
+
+def event_version(slug=None):
+    """
+    Version stamp of the detail document of the event, or of every event and tutorial when no slug is given.
+
+    The stamp is replaced by :func:`forget_event_documents` whenever the data it covers changes.
+    """
+    return caches["events"].get_or_set(event_version_key(slug), new_event_version, timeout=None)
+
+
+def get_event_document(slug, version):
+    """
+    The cached detail document of the event (event and tutorials, as the API returns them), if it was built for
+    this version of the event, or None.
+    """
+    if settings.EVENT_CACHE_TIMEOUT <= 0:
+        return None
+    cached = caches["events"].get(event_document_key(slug))
+    if cached is None or cached[0] != version:
+        return None
+    return cached[1]
+
+
+def set_event_document(slug, version, document):
+    """
+    Cache the detail document of the event, built for this version of the event, for at most
+    ``EVENT_CACHE_TIMEOUT`` seconds, which bounds how stale it may get when an invalidation is missed.
+    """
+    if settings.EVENT_CACHE_TIMEOUT > 0:
+        caches["events"].set(event_document_key(slug), (version, document), timeout=settings.EVENT_CACHE_TIMEOUT)
+
+
+def forget_event_documents(*slugs):
+    """
+    Drop the cached detail documents of the events and replace their version stamps, and the one of every event,
+    once the current transaction commits, so no request caches again the data being replaced.
+    """
+    slugs = [slug for slug in slugs if slug]
+    if not slugs:
+        return
+
+    def forget():
+        cache = caches["events"]
+        cache.delete_many([event_document_key(slug) for slug in slugs])
+        versions = [event_version_key(slug) for slug in slugs] + [event_version_key()]
+        cache.set_many({key: new_event_version() for key in versions}, timeout=None)
+
+    transaction.on_commit(forget)
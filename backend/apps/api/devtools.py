@@ -0,0 +1,304 @@
+"""Asyncio renderer printing HTML to PDF in many tabs of a headless Chrome, through the DevTools protocol."""
+
+import asyncio
+import base64
+import itertools
+import json
+import logging
+import shutil
+import subprocess
+import tempfile
+import threading
+
+import websockets
+
+from apps.api.pdf import normalize
+
+CHROME_EXECUTABLES = ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome")
+
+
+def find_chrome(path=""):
+    """
+    Returns the Chrome executable: the given path or the first known Chrome executable found on ``PATH``.
+    """
+    path = path or next(filter(None, map(shutil.which, CHROME_EXECUTABLES)), None)
+    if not path:
+        raise RuntimeError("Chrome não encontrado, defina CHROME_PATH.")
+    return path
+
+
+class DevToolsError(RuntimeError):
+    """
+    Raised when the browser answers a command with an error or the connection to it is lost.
+    """
+
+
+class DevToolsRenderer:
+    """
+    A single headless Chrome, driven through the DevTools protocol, printing each document in a tab of its own.
+
+    The browser is started on first use and restarted if its connection is lost. At most ``max_tabs`` documents
+    are printed at the same time; other documents wait for a tab to be closed.
+    """
+
+    def __init__(self, executable, max_tabs=4, timeout=60):
+        self.executable = executable
+        self.timeout = timeout
+        self._tabs = asyncio.Semaphore(max_tabs)
+        self._start_lock = asyncio.Lock()
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._waiters = {}
+        self._process = None
+        self._profile = None
+        self._connection = None
+        self._tasks = []
+
+    @property
+    def connected(self):
+        return self._connection is not None and not self._tasks[0].done()
+
+    async def start(self):
+        """
+        Starts the browser and connects to it.
+        """
+        self._profile = tempfile.mkdtemp(prefix="pyaba-chrome-")
+        self._process = await asyncio.create_subprocess_exec(
+            self.executable,
+            "--headless",
+            "--no-sandbox",
+            "--disable-gpu",
+            "--disable-dev-shm-usage",
+            "--remote-debugging-port=0",
+            f"--user-data-dir={self._profile}",
+            "about:blank",
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        url = await asyncio.wait_for(self._read_devtools_url(), self.timeout)
+        await self.connect(url)
+        self._tasks.append(asyncio.create_task(self._drain_stderr()))
+
+    async def _read_devtools_url(self):
+        while line := await self._process.stderr.readline():
+            text = line.decode(errors="replace").strip()
+            if text.startswith("DevTools listening on "):
+                return text.removeprefix("DevTools listening on ")
+        raise DevToolsError("O navegador encerrou antes de abrir o DevTools.")
+
+    async def _drain_stderr(self):
+        while await self._process.stderr.readline():
+            pass
+
+    async def connect(self, url):
+        """
+        Connects to the browser DevTools endpoint at the given websocket URL.
+        """
+        self._connection = await websockets.connect(url, max_size=None)
+        self._tasks = [asyncio.create_task(self._read_messages())]
+
+    async def _read_messages(self):
+        try:
+            async for raw_message in self._connection:
+                message = json.loads(raw_message)
+                if "id" in message:
+                    future = self._pending.pop(message["id"], None)
+                    if future is None or future.done():
+                        continue
+                    if "error" in message:
+                        future.set_exception(DevToolsError(message["error"].get("message", message["error"])))
+                    else:
+                        future.set_result(message.get("result", {}))
+                else:
+                    for future in self._waiters.pop((message.get("sessionId"), message.get("method")), []):
+                        if not future.done():
+                            future.set_result(message.get("params", {}))
+        except websockets.ConnectionClosed as e:
+            logging.warning("Conexão com o navegador encerrada: %s", e)
+        finally:
+            futures = list(self._pending.values()) + [
+                future for waiters in self._waiters.values() for future in waiters
+            ]
+            self._pending.clear()
+            self._waiters.clear()
+            for future in futures:
+                if not future.done():
+                    future.set_exception(DevToolsError("Conexão com o navegador encerrada."))
+
+    async def send(self, method, params=None, session_id=None):
+        """
+        Sends a DevTools command, to the browser or to the tab of ``session_id``, and returns its result.
+        """
+        message = {"id": next(self._ids), "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message["id"]] = future
+        try:
+            await self._connection.send(json.dumps(message))
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self._pending.pop(message["id"], None)
+
+    def expect(self, method, session_id=None):
+        """
+        Returns a future resolved with the parameters of the next ``method`` event of the session.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault((session_id, method), []).append(future)
+        return future
+
+    def forget(self, future, method, session_id=None):
+        """
+        Stops waiting for an event expected with :meth:`expect`, e.g. once waiting for it timed out.
+        """
+        waiters = self._waiters.get((session_id, method), [])
+        if future in waiters:
+            waiters.remove(future)
+        if not waiters:
+            self._waiters.pop((session_id, method), None)
+
+    async def ensure_started(self):
+        async with self._start_lock:
+            if not self.connected:
+                await self.close()
+                await self.start()
+
+    async def print_to_pdf(self, html_content, page_width=8.27, page_height=11.69):
+        """
+        Prints an HTML content to PDF in a new tab.
+
+        :param html_content: HTML content to convert.
+        :param page_width: Width of the PDF page in inches.
+        :param page_height: Height of the PDF page in inches.
+        :return: Normalized PDF content as bytes.
+        """
+        pdf_content, _result = await self.print_with_script(html_content, None, page_width, page_height)
+        return pdf_content
+
+    async def print_with_script(self, html_content, script, page_width=8.27, page_height=11.69):
+        """
+        Prints an HTML content to PDF in a new tab, running a script on the loaded page right before printing it.
+
+        :param script: Body of a JavaScript function, as given to Selenium's ``execute_script``, or None.
+        :return: Tuple with the normalized PDF content and the value returned by the script.
+        """
+        await self.ensure_started()
+
+        async with self._tabs:
+            target_id = (await self.send("Target.createTarget", {"url": "about:blank"}))["targetId"]
+            try:
+                attached = await self.send("Target.attachToTarget", {"targetId": target_id, "flatten": True})
+                session_id = attached["sessionId"]
+                await self.send("Page.enable", session_id=session_id)
+
+                with tempfile.NamedTemporaryFile(suffix=".html") as temp_html_file:
+                    temp_html_file.write(html_content.encode("utf-8"))
+                    temp_html_file.flush()
+
+                    loaded = self.expect("Page.loadEventFired", session_id)
+                    try:
+                        await self.send("Page.navigate", {"url": f"file://{temp_html_file.name}"}, session_id)
+                        await asyncio.wait_for(loaded, self.timeout)
+                    finally:
+                        self.forget(loaded, "Page.loadEventFired", session_id)
+
+                await self.send(
+                    "Runtime.evaluate",
+                    {"expression": "document.fonts.ready.then(() => true)", "awaitPromise": True},
+                    session_id,
+                )
+                result = None
+                if script:
+                    evaluated = await self.send(
+                        "Runtime.evaluate",
+                        {"expression": f"(() => {{{script}}})()", "returnByValue": True},
+                        session_id,
+                    )
+                    if "exceptionDetails" in evaluated:
+                        raise DevToolsError(evaluated["exceptionDetails"].get("text", "Erro ao executar o script."))
+                    result = evaluated["result"].get("value")
+                pdf_content = await self.send(
+                    "Page.printToPDF",
+                    {
+                        "printBackground": True,
+                        "paperWidth": page_width,
+                        "paperHeight": page_height,
+                        "marginTop": 0,
+                        "marginBottom": 0,
+                        "marginLeft": 0,
+                        "marginRight": 0,
+                    },
+                    session_id,
+                )
+            finally:
+                if self.connected:
+                    try:
+                        await self.send("Target.closeTarget", {"targetId": target_id})
+                    except Exception as e:
+                        logging.warning("Erro ao fechar a aba %s do navegador: %s", target_id, e)
+
+        return await asyncio.to_thread(normalize, base64.b64decode(pdf_content["data"])), result
+
+    async def print_many(self, html_documents, page_width=8.27, page_height=11.69):
+        """
+        Prints many HTML contents to PDF concurrently, each in its own tab.
+
+        :return: List with the PDF content of each document, in the same order.
+        """
+        return await asyncio.gather(
+            *(self.print_to_pdf(html_content, page_width, page_height) for html_content in html_documents)
+        )
+
+    async def close(self):
+        """
+        Disconnects from the browser and shuts it down.
+        """
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+        if self._process is not None:
+            if self._process.returncode is None:
+                self._process.terminate()
+                try:
+                    await asyncio.wait_for(self._process.wait(), self.timeout)
+                except asyncio.TimeoutError:
+                    self._process.kill()
+            self._process = None
+        if self._profile is not None:
+            shutil.rmtree(self._profile, ignore_errors=True)
+            self._profile = None
+
+
+class SyncDevToolsRenderer:
+    """
+    Runs a :class:`DevToolsRenderer` on an event loop of its own thread, so synchronous code in any thread (views,
+    models, the certificate command workers) can share it.
+    """
+
+    def __init__(self, renderer):
+        self.renderer = renderer
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="pyaba-devtools", daemon=True)
+        self._thread.start()
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def print_to_pdf(self, html_content, page_width=8.27, page_height=11.69):
+        return self._run(self.renderer.print_to_pdf(html_content, page_width, page_height))
+
+    def print_many(self, html_documents, page_width=8.27, page_height=11.69):
+        return self._run(self.renderer.print_many(html_documents, page_width, page_height))
+
+    def print_with_script(self, html_content, script, page_width=8.27, page_height=11.69):
+        return self._run(self.renderer.print_with_script(html_content, script, page_width, page_height))
+
+    def close(self):
+        self._run(self.renderer.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
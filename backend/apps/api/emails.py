@@ -0,0 +1,204 @@
+"""Email delivery: pooled SMTP connections, rate limiting and templates prerendered once for many recipients."""
+
+import logging
+import re
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.core.mail import get_connection
+from django.template.base import Node, TextNode, VariableNode
+from django.template.loader import get_template, render_to_string
+from django.utils.html import conditional_escape
+
+from apps.api.utils import LRUCache
+
+
+class SMTPConnectionPool:
+    """
+    Bounded pool of open, authenticated SMTP connections shared by threads sending emails.
+
+    At most ``size`` connections exist at the same time; callers beyond that wait for one to be returned. A
+    connection is opened on first use and kept open between messages, so the TCP and TLS handshakes and the
+    login happen once per connection instead of once per message. A connection that raises while sending is
+    closed, and the next borrower opens a new one.
+    """
+
+    def __init__(self, size, factory=get_connection):
+        self.size = size
+        self.factory = factory
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrows an open connection from the pool for the duration of the ``with`` block.
+        """
+        with self._slots:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                connection = self.factory(fail_silently=False)
+                connection.open()
+
+            try:
+                yield connection
+            except BaseException:
+                connection.close()
+                raise
+
+            with self._lock:
+                self._idle.append(connection)
+
+    def close(self):
+        """
+        Closes every idle connection.
+        """
+        with self._lock:
+            connections, self._idle = self._idle, []
+        for connection in connections:
+            connection.close()
+
+
+class RateLimiter:
+    """
+    Spaces the calls to :meth:`wait`, across every thread, so that at most ``rate`` of them return per second.
+    A rate of 0 doesn't limit them.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """
+        Blocks until the next free slot.
+        """
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        time.sleep(slot - now)
+
+
+def send_messages(messages, pool, rate_limiter=None):
+    """
+    Sends many email messages concurrently, each through a connection borrowed from the pool.
+
+    :param messages: Iterable with the :class:`EmailMessage` to send.
+    :param pool: :class:`SMTPConnectionPool` with the connections to use, one thread per connection.
+    :param rate_limiter: Optional :class:`RateLimiter` limiting how many messages are sent per second.
+    :return: List with the exception raised sending each message, or None when it was sent, in the same order.
+    """
+
+    def send(message):
+        if rate_limiter is not None:
+            rate_limiter.wait()
+        try:
+            with pool.connection() as connection:
+                message.connection = connection
+                message.send(fail_silently=False)
+        except Exception as e:
+            logging.warning("Erro ao enviar e-mail para %s: %s", ", ".join(message.to), e)
+            return e
+        return None
+
+    with ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix="pyaba-smtp") as executor:
+        return list(executor.map(send, messages))
+
+
+class PrerenderedTemplate:
+    """
+    A template rendered once with the context shared by many recipients and a placeholder for each recipient
+    value, which :meth:`render` fills in with plain string replacements, escaped as the template would.
+
+    Filling in is only the same as rendering when the template writes each recipient value as is, so the template
+    is fully rendered for every recipient instead when it uses a recipient value in any other way (in a tag, with
+    a filter or an attribute lookup), when it extends or includes other templates, or when the first fill differs
+    from a full render. A recipient whose values are not all strings is also fully rendered.
+    """
+
+    def __init__(self, template_name, shared_context, fields):
+        self.template_name = template_name
+        self.shared_context = shared_context
+        self.placeholders = {field: f"pyaba{secrets.token_hex(8)}" for field in fields}
+        self.checked = False
+        self.fallback = not self.substitutes_only(template_name, fields)
+        if self.fallback:
+            logging.warning("Modelo %s não pode ser pré-renderizado, renderizando inteiro.", template_name)
+        else:
+            self.content = render_to_string(template_name, {**shared_context, **self.placeholders})
+
+    @staticmethod
+    def substitutes_only(template_name, fields):
+        """
+        Returns whether the template uses the given context values only as plain ``{{ field }}`` variables.
+        """
+        mentions = re.compile(rf"(?<![\w.])({'|'.join(map(re.escape, fields))})\b") if fields else None
+        for node in get_template(template_name).template.nodelist.get_nodes_by_type(Node):
+            if isinstance(node, TextNode):
+                continue
+            if isinstance(node, VariableNode):
+                lookups = getattr(node.filter_expression.var, "lookups", None) or ()
+                if lookups[:1] and lookups[0] in fields and (len(lookups) > 1 or node.filter_expression.filters):
+                    return False
+                continue
+            # Tags reading a recipient value, changing how their content is escaped or rendering other templates
+            # (which aren't inspected) make the output depend on more than the placeholders.
+            contents = getattr(getattr(node, "token", None), "contents", "")
+            if contents.split()[:1] in (["extends"], ["include"], ["autoescape"], ["filter"]):
+                return False
+            if mentions and mentions.search(contents):
+                return False
+        return True
+
+    def fill(self, values):
+        content = self.content
+        for field, placeholder in self.placeholders.items():
+            content = content.replace(placeholder, conditional_escape(values[field]))
+        return content
+
+    def render(self, values):
+        """
+        Renders the template for a recipient with the given values.
+        """
+        if self.fallback or not all(isinstance(values[field], str) for field in self.placeholders):
+            return render_to_string(self.template_name, {**self.shared_context, **values})
+        if not self.checked:
+            content = render_to_string(self.template_name, {**self.shared_context, **values})
+            self.fallback = self.fill(values) != content
+            self.checked = True
+            if self.fallback:
+                logging.warning("Modelo %s não pode ser pré-renderizado, renderizando inteiro.", self.template_name)
+            return content
+        return self.fill(values)
+
+
+email_templates = LRUCache(maxsize=64)
+
+
+def render_email(template_name, shared_context, recipient_context):
+    """
+    Renders an email template for a recipient, rendering the part shared with other recipients only once.
+
+    Templates are prerendered once per distinct shared context (e.g. once per tutorial) and the recipient values
+    are then filled in, see :class:`PrerenderedTemplate`; the output is the same as ``render_to_string``.
+
+    :param template_name: Name of the template.
+    :param shared_context: Context values shared by many recipients, e.g. those of the tutorial.
+    :param recipient_context: Context values of this recipient only, e.g. the name and links.
+    :return: Rendered template.
+    """
+    key = (template_name, tuple(sorted(shared_context.items())), tuple(sorted(recipient_context)))
+    template = email_templates.get(key)
+    if template is None:
+        template = PrerenderedTemplate(template_name, shared_context, recipient_context)
+        email_templates.set(key, template)
+    return template.render(recipient_context)
@@ -0,0 +1,267 @@
+"""Management command to benchmark the certificate pipeline."""
+
+import json
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from django.utils import timezone
+
+from apps.api import models
+from apps.api.utils import html_to_pdf_batch
+
+# Certificate template used when no --template is given, close to the ones events upload.
+SAMPLE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Certificado</title>
+<style>
+  body { font-family: sans-serif; text-align: center; margin: 0; padding: 2cm; }
+  h1 { font-size: 42px; letter-spacing: 4px; }
+  .name { font-size: 32px; font-weight: bold; margin: 1cm 0; }
+  .signers { display: flex; justify-content: space-around; margin-top: 2cm; }
+</style>
+</head>
+<body>
+<h1>CERTIFICADO</h1>
+<p>Certificamos que</p>
+<p class="name">{{ attendee_name }}</p>
+<p>participou do tutorial <strong>{{ tutorial_title }}</strong> no evento {{ event_title }}, realizado em
+{{ event_city }} no dia {{ event_date }}, com carga horária de {{ hours }} horas.</p>
+<div class="signers">
+{% for event_signer in certificate_signers %}
+  <div>{{ event_signer.signer.name }}<br>{{ event_signer.signer.title }}</div>
+{% endfor %}
+</div>
+</body>
+</html>
+"""
+
+STEPS = ("template_rendering", "pdf_generation", "storage_writes", "email_building")
+
+
+class Command(BaseCommand):
+    help = "Measure the time spent in each step of the certificate pipeline for events of different sizes."
+
+    def add_arguments(self, parser):
+        """Add command line arguments for the management command."""
+
+        parser.add_argument(
+            "--sizes",
+            type=str,
+            default="10,100,1000",
+            help="Comma separated numbers of attendees to benchmark.",
+        )
+        parser.add_argument(
+            "--renderer",
+            type=str,
+            default="fake",
+            help="PDF renderer to use, as in CERTIFICATE_RENDERER (fake measures everything but the browser).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=25,
+            help="Number of certificates printed in a single PDF job.",
+        )
+        parser.add_argument("--template", type=str, help="Certificate template to use instead of the sample one.")
+        parser.add_argument("--output", type=str, help="Write the JSON report to this file instead of stdout.")
+        parser.add_argument(
+            "--baseline",
+            type=str,
+            help="JSON report of a previous run: fail when a step got slower than in it.",
+        )
+        parser.add_argument(
+            "--use-current-database",
+            action="store_true",
+            help="Run in the configured database, rolling back what the benchmark writes, instead of a throwaway "
+            "one. The database stays locked for writes while it runs: never use it with a live site.",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="How much slower than the baseline, per registration, a step may get (0.25 is 25%%).",
+        )
+
+    @contextmanager
+    def timed(self, timings, step):
+        """
+        Add the time spent inside the block to ``timings[step]``.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings[step] = timings.get(step, 0) + time.perf_counter() - start
+
+    @contextmanager
+    def benchmark_database(self, use_current_database):
+        """
+        Point the default connection to a throwaway database, created and migrated like the test database, for the
+        duration of the ``with`` block, so the benchmark never locks the live one.
+        """
+        if use_current_database:
+            yield
+            return
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def create_registrations(self, size, template):
+        """
+        Create an event with a tutorial and ``size`` confirmed and present registrations.
+        """
+        event = models.Event.objects.create(
+            title=f"Benchmark {size}",
+            slug=f"benchmark-certificates-{size}",
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate() + timedelta(days=1),
+            location="Fortaleza",
+            image=ContentFile(b"image", name="benchmark.jpg"),
+            certificate_template=ContentFile(template.encode("utf-8"), name="benchmark.html"),
+        )
+        signer = models.CertificateSigner.objects.create(name="Organização", title="Coordenação")
+        models.EventCertificateSigner.objects.create(event=event, signer=signer)
+        start = timezone.now()
+        tutorial = models.Tutorial.objects.create(
+            event=event,
+            title="Tutorial de Benchmark",
+            start_datetime=start,
+            end_datetime=start + timedelta(hours=2),
+            duration=timedelta(hours=2),
+            vacancies=size,
+        )
+        attendees = models.Attendee.objects.bulk_create(
+            models.Attendee(
+                full_name=f"Participante {number}",
+                email=f"participante{number}@example.com",
+                cpf=f"{number:011d}",
+            )
+            for number in range(1, size + 1)
+        )
+        models.Registration.objects.bulk_create(
+            models.Registration(tutorial=tutorial, attendee=attendee, confirmed=True, present=True)
+            for attendee in attendees
+        )
+        return list(
+            tutorial.registrations.select_related("attendee", "tutorial__event")
+            .prefetch_related("tutorial__event__certificate_signers")
+            .order_by("pk")
+        )
+
+    def benchmark(self, size, template, batch_size):
+        """
+        Run the certificate pipeline for ``size`` registrations, rolling back everything it wrote to the database.
+
+        Returns the time spent in each step, in seconds.
+        """
+        timings = {}
+        with transaction.atomic():
+            registrations = self.create_registrations(size, template)
+
+            with self.timed(timings, "template_rendering"):
+                html_documents = [registration.render_certificate() for registration in registrations]
+
+            with self.timed(timings, "pdf_generation"):
+                pdf_documents = html_to_pdf_batch(html_documents, batch_size=batch_size)
+
+            with self.timed(timings, "storage_writes"):
+                for registration, pdf_file_content in zip(registrations, pdf_documents):
+                    registration.save_certificate_pdf(pdf_file_content, save=False)
+
+            with self.timed(timings, "email_building"):
+                for registration in registrations:
+                    registration.certificate_email().message()
+
+            transaction.set_rollback(True)
+        return timings
+
+    def report_result(self, size, timings):
+        """
+        Build the report entry of a benchmarked size.
+        """
+        total = sum(timings.values())
+        return {
+            "registrations": size,
+            "total_seconds": round(total, 6),
+            "per_registration_ms": round(total * 1000 / size, 4),
+            "steps": {
+                step: {
+                    "seconds": round(timings[step], 6),
+                    "per_registration_ms": round(timings[step] * 1000 / size, 4),
+                }
+                for step in STEPS
+            },
+        }
+
+    def regressions(self, report, baseline, tolerance):
+        """
+        List the steps slower, per registration, than in the baseline report for the same number of attendees.
+        """
+        baseline_results = {result["registrations"]: result for result in baseline.get("results", [])}
+        slower = []
+        for result in report["results"]:
+            previous = baseline_results.get(result["registrations"])
+            if previous is None:
+                continue
+            for step, timing in result["steps"].items():
+                previous_ms = previous["steps"].get(step, {}).get("per_registration_ms")
+                if previous_ms and timing["per_registration_ms"] > previous_ms * (1 + tolerance):
+                    slower.append(
+                        f"{step} ({result['registrations']}): {timing['per_registration_ms']}ms > {previous_ms}ms"
+                    )
+        return slower
+
+    def handle(self, *args, **options):
+        """Handle the command execution logic."""
+        try:
+            sizes = [int(size) for size in options["sizes"].split(",") if size.strip()]
+        except ValueError:
+            raise CommandError("--sizes deve ser uma lista de números separados por vírgula.")
+        if not sizes or min(sizes) < 1:
+            raise CommandError("--sizes deve ter ao menos um número positivo.")
+
+        template = SAMPLE_TEMPLATE
+        if options["template"]:
+            template = Path(options["template"]).read_text(encoding="utf-8")
+
+        report = {"renderer": options["renderer"], "batch_size": options["batch_size"], "results": []}
+        with tempfile.TemporaryDirectory(prefix="pyaba-benchmark-") as media_root:
+            with override_settings(MEDIA_ROOT=media_root, CERTIFICATE_RENDERER=options["renderer"]):
+                with self.benchmark_database(options["use_current_database"]):
+                    for size in sizes:
+                        timings = self.benchmark(size, template, max(options["batch_size"], 1))
+                        report["results"].append(self.report_result(size, timings))
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            Path(options["output"]).write_text(output + "\n", encoding="utf-8")
+            for result in report["results"]:
+                self.stdout.write(
+                    "{}: {} ({})".format(
+                        self.style.HTTP_INFO(f"{result['registrations']} registrations"),
+                        self.style.SUCCESS(f"{result['per_registration_ms']}ms per registration"),
+                        ", ".join(
+                            f"{step} {timing['per_registration_ms']}ms" for step, timing in result["steps"].items()
+                        ),
+                    )
+                )
+        else:
+            self.stdout.write(output)
+
+        if options["baseline"]:
+            baseline = json.loads(Path(options["baseline"]).read_text(encoding="utf-8"))
+            slower = self.regressions(report, baseline, options["tolerance"])
+            if slower:
+                raise CommandError("Etapas mais lentas que na referência: " + "; ".join(slower))
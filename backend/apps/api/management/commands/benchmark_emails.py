@@ -0,0 +1,202 @@
+"""Management command to benchmark the delivery of certificate emails against a local SMTP stand-in."""
+
+import json
+import socketserver
+import threading
+import time
+from functools import partial
+from pathlib import Path
+
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+
+from apps.api.emails import RateLimiter, SMTPConnectionPool, send_messages
+
+
+class SMTPStandInHandler(socketserver.StreamRequestHandler):
+    """
+    Speaks just enough SMTP to accept messages from Django's SMTP backend, waiting like a remote server would.
+    """
+
+    def reply(self, *lines):
+        self.wfile.write(b"".join(line + b"\r\n" for line in lines))
+
+    def handle(self):
+        time.sleep(self.server.connect_latency)
+        self.reply(b"220 pyaba-benchmark ESMTP")
+        while line := self.rfile.readline():
+            command = line[:4].upper()
+            if command == b"EHLO":
+                self.reply(b"250-pyaba-benchmark", b"250 8BITMIME")
+            elif command == b"DATA":
+                self.reply(b"354 End data with <CR><LF>.<CR><LF>")
+                while (data := self.rfile.readline()) and data != b".\r\n":
+                    pass
+                time.sleep(self.server.latency)
+                with self.server.lock:
+                    self.server.received += 1
+                self.reply(b"250 OK")
+            elif command == b"QUIT":
+                self.reply(b"221 Bye")
+                break
+            elif command in (b"HELO", b"MAIL", b"RCPT", b"RSET", b"NOOP"):
+                self.reply(b"250 OK")
+            else:
+                self.reply(b"502 Command not implemented")
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """
+    Local SMTP server counting the messages it receives.
+
+    :param connect_latency: Seconds waited before greeting each connection, standing for the TCP and TLS
+        handshakes and the login with a remote server.
+    :param latency: Seconds waited before accepting each message.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_latency=0, latency=0):
+        super().__init__(("127.0.0.1", 0), SMTPStandInHandler)
+        self.connect_latency = connect_latency
+        self.latency = latency
+        self.received = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class Command(BaseCommand):
+    help = "Measure how many certificate emails per second are delivered, against a local SMTP stand-in."
+
+    def add_arguments(self, parser):
+        """Add command line arguments for the management command."""
+
+        parser.add_argument("--messages", type=int, default=200, help="Number of emails sent by each strategy.")
+        parser.add_argument(
+            "--connections", type=int, default=4, help="Number of SMTP connections of the pooled strategy."
+        )
+        parser.add_argument(
+            "--rate", type=float, default=0, help="Maximum number of emails sent per second, 0 for no limit."
+        )
+        parser.add_argument(
+            "--attachment-kb", type=int, default=100, help="Size of the PDF attached to each email, in KB."
+        )
+        parser.add_argument(
+            "--connect-latency",
+            type=float,
+            default=0.05,
+            help="Seconds the stand-in waits before greeting a connection (TCP, TLS and login with a real server).",
+        )
+        parser.add_argument(
+            "--latency", type=float, default=0.01, help="Seconds the stand-in waits before accepting each email."
+        )
+        parser.add_argument("--output", type=str, help="Write the JSON report to this file instead of stdout.")
+
+    def build_messages(self, count, attachment):
+        messages = []
+        for number in range(count):
+            message = EmailMessage(
+                subject=f"Certificado {number}",
+                body=f"<p>Olá, PARTICIPANTE {number}! Seu certificado está em anexo.</p>",
+                from_email="noreply@example.com",
+                to=[f"participante{number}@example.com"],
+            )
+            message.content_subtype = "html"
+            message.attach(f"{number}.pdf", attachment, "application/pdf")
+            messages.append(message)
+        return messages
+
+    def connection_per_message(self, messages, factory):
+        """
+        Sends each message on a connection of its own, like ``EmailMessage.send`` without a connection.
+        """
+        errors = []
+        for message in messages:
+            message.connection = factory(fail_silently=False)
+            try:
+                message.send(fail_silently=False)
+            except Exception as e:
+                errors.append(e)
+            else:
+                errors.append(None)
+        return errors
+
+    def pooled(self, messages, factory, connections, rate):
+        pool = SMTPConnectionPool(connections, factory)
+        try:
+            return send_messages(messages, pool, RateLimiter(rate))
+        finally:
+            pool.close()
+
+    def handle(self, *args, **options):
+        """Handle the command execution logic."""
+        count = max(options["messages"], 1)
+        connections = max(options["connections"], 1)
+        attachment = b"%PDF-1.7\n" + b"0" * (options["attachment_kb"] * 1024)
+        strategies = {
+            "connection_per_message": self.connection_per_message,
+            "single_connection": partial(self.pooled, connections=1, rate=options["rate"]),
+            "pooled": partial(self.pooled, connections=connections, rate=options["rate"]),
+        }
+
+        report = {
+            "messages": count,
+            "connections": connections,
+            "rate": options["rate"],
+            "attachment_kb": options["attachment_kb"],
+            "connect_latency": options["connect_latency"],
+            "latency": options["latency"],
+            "results": [],
+        }
+        with SMTPStandIn(options["connect_latency"], options["latency"]) as server:
+            host, port = server.server_address
+            factory = partial(
+                get_connection,
+                "django.core.mail.backends.smtp.EmailBackend",
+                host=host,
+                port=port,
+                username="",
+                password="",
+                use_tls=False,
+                use_ssl=False,
+            )
+            for name, strategy in strategies.items():
+                messages = self.build_messages(count, attachment)
+                received = server.received
+                start = time.perf_counter()
+                errors = strategy(messages, factory)
+                elapsed = time.perf_counter() - start
+                failed = sum(error is not None for error in errors)
+                report["results"].append(
+                    {
+                        "strategy": name,
+                        "seconds": round(elapsed, 6),
+                        "messages_per_second": round(count / elapsed, 2),
+                        "sent": count - failed,
+                        "failed": failed,
+                        "received": server.received - received,
+                    }
+                )
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            Path(options["output"]).write_text(output + "\n", encoding="utf-8")
+            for result in report["results"]:
+                self.stdout.write(
+                    "{}: {} ({} sent, {} failed)".format(
+                        self.style.HTTP_INFO(result["strategy"]),
+                        self.style.SUCCESS(f"{result['messages_per_second']} emails/s"),
+                        result["sent"],
+                        result["failed"],
+                    )
+                )
+        else:
+            self.stdout.write(output)
@@ -1,6 +1,11 @@
 """Management command to close polls for voting."""
 
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import connections
 
 from apps.api import models
 
@@ -15,7 +20,37 @@ class Command(BaseCommand):
         parser.add_argument(
             "--skip-generation", action="store_true", help="Skip certificate generation if it already exists."
         )
+        parser.add_argument(
+            "--force-generation",
+            action="store_true",
+            help="Regenerate certificates even when their rendered content didn't change.",
+        )
+        parser.add_argument(
+            "--stamp",
+            action="store_true",
+            help=(
+                "Print the certificate background once per tutorial and stamp the attendee names on it "
+                "(much faster, but names are written in Helvetica instead of the template font)."
+            ),
+        )
         parser.add_argument("--skip-email", action="store_true", help="Skip sending emails with the certificate.")
+        parser.add_argument(
+            "--queue-email",
+            action="store_true",
+            help="Only queue the emails in the outbox, leaving their delivery to the send_emails command.",
+        )
+        parser.add_argument(
+            "--email-connections",
+            type=int,
+            default=None,
+            help="Number of SMTP connections sending emails at the same time (default: EMAIL_POOL_SIZE).",
+        )
+        parser.add_argument(
+            "--email-rate",
+            type=float,
+            default=None,
+            help="Maximum number of emails sent per second, 0 for no limit (default: EMAIL_RATE_LIMIT).",
+        )
         parser.add_argument(
             "--ignore-confirmed",
             action="store_true",
@@ -31,6 +66,87 @@ class Command(BaseCommand):
             action="store_true",
             help="Ignore registrations that have already sent the certificate email.",
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=25,
+            help="Number of certificates printed in a single PDF job (1 prints each certificate on its own).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help=(
+                "Number of threads generating certificates in parallel "
+                "(raise CERTIFICATE_BROWSER_POOL_SIZE along with it)."
+            ),
+        )
+
+    def process_batch(self, batch, options):
+        """
+        Generate the certificates of a batch of registrations.
+
+        Runs in a worker thread and never writes to the database: the registrations are changed in memory only
+        and saved by the main thread, so SQLite only ever sees one writer. Returns, for each registration, the
+        generation error (None on success).
+        """
+        try:
+            generation_errors = [None] * len(batch)
+
+            if not options["skip_generation"]:
+                generation_errors = models.Registration.generate_certificates(
+                    batch,
+                    check_confirmed=not options["ignore_confirmed"],
+                    check_present=not options["ignore_present"],
+                    batch_size=len(batch),
+                    save=False,
+                    force=options["force_generation"],
+                    stamp=options["stamp"],
+                )
+
+            return generation_errors
+        finally:
+            connections.close_all()
+
+    def write_result(self, registration, fields, error):
+        """
+        Save the fields changed by a successful step and write the step outcome.
+        """
+        if error is None and fields:
+            try:
+                registration.save(update_fields=fields)
+            except Exception as e:
+                error = e
+
+        if error is None:
+            self.stdout.write("✅", ending="")
+        else:
+            self.stdout.write("❌", ending=f" {error}")
+
+    def deliver_emails(self, event, options):
+        """
+        Deliver the certificate emails of the event waiting in the outbox, concurrently through a pool of SMTP
+        connections. Failed ones stay there, to be retried by the send_emails command.
+        """
+        connections = options["email_connections"] or settings.EMAIL_POOL_SIZE
+        rate = settings.EMAIL_RATE_LIMIT if options["email_rate"] is None else options["email_rate"]
+        emails = (
+            models.OutboxEmail.objects.due()
+            .filter(kind=models.OutboxEmail.Kind.CERTIFICATE, registration__tutorial__event=event)
+            .select_related("registration__attendee", "registration__tutorial__event")
+            .order_by("pk")
+        )
+        start = time.perf_counter()
+        sent, failed = models.OutboxEmail.deliver(emails, connections, rate)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            "\n📧 {}, {} ({:.1f} emails/s through {} connections)".format(
+                self.style.SUCCESS(f"{sent} emails sent"),
+                self.style.ERROR(f"{failed} failed (retried by send_emails)") if failed else "0 failed",
+                (sent + failed) / elapsed if elapsed else 0,
+                connections,
+            )
+        )
 
     def handle(self, *args, **options):
         """Handle the command execution logic."""
@@ -42,8 +158,15 @@ class Command(BaseCommand):
         )
         event = models.Event.objects.get(slug=options["event_slug"])
         tutorials = event.tutorials.all().order_by("title")
+        batch_size = max(options["batch_size"], 1)
+        executor = ThreadPoolExecutor(max_workers=max(options["workers"], 1))
+
+        work = []
+        email_formats = {"attached": 0, "link": 0}
         for tutorial in tutorials:
-            registrations = tutorial.registrations.all()
+            registrations = tutorial.registrations.select_related("attendee", "tutorial__event").prefetch_related(
+                "tutorial__event__certificate_signers"
+            )
 
             if not options["ignore_confirmed"]:
                 registrations = registrations.filter(confirmed=True)
@@ -52,35 +175,52 @@ class Command(BaseCommand):
             if not options["ignore_sent"]:
                 registrations = registrations.filter(certificate_sent=False)
 
+            registrations = list(registrations)
+            batches = [registrations[start : start + batch_size] for start in range(0, len(registrations), batch_size)]
+            futures = [executor.submit(self.process_batch, batch, options) for batch in batches]
+            work.append((tutorial, registrations, batches, futures))
+
+        for tutorial, registrations, batches, futures in work:
             self.stdout.write(
-                "\n\n{} ({})\n".format(self.style.HTTP_INFO(tutorial.title), self.style.WARNING(registrations.count()))
+                "\n\n{} ({})\n".format(self.style.HTTP_INFO(tutorial.title), self.style.WARNING(len(registrations)))
             )
 
-            for registration in registrations:
-                self.stdout.write(
-                    "\n  - {}:".format(self.style.HTTP_INFO(registration.attendee.full_name.strip().upper())), ending=""
-                )
+            for batch, future in zip(batches, futures):
+                for registration, generation_error in zip(batch, future.result()):
+                    self.stdout.write(
+                        "\n  - {}:".format(self.style.HTTP_INFO(registration.attendee.full_name.strip().upper())),
+                        ending="",
+                    )
+
+                    if not options["skip_generation"]:
+                        self.stdout.write(" 📄", ending="")
+                        self.write_result(registration, ["certificate_pdf", "certificate_hash"], generation_error)
 
-                if not options["skip_generation"]:
-                    self.stdout.write(" 📄", ending="")
-                    try:
-                        registration.generate_certificate(
-                            check_confirmed=not options["ignore_confirmed"], check_present=not options["ignore_present"]
-                        )
-                        self.stdout.write("✅", ending="")
-                    except Exception as e:
-                        self.stdout.write("❌", ending=f" {e}")
-
-                if not options["skip_email"]:
-                    self.stdout.write(" 📧", ending="")
-                    try:
-                        registration.send_certificate_email()
-                        self.stdout.write("✅", ending="")
-                    except Exception as e:
-                        self.stdout.write("❌", ending=f" {e}")
+                    if not options["skip_email"]:
+                        self.stdout.write(" 📧", ending="")
+                        email_error = None
+                        try:
+                            registration.queue_certificate_email()
+                            attached = registration.certificate_attachable
+                            self.stdout.write("📎" if attached else "🔗", ending="")
+                            email_formats["attached" if attached else "link"] += 1
+                        except Exception as e:
+                            email_error = e
+                        self.write_result(registration, [], email_error)
 
             self.stdout.write("\n")
 
+        executor.shutdown()
+
+        if not options["skip_email"]:
+            self.stdout.write(
+                "\n📎 {} certificates attached, 🔗 {} sent as a download link only".format(
+                    email_formats["attached"], email_formats["link"]
+                )
+            )
+            if not options["queue_email"]:
+                self.deliver_emails(event, options)
+
         self.stdout.write(
             "\n\n{}: {}\n\n".format(
                 self.style.SUCCESS("Certificates generated and emails sent successfully!"),
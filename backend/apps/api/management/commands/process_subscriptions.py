@@ -0,0 +1,58 @@
+"""Management command to process the subscriptions waiting in the admission queue."""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.api import models
+
+
+class Command(BaseCommand):
+    help = "Subscribe the attendees waiting in the admission queue, in arrival order and in batched transactions."
+
+    def add_arguments(self, parser):
+        """Add command line arguments for the management command."""
+
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Process the queued subscriptions and exit, instead of waiting for new ones.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Number of subscriptions processed in each transaction (default: REGISTRATION_QUEUE_BATCH_SIZE).",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=None,
+            help="Seconds to wait for new subscriptions when the queue is empty "
+            "(default: REGISTRATION_QUEUE_POLL_INTERVAL).",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command execution logic."""
+        batch_size = settings.REGISTRATION_QUEUE_BATCH_SIZE if options["batch_size"] is None else options["batch_size"]
+        interval = settings.REGISTRATION_QUEUE_POLL_INTERVAL if options["interval"] is None else options["interval"]
+
+        try:
+            while True:
+                result = models.SubscriptionRequest.process_queue(max(batch_size, 1))
+                if result is None:
+                    if options["once"]:
+                        break
+                    time.sleep(interval)
+                    continue
+
+                subscribed, rejected = result
+                self.stdout.write(
+                    "🎟️ {} {}".format(
+                        self.style.SUCCESS(f"{subscribed} subscribed"),
+                        self.style.WARNING(f"{rejected} rejected") if rejected else "0 rejected",
+                    )
+                )
+        except KeyboardInterrupt:
+            pass
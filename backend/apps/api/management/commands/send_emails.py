@@ -0,0 +1,85 @@
+"""Management command to deliver the emails queued in the outbox."""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.api import models
+
+
+class Command(BaseCommand):
+    help = "Deliver the emails queued in the outbox, retrying failed ones with exponential backoff."
+
+    def add_arguments(self, parser):
+        """Add command line arguments for the management command."""
+
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Deliver the emails due now and exit, instead of waiting for new ones.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of due emails loaded from the outbox at a time.",
+        )
+        parser.add_argument(
+            "--connections",
+            type=int,
+            default=None,
+            help="Number of SMTP connections sending emails at the same time (default: EMAIL_POOL_SIZE).",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=None,
+            help="Maximum number of emails sent per second, 0 for no limit (default: EMAIL_RATE_LIMIT).",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=None,
+            help="Seconds to wait for new emails when the outbox is empty (default: EMAIL_OUTBOX_POLL_INTERVAL).",
+        )
+
+    def deliver_batch(self, batch_size, connections, rate):
+        """
+        Deliver the next batch of due emails. Returns the number of emails sent and failed, or None when no email
+        is due.
+        """
+        emails = list(
+            models.OutboxEmail.objects.due()
+            .select_related("registration__attendee", "registration__tutorial__event")
+            .order_by("next_attempt_at", "pk")[:batch_size]
+        )
+        if not emails:
+            return None
+        return models.OutboxEmail.deliver(emails, connections, rate)
+
+    def handle(self, *args, **options):
+        """Handle the command execution logic."""
+        batch_size = max(options["batch_size"], 1)
+        interval = settings.EMAIL_OUTBOX_POLL_INTERVAL if options["interval"] is None else options["interval"]
+        connections = settings.EMAIL_POOL_SIZE if options["connections"] is None else options["connections"]
+        rate = settings.EMAIL_RATE_LIMIT if options["rate"] is None else options["rate"]
+
+        try:
+            while True:
+                result = self.deliver_batch(batch_size, connections, rate)
+                if result is None:
+                    if options["once"]:
+                        break
+                    time.sleep(interval)
+                    continue
+
+                sent, failed = result
+                self.stdout.write(
+                    "📧 {} {}".format(
+                        self.style.SUCCESS(f"{sent} sent"),
+                        self.style.ERROR(f"{failed} failed") if failed else "0 failed",
+                    )
+                )
+        except KeyboardInterrupt:
+            pass
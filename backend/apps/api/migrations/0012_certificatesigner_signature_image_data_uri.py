@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_registration_certificate_sent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="certificatesigner",
+            name="signature_image_data_uri",
+            field=models.TextField(
+                blank=True,
+                default="",
+                editable=False,
+                help_text="Imagem da assinatura normalizada em PNG e codificada em base64, usada nos certificados",
+                verbose_name="Assinatura codificada",
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0012_certificatesigner_signature_image_data_uri"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="registration",
+            name="certificate_hash",
+            field=models.CharField(
+                blank=True,
+                default="",
+                editable=False,
+                help_text="Hash do conteúdo renderizado do certificado, usado para evitar gerar o mesmo PDF novamente",
+                max_length=64,
+                verbose_name="Hash do certificado",
+            ),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0013_registration_certificate_hash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxEmail",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("confirmation", "Confirmação de inscrição"), ("certificate", "Certificado")],
+                        max_length=20,
+                        verbose_name="Tipo",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("pending", "Pendente"), ("sent", "Enviado"), ("failed", "Falhou")],
+                        default="pending",
+                        max_length=10,
+                        verbose_name="Situação",
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0, verbose_name="Tentativas")),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(default=django.utils.timezone.now, verbose_name="Próxima tentativa"),
+                ),
+                ("last_error", models.TextField(blank=True, default="", verbose_name="Último erro")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Criado em")),
+                ("sent_at", models.DateTimeField(blank=True, null=True, verbose_name="Enviado em")),
+                (
+                    "registration",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="emails",
+                        to="api.registration",
+                        verbose_name="Inscrição",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "E-mail na fila",
+                "verbose_name_plural": "E-mails na fila",
+                "indexes": [models.Index(fields=["status", "next_attempt_at"], name="api_outboxe_status_d7f409_idx")],
+            },
+        ),
+    ]
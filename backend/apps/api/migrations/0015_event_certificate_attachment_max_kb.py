@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0014_outboxemail"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="certificate_attachment_max_kb",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Certificados maiores que isso são enviados por e-mail só com o link de download, sem o PDF anexado (vazio usa o padrão CERTIFICATE_EMAIL_ATTACHMENT_MAX_KB, 0 nunca anexa)",
+                null=True,
+                verbose_name="Tamanho máximo do certificado anexado (KB)",
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:36
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def count_confirmed_registrations(apps, schema_editor):
+    Tutorial = apps.get_model("api", "Tutorial")
+    tutorials = Tutorial.objects.annotate(confirmed=Count("registrations", filter=Q(registrations__confirmed=True)))
+    for tutorial in tutorials:
+        Tutorial.objects.filter(pk=tutorial.pk).update(confirmed_count=tutorial.confirmed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0015_event_certificate_attachment_max_kb"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tutorial",
+            name="confirmed_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Quantidade de vagas ocupadas por inscrições confirmadas, mantida a cada confirmação",
+                verbose_name="Inscrições confirmadas",
+            ),
+        ),
+        migrations.RunPython(count_confirmed_registrations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:41
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0016_tutorial_confirmed_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SubscriptionRequest",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("ticket", models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name="Senha")),
+                ("cpf", models.CharField(max_length=11, verbose_name="CPF")),
+                ("full_name", models.CharField(blank=True, default="", max_length=255, verbose_name="Nome completo")),
+                ("email", models.EmailField(blank=True, default="", max_length=254, verbose_name="E-mail")),
+                ("birthday", models.DateField(blank=True, null=True, verbose_name="Data de nascimento")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("queued", "Na fila"), ("subscribed", "Inscrito"), ("rejected", "Recusado")],
+                        default="queued",
+                        max_length=10,
+                        verbose_name="Situação",
+                    ),
+                ),
+                ("error", models.TextField(blank=True, default="", verbose_name="Motivo da recusa")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Criado em")),
+                ("processed_at", models.DateTimeField(blank=True, null=True, verbose_name="Processado em")),
+                (
+                    "registration",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="subscription_requests",
+                        to="api.registration",
+                        verbose_name="Inscrição",
+                    ),
+                ),
+                (
+                    "tutorial",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="subscription_requests",
+                        to="api.tutorial",
+                        verbose_name="Tutorial",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Pedido de inscrição",
+                "verbose_name_plural": "Pedidos de inscrição",
+                "indexes": [models.Index(fields=["status", "id"], name="api_subscri_status_7216a8_idx")],
+            },
+        ),
+    ]
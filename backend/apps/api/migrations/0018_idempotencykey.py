@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:43
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0017_subscriptionrequest"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IdempotencyKey",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("key", models.CharField(max_length=255, verbose_name="Chave")),
+                ("path", models.CharField(max_length=255, verbose_name="Caminho")),
+                ("request_hash", models.CharField(max_length=64, verbose_name="Hash da requisição")),
+                ("status_code", models.PositiveSmallIntegerField(verbose_name="Código de status")),
+                (
+                    "body",
+                    models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name="Resposta"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name="Criado em"),
+                ),
+            ],
+            options={
+                "verbose_name": "Chave de idempotência",
+                "verbose_name_plural": "Chaves de idempotência",
+                "unique_together": {("key", "path")},
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0018_idempotencykey"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="tutorial_conflicts",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                help_text="Para cada tutorial do evento, os tutoriais com horário sobreposto, refeito quando os horários mudam",
+                verbose_name="Conflitos de horário entre tutoriais",
+            ),
+        ),
+    ]
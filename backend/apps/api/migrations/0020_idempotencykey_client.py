@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:09
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0019_event_tutorial_conflicts"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="idempotencykey",
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name="idempotencykey",
+            name="client",
+            field=models.CharField(default="", max_length=255, verbose_name="Cliente"),
+        ),
+        migrations.AlterField(
+            model_name="idempotencykey",
+            name="body",
+            field=models.JSONField(
+                blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name="Resposta"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="idempotencykey",
+            name="status_code",
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name="Código de status"),
+        ),
+        migrations.AlterUniqueTogether(
+            name="idempotencykey",
+            unique_together={("key", "path", "client")},
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:05
+
+from django.db import migrations
+
+# The confirmed count of a tutorial moves in the same statement as the registration that takes or frees the seat,
+# so Registration.confirm() is a single conditional UPDATE and no code path can let the two diverge.
+SEAT_TRIGGERS = {
+    "sqlite": [
+        """
+        CREATE TRIGGER api_registration_seat_insert AFTER INSERT ON api_registration WHEN NEW.confirmed
+        BEGIN
+            UPDATE api_tutorial SET confirmed_count = confirmed_count + 1 WHERE id = NEW.tutorial_id;
+        END
+        """,
+        """
+        CREATE TRIGGER api_registration_seat_update AFTER UPDATE OF confirmed, tutorial_id ON api_registration
+        WHEN OLD.confirmed != NEW.confirmed OR OLD.tutorial_id != NEW.tutorial_id
+        BEGIN
+            UPDATE api_tutorial SET confirmed_count = confirmed_count - 1 WHERE OLD.confirmed AND id = OLD.tutorial_id;
+            UPDATE api_tutorial SET confirmed_count = confirmed_count + 1 WHERE NEW.confirmed AND id = NEW.tutorial_id;
+        END
+        """,
+        """
+        CREATE TRIGGER api_registration_seat_delete AFTER DELETE ON api_registration WHEN OLD.confirmed
+        BEGIN
+            UPDATE api_tutorial SET confirmed_count = confirmed_count - 1 WHERE id = OLD.tutorial_id;
+        END
+        """,
+    ],
+}
+
+DROP_SEAT_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS api_registration_seat_insert",
+    "DROP TRIGGER IF EXISTS api_registration_seat_update",
+    "DROP TRIGGER IF EXISTS api_registration_seat_delete",
+]
+
+RECOUNT_CONFIRMED = """
+UPDATE api_tutorial SET confirmed_count = (
+    SELECT COUNT(*) FROM api_registration
+    WHERE api_registration.tutorial_id = api_tutorial.id AND api_registration.confirmed
+)
+"""
+
+
+def create_seat_triggers(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in SEAT_TRIGGERS:
+        raise NotImplementedError(f"Os contadores de vagas não têm gatilhos para o banco {vendor}.")
+    for statement in SEAT_TRIGGERS[vendor]:
+        schema_editor.execute(statement)
+    # Seats freed by registrations deleted while the counter was kept by the application may have leaked.
+    schema_editor.execute(RECOUNT_CONFIRMED)
+
+
+def drop_seat_triggers(apps, schema_editor):
+    for statement in DROP_SEAT_TRIGGERS:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0020_idempotencykey_client"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_seat_triggers, drop_seat_triggers),
+    ]
@@ -1,8 +1,11 @@
+import os
 import uuid
-import base64
 import logging
+import itertools
+from datetime import timedelta
 
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Q
 from django.utils.translation import gettext_lazy as _
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator
@@ -10,13 +13,26 @@ from django.core.files.base import ContentFile
 from django.utils import timezone
 from django.dispatch import receiver
 from django.core.mail import EmailMessage
-from django.template.loader import render_to_string
-from django.template import Template, Context
+from django.core.serializers.json import DjangoJSONEncoder
+from django.template import Context
 from django.urls import reverse
 from django.conf import settings
 
 from apps.api.validators import cpf_validator
-from apps.api.utils import html_to_pdf
+from apps.api.caching import forget_event_documents
+from apps.api.emails import RateLimiter, SMTPConnectionPool, render_email, send_messages
+from apps.api.utils import (
+    STAMP_PLACEHOLDER,
+    certificate_content_hash,
+    certificate_generations,
+    encode_signature_image,
+    get_certificate_template,
+    html_to_pdf,
+    html_to_pdf_batch,
+    html_to_stamped_pdfs,
+    localize_assets,
+    on_demand_render_slot,
+)
 
 
 class Event(models.Model):
@@ -63,6 +79,25 @@ class Event(models.Model):
         ),
     )
 
+    certificate_attachment_max_kb = models.PositiveIntegerField(
+        _("Tamanho máximo do certificado anexado (KB)"),
+        blank=True,
+        null=True,
+        help_text=_(
+            "Certificados maiores que isso são enviados por e-mail só com o link de download, sem o PDF anexado"
+            " (vazio usa o padrão CERTIFICATE_EMAIL_ATTACHMENT_MAX_KB, 0 nunca anexa)"
+        ),
+    )
+    tutorial_conflicts = models.JSONField(
+        _("Conflitos de horário entre tutoriais"),
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text=_(
+            "Para cada tutorial do evento, os tutoriais com horário sobreposto, refeito quando os horários mudam"
+        ),
+    )
+
     class Meta:
         verbose_name = _("Evento")
         verbose_name_plural = _("Eventos")
@@ -72,15 +107,122 @@ class Event(models.Model):
 
     def save(self, *args, **kwargs):
         """
-        Override save method to ensure start_date is before end_date and to generate a slug.
+        Override save method to ensure start_date is before end_date, to generate a slug and to inline the remote
+        resources of a newly uploaded certificate template.
         """
         self.full_clean()
         if self.start_date >= self.end_date:
             raise ValueError(_("A data de início deve ser anterior à data de fim."))
         if not self.slug:
             self.slug = slugify(self.title)
+        if self.certificate_template and not self.certificate_template._committed:
+            self.localize_certificate_template()
         return super().save(*args, **kwargs)
 
+    @property
+    def certificate_attachment_max_size(self):
+        """
+        Size, in bytes, up to which certificates are attached to the emails.
+        """
+        max_kb = self.certificate_attachment_max_kb
+        if max_kb is None:
+            max_kb = settings.CERTIFICATE_EMAIL_ATTACHMENT_MAX_KB
+        return max_kb * 1024
+
+    def rebuild_tutorial_conflicts(self):
+        """
+        Rebuild the map of the tutorials of the event whose times overlap, keyed by the tutorial id as a string.
+        """
+        tutorials = sorted(self.tutorials.values_list("pk", "start_datetime", "end_datetime"), key=lambda t: t[1])
+        conflicts = {str(pk): [] for pk, _start, _end in tutorials}
+        running = []
+        for pk, start, end in tutorials:
+            running = [(other, other_end) for other, other_end in running if other_end > start]
+            for other, _other_end in running:
+                conflicts[str(pk)].append(other)
+                conflicts[str(other)].append(pk)
+            running.append((pk, end))
+
+        self.tutorial_conflicts = conflicts
+        Event.objects.filter(pk=self.pk).update(tutorial_conflicts=conflicts)
+        return conflicts
+
+    def attendee_schedule(self, cpf):
+        """
+        Subscription state of the attendee with the given CPF in every tutorial of the event, in the format of the
+        ``check_subscription`` endpoint plus the tutorial id.
+
+        As there, an attendee who isn't registered yet gets neither ``registration_id`` nor ``available``, so the
+        subscription form asks for their data.
+
+        Uses two queries, whatever the number of tutorials: one for the tutorials, checked against each other with
+        the conflict map of the event (rebuilt when a tutorial is missing from it), and one for the attendee and their
+        registrations, whose tutorials in other events are checked by their times.
+        """
+        tutorials = list(
+            self.tutorials.order_by("start_datetime", "pk").values_list("pk", "start_datetime", "end_datetime")
+        )
+        conflicts = self.tutorial_conflicts
+        if any(str(pk) not in conflicts for pk, _start, _end in tutorials):
+            conflicts = self.rebuild_tutorial_conflicts()
+
+        fields = (
+            "pk",
+            "confirmed",
+            "tutorial_id",
+            "tutorial__event_id",
+            "tutorial__start_datetime",
+            "tutorial__end_datetime",
+        )
+        rows = list(Attendee.objects.filter(cpf=cpf).values(*(f"registrations__{field}" for field in fields)))
+        if not rows:
+            return [{"tutorial_id": pk, "subscribed": False} for pk, _start, _end in tutorials]
+
+        registered = {}
+        elsewhere = []
+        for row in rows:
+            if row["registrations__pk"] is None:
+                continue
+            registration = {field: row[f"registrations__{field}"] for field in fields}
+            registered[registration["tutorial_id"]] = registration
+            if registration["tutorial__event_id"] != self.pk:
+                elsewhere.append((registration["tutorial__start_datetime"], registration["tutorial__end_datetime"]))
+
+        schedule = []
+        for pk, start, end in tutorials:
+            registration = registered.get(pk)
+            if registration:
+                schedule.append(
+                    {"tutorial_id": pk, "subscribed": registration["confirmed"], "registration_id": registration["pk"]}
+                )
+                continue
+            available = not any(other in registered for other in conflicts[str(pk)]) and not any(
+                other_start < end and other_end > start for other_start, other_end in elsewhere
+            )
+            schedule.append({"tutorial_id": pk, "subscribed": False, "available": available})
+        return schedule
+
+    def localize_certificate_template(self):
+        """
+        Inline the remote resources of a newly uploaded certificate template, so certificates are printed without
+        touching the network.
+        """
+        self.certificate_template.seek(0)
+        try:
+            content = self.certificate_template.read().decode("utf-8")
+        except UnicodeDecodeError as e:
+            logging.warning("Modelo de certificado não está em UTF-8, recursos remotos não foram baixados: %s", e)
+            self.certificate_template.seek(0)
+            return
+
+        localized = localize_assets(content)
+        if localized == content:
+            self.certificate_template.seek(0)
+            return
+        self.certificate_template = ContentFile(
+            localized.encode("utf-8"), name=os.path.basename(self.certificate_template.name)
+        )
+
 
 class CertificateSigner(models.Model):
     """
@@ -96,6 +238,13 @@ class CertificateSigner(models.Model):
         null=True,
         help_text=_("Imagem da assinatura do signatário, usada nos certificados"),
     )
+    signature_image_data_uri = models.TextField(
+        _("Assinatura codificada"),
+        blank=True,
+        default="",
+        editable=False,
+        help_text=_("Imagem da assinatura normalizada em PNG e codificada em base64, usada nos certificados"),
+    )
 
     class Meta:
         verbose_name = _("Signatário do Certificado")
@@ -104,15 +253,41 @@ class CertificateSigner(models.Model):
     def __str__(self):
         return f"{self.name} - {self.title}"
 
+    def save(self, *args, **kwargs):
+        """
+        Override save method to encode the signature image once, when it is uploaded.
+        """
+        if not self.signature_image:
+            self.signature_image_data_uri = ""
+        elif not self.signature_image._committed:
+            self.signature_image.seek(0)
+            self.signature_image_data_uri = encode_signature_image(self.signature_image.read())
+            self.signature_image.seek(0)
+        return super().save(*args, **kwargs)
+
     @property
     def signature_image_base64(self):
         """
-        Returns the base64 encoded string of the signature image if it exists.
+        Returns the signature image as a base64 encoded data URI if it exists.
+
+        Signers saved before the data URI was stored get it encoded and saved on first access.
         """
-        if self.signature_image:
+        if not self.signature_image:
+            return None
+        if not self.signature_image_data_uri:
             with self.signature_image.open("rb") as img_file:
-                return f"data:image/png;base64,{base64.b64encode(img_file.read()).decode('utf-8')}"
-        return None
+                self.signature_image_data_uri = encode_signature_image(img_file.read())
+            CertificateSigner.objects.filter(pk=self.pk).update(signature_image_data_uri=self.signature_image_data_uri)
+        return self.signature_image_data_uri
+
+
+class EventCertificateSignerManager(models.Manager):
+    """
+    Manager that always loads the signer along with the relationship, as certificates use both.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().select_related("signer")
 
 
 class EventCertificateSigner(models.Model):
@@ -138,6 +313,8 @@ class EventCertificateSigner(models.Model):
         help_text=_("Ordem de exibição dos signatários no certificado, começando do 1"),
     )
 
+    objects = EventCertificateSignerManager()
+
     class Meta:
         verbose_name = _("Signatário do Certificado do Evento")
         verbose_name_plural = _("Signatários dos Certificados do Evento")
@@ -147,6 +324,26 @@ class EventCertificateSigner(models.Model):
         return f"{self.signer.name} ({self.event.title})"
 
 
+def forget_tutorial_events(*tutorial_ids):
+    """
+    Drop the cached detail documents of the events of the given tutorials.
+    """
+    tutorial_ids = [tutorial_id for tutorial_id in tutorial_ids if tutorial_id]
+    if tutorial_ids:
+        forget_event_documents(*Event.objects.filter(tutorials__in=tutorial_ids).values_list("slug", flat=True))
+
+
+class TutorialQuerySet(models.QuerySet):
+    def with_subscriptions(self):
+        """
+        Tutorials annotated with their number of confirmed registrations and with their instructors prefetched, so
+        serializing any number of them takes the same number of queries.
+        """
+        return self.annotate(
+            confirmed_registrations_count=Count("registrations", filter=Q(registrations__confirmed=True))
+        ).prefetch_related("instructors")
+
+
 class Tutorial(models.Model):
     """
     Model representing a tutorial within an event
@@ -162,6 +359,12 @@ class Tutorial(models.Model):
     start_datetime = models.DateTimeField(_("Início"))
     end_datetime = models.DateTimeField(_("Fim"))
     vacancies = models.PositiveIntegerField(_("Vagas"), validators=[MinValueValidator(1)])
+    confirmed_count = models.PositiveIntegerField(
+        _("Inscrições confirmadas"),
+        default=0,
+        editable=False,
+        help_text=_("Quantidade de vagas ocupadas por inscrições confirmadas, mantida a cada confirmação"),
+    )
     duration = models.DurationField(
         _("Duração"),
         help_text=_("Duração do tutorial em horas, minutos e segundos"),
@@ -189,16 +392,26 @@ class Tutorial(models.Model):
         help_text=_("Instrutores que ministrarão o tutorial"),
     )
 
+    objects = TutorialQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("Tutorial")
         verbose_name_plural = _("Tutoriais")
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if {"event_id", "start_datetime", "end_datetime"} <= self.__dict__.keys():
+            self._schedule = (self.event_id, self.start_datetime, self.end_datetime) if self.pk else None
+        else:
+            self._schedule = models.DEFERRED
+
     def __str__(self):
         return f"{self.title} ({self.event.title})"
 
     def save(self, *args, **kwargs):
         """
-        Override save method to ensure start_datetime is before end_datetime
+        Override save method to ensure start_datetime is before end_datetime, and to rebuild the conflict map of
+        the event when the tutorial times change.
         """
         self.full_clean()
 
@@ -208,7 +421,26 @@ class Tutorial(models.Model):
         if self.duration:
             self.end_datetime = self.start_datetime + self.duration
 
-        return super().save(*args, **kwargs)
+        with transaction.atomic():
+            if self._schedule is models.DEFERRED:
+                # Loaded with deferred fields, so the stored schedule is unknown: read it before overwriting it.
+                self._schedule = (
+                    Tutorial.objects.filter(pk=self.pk)
+                    .values_list("event_id", "start_datetime", "end_datetime")
+                    .first()
+                    if self.pk
+                    else None
+                )
+            result = super().save(*args, **kwargs)
+            schedule = (self.event_id, self.start_datetime, self.end_datetime)
+            if schedule != self._schedule:
+                self.event.rebuild_tutorial_conflicts()
+                previous_event_id = self._schedule[0] if self._schedule else None
+                if previous_event_id not in (None, self.event_id):
+                    for event in Event.objects.filter(pk=previous_event_id):
+                        event.rebuild_tutorial_conflicts()
+            self._schedule = schedule
+        return result
 
     def can_subscribe(self, attendee):
         """
@@ -247,7 +479,19 @@ class Tutorial(models.Model):
         """
         Check if there are available slots for the tutorial
         """
-        return self.confirmed_registrations.count() < self.vacancies
+        return self.confirmed_count < self.vacancies
+
+    def email_context(self):
+        """
+        Context shared by the emails to every attendee of the tutorial.
+        """
+        return {
+            "tutorial_title": self.title,
+            "event_title": self.event.title,
+            "tutorial_start_date": self.start_datetime.strftime("%d/%m/%Y"),
+            "tutorial_date_hour": timezone.localtime(self.start_datetime).strftime("%H:%M"),
+            "tutorial_location": self.location,
+        }
 
     @property
     def has_started(self):
@@ -339,6 +583,14 @@ class Registration(models.Model):
         null=True,
         help_text=_("PDF do certificado emitido para o participante"),
     )
+    certificate_hash = models.CharField(
+        _("Hash do certificado"),
+        max_length=64,
+        blank=True,
+        default="",
+        editable=False,
+        help_text=_("Hash do conteúdo renderizado do certificado, usado para evitar gerar o mesmo PDF novamente"),
+    )
     certificate_sent = models.BooleanField(
         _("Certificado enviado"),
         default=False,
@@ -350,9 +602,65 @@ class Registration(models.Model):
         verbose_name_plural = _("Inscrições")
         unique_together = ("tutorial", "attendee")
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if "confirmed" in self.__dict__ and "tutorial_id" in self.__dict__:
+            self._held_seat = self.tutorial_id if self.pk and self.confirmed else None
+        else:
+            self._held_seat = models.DEFERRED
+
     def __str__(self):
         return f"{self.attendee.full_name} em {self.tutorial.title}"
 
+    @property
+    def held_seat(self):
+        """
+        The id of the tutorial whose confirmed count includes this registration, as stored, or None.
+        """
+        if self._held_seat is models.DEFERRED:
+            self._held_seat = (
+                Registration.objects.filter(pk=self.pk, confirmed=True).values_list("tutorial_id", flat=True).first()
+            )
+        return self._held_seat
+
+    def save(self, *args, **kwargs):
+        """
+        Override save method to drop the cached events of the tutorials whose seats the registration moves.
+
+        The confirmed count of the tutorials is kept by database triggers (see migration 0021), in the same
+        statement that writes the registration.
+        """
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and not {"confirmed", "tutorial", "tutorial_id"} & set(update_fields):
+            return super().save(*args, **kwargs)
+
+        held_seat = self.held_seat if self.pk else None
+        super().save(*args, **kwargs)
+        seat = self.tutorial_id if self.confirmed else None
+        if held_seat != seat:
+            forget_tutorial_events(held_seat, seat)
+        self._held_seat = seat
+
+    def confirm(self):
+        """
+        Confirm the registration, taking one of the tutorial seats.
+
+        The registration is confirmed by a single conditional update, which only matches while the tutorial has
+        seats left; the seat is taken by a trigger in that same statement, so concurrent confirmations never
+        overbook the tutorial. Returns whether the registration is confirmed.
+        """
+        confirmed = Registration.objects.filter(
+            pk=self.pk, confirmed=False, tutorial__confirmed_count__lt=F("tutorial__vacancies")
+        ).update(confirmed=True)
+        if confirmed:
+            forget_event_documents(self.tutorial.event.slug)
+        else:
+            confirmed = Registration.objects.filter(pk=self.pk, confirmed=True).exists()
+
+        self.confirmed = bool(confirmed)
+        self._held_seat = self.tutorial_id if self.confirmed else None
+        return self.confirmed
+
     @property
     def certificate_generated(self):
         """
@@ -360,15 +668,25 @@ class Registration(models.Model):
         """
         return self.certificate_pdf is not None and self.certificate_pdf.name != ""
 
-    def render_certificate(self):
+    @property
+    def certificate_name(self):
+        """
+        The attendee name as written in the certificate.
+        """
+        return self.attendee.full_name.strip().upper()
+
+    def render_certificate(self, stamp=False):
         """
         Render the certificate for the registration.
+
+        With ``stamp=True`` the attendee name is replaced by a placeholder, rendering the background shared by
+        every certificate of the tutorial.
         """
         if not self.tutorial.event.certificate_template:
             raise ValueError(_("O evento não possui um modelo de certificado definido."))
 
         context = {
-            "attendee_name": self.attendee.full_name.strip().upper(),
+            "attendee_name": STAMP_PLACEHOLDER if stamp else self.certificate_name,
             "tutorial_title": self.tutorial.title,
             "event_title": self.tutorial.event.title,
             "event_date": self.tutorial.start_datetime.strftime("%d/%m/%Y"),
@@ -377,50 +695,188 @@ class Registration(models.Model):
             "certificate_signers": self.tutorial.event.certificate_signers.all(),
         }
 
-        with self.tutorial.event.certificate_template.open("r") as template_file:
-            template_content = template_file.read()
+        return get_certificate_template(self.tutorial.event).render(Context(context))
 
-        return Template(template_content).render(Context(context))
-
-    def generate_certificate(self, check_confirmed=True, check_present=True):
+    def check_certificate_eligibility(self, check_confirmed=True, check_present=True):
         """
-        Generate the PDF certificate for the registration.
+        Raise a ValueError if a certificate can't be generated for the registration.
         """
-
         if check_confirmed and not self.confirmed:
             raise ValueError(_("O certificado só pode ser gerado para inscrições confirmadas."))
         if check_present and not self.present:
             raise ValueError(_("O certificado só pode ser gerado para participantes presentes."))
 
+    def certificate_is_current(self, content_hash):
+        """
+        Check if the stored certificate PDF was generated from content with the given hash.
+        """
+        return (
+            self.certificate_generated
+            and self.certificate_hash == content_hash
+            and self.certificate_pdf.storage.exists(self.certificate_pdf.name)
+        )
+
+    def save_certificate_pdf(self, pdf_file_content, content_hash="", save=True):
+        """
+        Store the PDF content as the registration certificate, along with the hash of the content it was
+        generated from.
+
+        With ``save=False`` only the file is written, leaving the registration row to be saved by the caller.
+        """
+        pdf_file_name = f"{self.uuid}.pdf"
+        self.certificate_hash = content_hash
+        self.certificate_pdf.save(pdf_file_name, ContentFile(pdf_file_content), save=save)
+
+    def generate_certificate(self, check_confirmed=True, check_present=True, save=True, force=False):
+        """
+        Generate the PDF certificate for the registration.
+
+        The PDF is only printed when the rendered certificate changed since it was last generated, unless
+        ``force`` is set. Returns whether a new PDF was generated.
+        """
+        self.check_certificate_eligibility(check_confirmed, check_present)
+
         try:
-            pdf_file_content = html_to_pdf(self.render_certificate())
-            pdf_file_name = f"{self.uuid}.pdf"
-            self.certificate_pdf.save(pdf_file_name, ContentFile(pdf_file_content), save=False)
+            html_content = self.render_certificate()
+            content_hash = certificate_content_hash(self.tutorial.event, html_content)
+            if not force and self.certificate_is_current(content_hash):
+                return False
+            self.save_certificate_pdf(html_to_pdf(html_content), content_hash, save=save)
         except Exception as e:
             logging.error("Erro ao gerar certificado: %s", e)
             raise RuntimeError(_("Erro ao gerar o certificado."))
 
-        self.save()
+        return True
 
-    def send_certificate_email(self):
+    def ensure_certificate(self):
         """
-        Send the certificate email to the attendee.
+        Generate the certificate now if it wasn't generated yet, e.g. when it is downloaded.
+
+        Concurrent calls for the same registration render it only once: the others wait for that render. Renders
+        also hold one of the process on-demand render slots, raising :class:`RenderCapacityError` when none is
+        free in time. Returns the registration as stored after the generation.
+        """
+
+        def generate():
+            registration = Registration.objects.select_related("attendee", "tutorial__event").get(pk=self.pk)
+            if not registration.certificate_generated:
+                with on_demand_render_slot():
+                    registration.generate_certificate()
+            return registration
+
+        return certificate_generations.do(self.uuid, generate)
+
+    @classmethod
+    def stamp_certificates(cls, registrations, html_documents, batch_size=50):
+        """
+        Generate the PDF certificates for many registrations by stamping each attendee name on the background
+        of its tutorial, printed once.
+
+        Tutorials whose template has no place to stamp the name fall back to printing the full certificates.
+        Returns the PDF content of each registration, in the same order.
+        """
+        pdf_documents = [None] * len(registrations)
+        tutorials = {}
+        for index, registration in enumerate(registrations):
+            tutorials.setdefault(registration.tutorial_id, []).append(index)
+
+        for indexes in tutorials.values():
+            background_html = registrations[indexes[0]].render_certificate(stamp=True)
+            pages = html_to_stamped_pdfs(background_html, [registrations[index].certificate_name for index in indexes])
+            if pages is None:
+                pages = html_to_pdf_batch([html_documents[index] for index in indexes], batch_size=batch_size)
+            for index, page in zip(indexes, pages):
+                pdf_documents[index] = page
+
+        return pdf_documents
+
+    @classmethod
+    def generate_certificates(
+        cls, registrations, check_confirmed=True, check_present=True, batch_size=50, save=True, force=False, stamp=False
+    ):
+        """
+        Generate the PDF certificates for many registrations, printing them in batches.
+
+        Registrations whose rendered certificate didn't change since their PDF was generated are skipped,
+        unless ``force`` is set. With ``stamp=True`` the certificates are made by :meth:`stamp_certificates`.
+
+        Returns a list with the exception raised for each registration, or None when its certificate was
+        generated or is already up to date, in the same order as the given registrations.
+        """
+        errors = [None] * len(registrations)
+        pending = []
+        content_hashes = []
+        html_documents = []
+
+        for index, registration in enumerate(registrations):
+            try:
+                registration.check_certificate_eligibility(check_confirmed, check_present)
+            except ValueError as e:
+                errors[index] = e
+                continue
+
+            try:
+                html_content = registration.render_certificate()
+                content_hash = certificate_content_hash(registration.tutorial.event, html_content, stamp)
+                if not force and registration.certificate_is_current(content_hash):
+                    continue
+                html_documents.append(html_content)
+                content_hashes.append(content_hash)
+                pending.append(index)
+            except Exception as e:
+                logging.error("Erro ao gerar certificado: %s", e)
+                errors[index] = RuntimeError(_("Erro ao gerar o certificado."))
+
+        if not html_documents:
+            return errors
+
+        try:
+            if stamp:
+                pdf_documents = cls.stamp_certificates(
+                    [registrations[index] for index in pending], html_documents, batch_size=batch_size
+                )
+            else:
+                pdf_documents = html_to_pdf_batch(html_documents, batch_size=batch_size)
+        except Exception as e:
+            logging.error("Erro ao gerar certificados: %s", e)
+            for index in pending:
+                errors[index] = RuntimeError(_("Erro ao gerar o certificado."))
+            return errors
+
+        for index, content_hash, pdf_file_content in zip(pending, content_hashes, pdf_documents):
+            try:
+                registrations[index].save_certificate_pdf(pdf_file_content, content_hash, save=save)
+            except Exception as e:
+                logging.error("Erro ao gerar certificado: %s", e)
+                errors[index] = RuntimeError(_("Erro ao gerar o certificado."))
+
+        return errors
+
+    @property
+    def certificate_attachable(self):
+        """
+        Whether the certificate PDF is small enough to be attached to the email, as set for the event.
+        """
+        return self.certificate_pdf.size <= self.tutorial.event.certificate_attachment_max_size
+
+    def certificate_email(self):
+        """
+        Build the certificate email to the attendee, with the certificate PDF attached when it is
+        :attr:`certificate_attachable`, or only its download link otherwise.
         """
         if not self.certificate_generated:
             raise ValueError(_("O certificado ainda não foi gerado."))
 
+        attached = self.certificate_attachable
+
         subject = _('Seu Certificado de Participação no Tutorial: "{}"').format(self.tutorial.title)
         certificate_download_link = reverse("tutorials-certificate", kwargs={"uuid": self.uuid})
 
-        html_content = render_to_string(
+        html_content = render_email(
             "email/tutorial_certificate.html",
+            {**self.tutorial.email_context(), "certificate_attached": attached},
             {
-                "name": self.attendee.full_name.strip().upper(),
-                "tutorial_title": self.tutorial.title,
-                "event_title": self.tutorial.event.title,
-                "tutorial_start_date": self.tutorial.start_datetime.strftime("%d/%m/%Y"),
-                "tutorial_date_hour": timezone.localtime(self.tutorial.start_datetime).strftime("%H:%M"),
-                "tutorial_location": self.tutorial.location,
+                "name": self.certificate_name,
                 "certificate_download_link": f"{settings.SITE_URL}{certificate_download_link}",
             },
         )
@@ -433,32 +889,43 @@ class Registration(models.Model):
         )
 
         email.content_subtype = "html"
-        with self.certificate_pdf.open("rb") as f:
-            email.attach(self.certificate_pdf.name, f.read(), "application/pdf")
-        email.send(fail_silently=False)
+        if attached:
+            with self.certificate_pdf.open("rb") as f:
+                email.attach(self.certificate_pdf.name, f.read(), "application/pdf")
+        return email
+
+    def send_certificate_email(self, save=True):
+        """
+        Send the certificate email to the attendee.
+        """
+        self.certificate_email().send(fail_silently=False)
 
         self.certificate_sent = True
-        self.save()
+        if save:
+            self.save()
+
+    def queue_certificate_email(self):
+        """
+        Queue the certificate email to the attendee in the outbox, unless it is already waiting there.
+        """
+        if not self.certificate_generated:
+            raise ValueError(_("O certificado ainda não foi gerado."))
 
+        if not self.emails.filter(kind=OutboxEmail.Kind.CERTIFICATE, status=OutboxEmail.Status.PENDING).exists():
+            OutboxEmail.objects.create(registration=self, kind=OutboxEmail.Kind.CERTIFICATE)
 
-@receiver(models.signals.post_save, sender=Registration)
-def send_confirmation_email(sender, instance, created, **kwargs):
-    """
-    Signal to send a confirmation email after a registration is created.
-    """
-    if created:
-        subject = f"Confirmação de Inscrição no Tutorial: {instance.tutorial.title}"
+    def confirmation_email(self):
+        """
+        Build the email asking the attendee to confirm the registration.
+        """
+        subject = f"Confirmação de Inscrição no Tutorial: {self.tutorial.title}"
 
-        html_content = render_to_string(
+        html_content = render_email(
             "email/tutorial_subscription_confirmation.html",
+            self.tutorial.email_context(),
             {
-                "name": instance.attendee.full_name,
-                "tutorial_title": instance.tutorial.title,
-                "event_title": instance.tutorial.event.title,
-                "tutorial_start_date": instance.tutorial.start_datetime.strftime("%d/%m/%Y"),
-                "tutorial_date_hour": timezone.localtime(instance.tutorial.start_datetime).strftime("%H:%M"),
-                "tutorial_location": instance.tutorial.location,
-                "confirmation_link": f"{settings.SITE_URL}/confirmation/{instance.uuid}",
+                "name": self.attendee.full_name,
+                "confirmation_link": f"{settings.SITE_URL}/confirmation/{self.uuid}",
             },
         )
 
@@ -466,7 +933,389 @@ def send_confirmation_email(sender, instance, created, **kwargs):
             subject=subject,
             body=html_content,
             from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[instance.attendee.email],
+            to=[self.attendee.email],
         )
         email.content_subtype = "html"
-        email.send(fail_silently=False)
+        return email
+
+
+class OutboxEmailQuerySet(models.QuerySet):
+    def due(self):
+        """
+        Emails waiting to be delivered whose next attempt time has come.
+        """
+        return self.filter(status=OutboxEmail.Status.PENDING, next_attempt_at__lte=timezone.now())
+
+
+class OutboxEmail(models.Model):
+    """
+    Model representing an email to an attendee waiting to be delivered by the ``send_emails`` command.
+
+    The row is written in the same transaction as the change that triggers the email, and the message is built
+    from the registration when it is delivered. Failed deliveries are retried with exponential backoff.
+    """
+
+    class Kind(models.TextChoices):
+        CONFIRMATION = "confirmation", _("Confirmação de inscrição")
+        CERTIFICATE = "certificate", _("Certificado")
+
+    class Status(models.TextChoices):
+        PENDING = "pending", _("Pendente")
+        SENT = "sent", _("Enviado")
+        FAILED = "failed", _("Falhou")
+
+    # How long a worker holds an email it is delivering before other workers may take it.
+    LEASE = timedelta(minutes=5)
+
+    registration = models.ForeignKey(
+        Registration,
+        on_delete=models.CASCADE,
+        related_name="emails",
+        verbose_name=_("Inscrição"),
+    )
+    kind = models.CharField(_("Tipo"), max_length=20, choices=Kind.choices)
+    status = models.CharField(_("Situação"), max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(_("Tentativas"), default=0)
+    next_attempt_at = models.DateTimeField(_("Próxima tentativa"), default=timezone.now)
+    last_error = models.TextField(_("Último erro"), blank=True, default="")
+    created_at = models.DateTimeField(_("Criado em"), auto_now_add=True)
+    sent_at = models.DateTimeField(_("Enviado em"), blank=True, null=True)
+
+    objects = OutboxEmailQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _("E-mail na fila")
+        verbose_name_plural = _("E-mails na fila")
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} para {self.registration}"
+
+    def build_message(self):
+        """
+        Build the email message from the current state of the registration.
+        """
+        if self.kind == self.Kind.CERTIFICATE:
+            return self.registration.certificate_email()
+        return self.registration.confirmation_email()
+
+    def claim(self):
+        """
+        Take the email for delivery, holding it for :attr:`LEASE`.
+
+        The email is only taken if no other worker took it since it was loaded. Returns whether it was taken.
+        """
+        next_attempt_at = timezone.now() + self.LEASE
+        claimed = OutboxEmail.objects.filter(
+            pk=self.pk, status=self.Status.PENDING, next_attempt_at=self.next_attempt_at
+        ).update(next_attempt_at=next_attempt_at)
+        if claimed:
+            self.next_attempt_at = next_attempt_at
+        return bool(claimed)
+
+    def retry_delay(self):
+        """
+        Time to wait before the next attempt, doubling after each failed one.
+        """
+        seconds = settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** max(self.attempts - 1, 0)
+        return timedelta(seconds=min(seconds, settings.EMAIL_OUTBOX_MAX_RETRY_DELAY))
+
+    def mark_sent(self):
+        self.attempts += 1
+        self.status = self.Status.SENT
+        self.sent_at = timezone.now()
+        self.last_error = ""
+        self.save(update_fields=["attempts", "status", "sent_at", "last_error"])
+        if self.kind == self.Kind.CERTIFICATE:
+            Registration.objects.filter(pk=self.registration_id).update(certificate_sent=True)
+
+    def mark_failed(self, error):
+        self.attempts += 1
+        self.last_error = str(error)
+        if self.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            self.status = self.Status.FAILED
+        else:
+            self.next_attempt_at = timezone.now() + self.retry_delay()
+        self.save(update_fields=["attempts", "status", "next_attempt_at", "last_error"])
+
+    @classmethod
+    def deliver(cls, emails, connections=1, rate=0, chunk_size=100):
+        """
+        Deliver the given emails concurrently through a pool of ``connections`` SMTP connections, sending at most
+        ``rate`` emails per second (0 for no limit).
+
+        Emails are claimed and built, and their outcome saved, by the calling thread, in chunks of ``chunk_size``;
+        only the SMTP traffic happens in the pool threads. Emails taken by another worker meanwhile are skipped.
+        Returns the number of emails sent and failed.
+        """
+        sent = failed = 0
+        pool = SMTPConnectionPool(max(connections, 1))
+        rate_limiter = RateLimiter(rate)
+        emails = iter(emails)
+
+        try:
+            while chunk := list(itertools.islice(emails, chunk_size)):
+                claimed = []
+                messages = []
+                for email in chunk:
+                    if not email.claim():
+                        continue
+                    try:
+                        messages.append(email.build_message())
+                    except Exception as e:
+                        logging.warning("Erro ao montar e-mail %s: %s", email.pk, e)
+                        email.mark_failed(e)
+                        failed += 1
+                    else:
+                        claimed.append(email)
+
+                for email, error in zip(claimed, send_messages(messages, pool, rate_limiter)):
+                    if error is None:
+                        email.mark_sent()
+                        sent += 1
+                    else:
+                        email.mark_failed(error)
+                        failed += 1
+        finally:
+            pool.close()
+        return sent, failed
+
+
+class SubscriptionRequest(models.Model):
+    """
+    Model representing a subscription waiting in the admission queue, used when ``REGISTRATION_ADMISSION_QUEUE`` is
+    enabled.
+
+    The ``subscribe`` endpoint only stores the request and answers with its ticket; the ``process_subscriptions``
+    command subscribes the attendees in arrival order, many requests per transaction, and clients poll the ticket
+    for the outcome.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", _("Na fila")
+        SUBSCRIBED = "subscribed", _("Inscrito")
+        REJECTED = "rejected", _("Recusado")
+
+    ticket = models.UUIDField(_("Senha"), default=uuid.uuid4, editable=False, unique=True)
+    tutorial = models.ForeignKey(
+        Tutorial,
+        on_delete=models.CASCADE,
+        related_name="subscription_requests",
+        verbose_name=_("Tutorial"),
+    )
+    cpf = models.CharField(_("CPF"), max_length=11)
+    full_name = models.CharField(_("Nome completo"), max_length=255, blank=True, default="")
+    email = models.EmailField(_("E-mail"), blank=True, default="")
+    birthday = models.DateField(_("Data de nascimento"), blank=True, null=True)
+    status = models.CharField(_("Situação"), max_length=10, choices=Status.choices, default=Status.QUEUED)
+    error = models.TextField(_("Motivo da recusa"), blank=True, default="")
+    registration = models.ForeignKey(
+        Registration,
+        on_delete=models.SET_NULL,
+        related_name="subscription_requests",
+        verbose_name=_("Inscrição"),
+        blank=True,
+        null=True,
+    )
+    created_at = models.DateTimeField(_("Criado em"), auto_now_add=True)
+    processed_at = models.DateTimeField(_("Processado em"), blank=True, null=True)
+
+    class Meta:
+        verbose_name = _("Pedido de inscrição")
+        verbose_name_plural = _("Pedidos de inscrição")
+        indexes = [models.Index(fields=["status", "id"])]
+
+    def __str__(self):
+        return f"{self.cpf} em {self.tutorial_id} ({self.get_status_display()})"
+
+    @property
+    def position(self):
+        """
+        Position of the request in the queue, starting at 1, or None when it was already processed.
+        """
+        if self.status != self.Status.QUEUED:
+            return None
+        return SubscriptionRequest.objects.filter(status=self.Status.QUEUED, pk__lte=self.pk).count()
+
+    def subscribe(self):
+        """
+        Create or update the attendee with the data of the request and subscribe it to the tutorial.
+        """
+        attendee, created = Attendee.objects.get_or_create(cpf=self.cpf)
+
+        if created and (not self.full_name or not self.email or not self.birthday):
+            raise ValueError(_("Name, email, and birthday are required for new attendees."))
+
+        attendee.full_name = self.full_name or attendee.full_name
+        attendee.email = self.email or attendee.email
+        attendee.birthday = self.birthday or attendee.birthday
+        attendee.save()
+
+        return self.tutorial.subscribe(attendee)
+
+    def process(self):
+        """
+        Subscribe the attendee and record the outcome of the request.
+
+        A request that fails, for whatever reason, is rejected with the error. The outcome is only recorded if no
+        other worker processed the request since it was loaded, otherwise everything done here is rolled back.
+        Returns whether the request was processed.
+        """
+        registration = None
+        error = ""
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    registration = self.subscribe()
+            except ValueError as e:
+                error = str(e)
+            except Exception as e:
+                # Any other failure rejects only this request, so it can't stall the rest of the queue.
+                logging.exception("Erro ao processar o pedido de inscrição %s", self.pk)
+                error = str(e) or e.__class__.__name__
+
+            status = self.Status.REJECTED if error else self.Status.SUBSCRIBED
+            processed_at = timezone.now()
+            processed = SubscriptionRequest.objects.filter(pk=self.pk, status=self.Status.QUEUED).update(
+                status=status, error=error, registration=registration, processed_at=processed_at
+            )
+            if not processed:
+                transaction.set_rollback(True)
+                return False
+
+        self.status = status
+        self.error = error
+        self.registration = registration
+        self.processed_at = processed_at
+        return True
+
+    @classmethod
+    def process_queue(cls, batch_size=50):
+        """
+        Process the next ``batch_size`` queued requests in arrival order, in a single transaction.
+
+        Returns the number of requests subscribed and rejected, or None when the queue is empty.
+        """
+        requests = list(
+            cls.objects.filter(status=cls.Status.QUEUED).select_related("tutorial__event").order_by("pk")[:batch_size]
+        )
+        if not requests:
+            return None
+
+        subscribed = rejected = 0
+        with transaction.atomic():
+            for request in requests:
+                if not request.process():
+                    continue
+                if request.status == cls.Status.SUBSCRIBED:
+                    subscribed += 1
+                else:
+                    rejected += 1
+        return subscribed, rejected
+
+
+class IdempotencyKey(models.Model):
+    """
+    Model representing the response given to a request sent with an ``Idempotency-Key`` header.
+
+    The key is reserved, with no response yet, before the action runs, so concurrent retries wait for the first one
+    instead of running the action again. Requests repeated by the same client with the same key and path within
+    ``IDEMPOTENCY_KEY_WINDOW`` seconds get the stored response back.
+    """
+
+    key = models.CharField(_("Chave"), max_length=255)
+    path = models.CharField(_("Caminho"), max_length=255)
+    client = models.CharField(_("Cliente"), max_length=255, default="")
+    request_hash = models.CharField(_("Hash da requisição"), max_length=64)
+    status_code = models.PositiveSmallIntegerField(_("Código de status"), blank=True, null=True)
+    body = models.JSONField(_("Resposta"), encoder=DjangoJSONEncoder, blank=True, null=True)
+    created_at = models.DateTimeField(_("Criado em"), default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = _("Chave de idempotência")
+        verbose_name_plural = _("Chaves de idempotência")
+        unique_together = ("key", "path", "client")
+
+    def __str__(self):
+        return f"{self.key} ({self.path})"
+
+    @property
+    def in_progress(self):
+        return self.status_code is None
+
+    @staticmethod
+    def window_start():
+        return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_WINDOW)
+
+    @classmethod
+    def reserve(cls, key, path, client, request_hash):
+        """
+        Reserve the key for a request, dropping the keys older than the window.
+
+        Returns the reserved key and True, or the key already reserved by another request and False. A reservation
+        still in progress after ``IDEMPOTENCY_KEY_LOCK_TIMEOUT`` seconds is taken over, as its request was lost.
+        """
+        cls.objects.filter(created_at__lt=cls.window_start()).delete()
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                return cls.objects.create(key=key, path=path, client=client, request_hash=request_hash), True
+        except IntegrityError:
+            pass
+
+        reserved = cls.objects.filter(key=key, path=path, client=client).first()
+        if reserved is None:
+            return cls.reserve(key, path, client, request_hash)
+        abandoned_at = now - timedelta(seconds=settings.IDEMPOTENCY_KEY_LOCK_TIMEOUT)
+        if reserved.in_progress and reserved.request_hash == request_hash and reserved.created_at < abandoned_at:
+            taken = cls.objects.filter(pk=reserved.pk, status_code=None, created_at=reserved.created_at).update(
+                created_at=now
+            )
+            if taken:
+                reserved.created_at = now
+                return reserved, True
+        return reserved, False
+
+    def finish(self, status_code, body):
+        """
+        Store the response given to the request that reserved the key.
+        """
+        self.status_code = status_code
+        self.body = body
+        self.save(update_fields=["status_code", "body"])
+
+    def release(self):
+        """
+        Drop the reservation of a request that gave no response to store, so it can be retried with the same key.
+        """
+        IdempotencyKey.objects.filter(pk=self.pk, status_code=None).delete()
+
+
+@receiver(models.signals.pre_delete, sender=Registration)
+def release_seat(sender, instance, **kwargs):
+    """
+    Signal to drop the cached events of the tutorial whose seat a confirmed registration frees when it is deleted.
+
+    Runs before the delete, while the stored registration can still tell which seat it holds; the confirmed
+    count itself is decremented by the delete trigger.
+    """
+    if instance.held_seat:
+        forget_tutorial_events(instance.held_seat)
+
+
+@receiver(models.signals.post_delete, sender=Tutorial)
+def drop_tutorial_conflicts(sender, instance, **kwargs):
+    """
+    Signal to rebuild the conflict map of the event after one of its tutorials is deleted.
+    """
+    for event in Event.objects.filter(pk=instance.event_id):
+        event.rebuild_tutorial_conflicts()
+
+
+@receiver(models.signals.post_save, sender=Registration)
+def queue_confirmation_email(sender, instance, created, **kwargs):
+    """
+    Signal to queue the confirmation email after a registration is created.
+    """
+    if created:
+        OutboxEmail.objects.create(registration=instance, kind=OutboxEmail.Kind.CONFIRMATION)
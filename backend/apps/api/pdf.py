@@ -0,0 +1,260 @@
+"""Helpers to manipulate PDF documents produced by the certificate renderer."""
+
+import unicodedata
+from io import BytesIO
+
+from pypdf import PageObject, PdfReader, PdfWriter
+from pypdf.generic import (
+    ArrayObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    NumberObject,
+)
+
+
+def write_pages(pages):
+    """
+    Writes the given pages to a new PDF document.
+
+    Only the pages are copied: the document information (creation and modification dates, producer) and the
+    file identifiers of the source document are left out, so the same pages always produce the same bytes.
+
+    :param pages: Iterable with the pypdf pages to write.
+    :return: PDF content as bytes.
+    """
+    writer = PdfWriter()
+    for page in pages:
+        writer.add_page(page)
+    output = BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def normalize(pdf_content):
+    """
+    Rewrites a PDF document without its timestamps and file identifiers, making it deterministic.
+
+    :param pdf_content: PDF content as bytes.
+    :return: Normalized PDF content as bytes.
+    """
+    return write_pages(PdfReader(BytesIO(pdf_content)).pages)
+
+
+def split_pages(pdf_content):
+    """
+    Splits a PDF document into one single-page PDF per page, normalized like :func:`normalize`.
+
+    :param pdf_content: PDF content as bytes.
+    :return: List with the content of each page as a standalone PDF, in page order.
+    """
+    return [write_pages([page]) for page in PdfReader(BytesIO(pdf_content)).pages]
+
+
+# Advance widths, in thousandths of the font size, of the characters used in attendee names (uppercased) in
+# the standard Helvetica fonts. Accented letters have the width of their base letter.
+HELVETICA_WIDTHS = {
+    **dict(zip("ABCDEFGHIJKLM", [667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833])),
+    **dict(zip("NOPQRSTUVWXYZ", [722, 778, 667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611])),
+    **dict.fromkeys("0123456789", 556),
+    " ": 278,
+    ".": 278,
+    ",": 278,
+    "-": 333,
+    "'": 191,
+}
+HELVETICA_BOLD_WIDTHS = {
+    **dict(zip("ABCDEFGHIJKLM", [722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833])),
+    **dict(zip("NOPQRSTUVWXYZ", [722, 778, 667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611])),
+    **dict.fromkeys("0123456789", 556),
+    " ": 278,
+    ".": 278,
+    ",": 278,
+    "-": 333,
+    "'": 238,
+}
+DEFAULT_CHARACTER_WIDTH = 556
+
+
+def text_width(text, font_size, bold=False):
+    """
+    Measures the width, in points, of a text written in the standard Helvetica font.
+
+    :param text: Text to measure.
+    :param font_size: Font size in points.
+    :param bold: Whether the text is written in Helvetica-Bold.
+    :return: Width of the text in points.
+    """
+    widths = HELVETICA_BOLD_WIDTHS if bold else HELVETICA_WIDTHS
+    total = 0
+    for character in text:
+        base = unicodedata.normalize("NFKD", character)[:1] or character
+        total += widths.get(base, widths.get(base.upper(), DEFAULT_CHARACTER_WIDTH))
+    return total * font_size / 1000
+
+
+def stamp_text(pdf_content, text, anchors):
+    """
+    Writes a text over the first page of a PDF document, using the standard Helvetica fonts.
+
+    Each anchor is a mapping describing where the text goes, in points from the top-left corner of the page:
+    ``x`` (where the text starts, is centered or ends, according to ``align``: ``left``, ``center`` or
+    ``right``), ``y`` (the text baseline), ``font_size``, ``bold`` and ``color`` (RGB components from 0 to 1).
+
+    :param pdf_content: PDF content as bytes, e.g. a certificate printed without the attendee name.
+    :param text: Text to write.
+    :param anchors: Iterable with the places where the text is written.
+    :return: Normalized content of the first page, with the text, as a standalone PDF.
+    """
+    writer = PdfWriter()
+    page = writer.add_page(PdfReader(BytesIO(pdf_content)).pages[0])
+    page_height = float(page.mediabox.height)
+    encoded_text = (
+        text.encode("cp1252", errors="replace").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+    )
+
+    fonts = DictionaryObject()
+    commands = []
+    for anchor in anchors:
+        bold = anchor.get("bold", False)
+        font_name = "/PyabaStampBold" if bold else "/PyabaStamp"
+        fonts[NameObject(font_name)] = DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/Helvetica-Bold" if bold else "/Helvetica"),
+                NameObject("/Encoding"): NameObject("/WinAnsiEncoding"),
+            }
+        )
+
+        x = anchor["x"]
+        width = text_width(text, anchor["font_size"], bold)
+        if anchor.get("align") == "center":
+            x -= width / 2
+        elif anchor.get("align") == "right":
+            x -= width
+
+        red, green, blue = anchor.get("color", (0, 0, 0))
+        commands.append(
+            b"q %.4f %.4f %.4f rg BT %s %.2f Tf %.2f %.2f Td (%s) Tj ET Q"
+            % (red, green, blue, font_name.encode(), anchor["font_size"], x, page_height - anchor["y"], encoded_text)
+        )
+
+    overlay = PageObject.create_blank_page(width=page.mediabox.width, height=page.mediabox.height)
+    overlay[NameObject("/Resources")] = DictionaryObject({NameObject("/Font"): fonts})
+    content = DecodedStreamObject()
+    content.set_data(b"\n".join(commands))
+    overlay.replace_contents(content)
+
+    page.merge_page(overlay)
+    output = BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def _renumber(obj, renumber):
+    """
+    Replaces, in place, the indirect references inside an object by the ones returned by ``renumber``.
+    """
+    if isinstance(obj, IndirectObject):
+        return renumber(obj)
+    if isinstance(obj, DictionaryObject):
+        for key, value in list(dict.items(obj)):
+            dict.__setitem__(obj, key, _renumber(value, renumber))
+    elif isinstance(obj, ArrayObject):
+        for index, value in enumerate(list.__iter__(obj)):
+            list.__setitem__(obj, index, _renumber(value, renumber))
+    return obj
+
+
+def stream_merged(pdf_files):
+    """
+    Merges many PDF documents into one, yielding the merged document in chunks as it is written.
+
+    Each document is read and written out before the next one is opened, and only the offsets of the written
+    objects are kept, so memory use doesn't grow with the number of documents. Pages are written as pypdf
+    flattens them, with the attributes they inherit from their page tree (``/MediaBox``, ``/Resources``,
+    ``/Rotate``...) copied onto them, since they are moved to a page tree of their own.
+
+    :param pdf_files: Iterable with the PDF documents to merge, as binary file-like objects.
+    :return: Generator of the merged PDF content, in chunks of bytes.
+    """
+    pages_number, catalog_number = 1, 2
+    offsets = {}
+    page_numbers = []
+    position = 0
+
+    def write_object(number, obj):
+        nonlocal position
+        output = BytesIO()
+        output.write(f"{number} 0 obj\n".encode())
+        obj.write_to_stream(output)
+        output.write(b"\nendobj\n")
+        offsets[number] = position
+        position += output.tell()
+        return output.getvalue()
+
+    header = b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n"
+    position += len(header)
+    yield header
+
+    next_number = catalog_number + 1
+    for pdf_file in pdf_files:
+        reader = PdfReader(pdf_file)
+        numbers = {}
+        pending = []
+        flattened_pages = {}
+
+        def renumber(reference):
+            nonlocal next_number
+            if reference.pdf is None:
+                # Already renumbered, through an object shared by many others (e.g. inherited resources).
+                return reference
+            key = (reference.idnum, reference.generation)
+            if key not in numbers:
+                numbers[key] = next_number
+                next_number += 1
+                pending.append(reference)
+            return IndirectObject(numbers[key], 0, None)
+
+        for page in reader.pages:
+            flattened_pages[(page.indirect_reference.idnum, page.indirect_reference.generation)] = page
+            page_numbers.append(renumber(page.indirect_reference).idnum)
+
+        while pending:
+            reference = pending.pop()
+            obj = flattened_pages.get((reference.idnum, reference.generation)) or reference.get_object()
+            if isinstance(obj, DictionaryObject) and obj.get("/Type") == "/Page":
+                dict.__setitem__(obj, NameObject("/Parent"), IndirectObject(pages_number, 0, None))
+            yield write_object(numbers[(reference.idnum, reference.generation)], _renumber(obj, renumber))
+
+    kids = ArrayObject(IndirectObject(number, 0, None) for number in page_numbers)
+    yield write_object(
+        pages_number,
+        DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Pages"),
+                NameObject("/Kids"): kids,
+                NameObject("/Count"): NumberObject(len(page_numbers)),
+            }
+        ),
+    )
+    yield write_object(
+        catalog_number,
+        DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Catalog"),
+                NameObject("/Pages"): IndirectObject(pages_number, 0, None),
+            }
+        ),
+    )
+
+    xref = BytesIO()
+    xref.write(f"xref\n0 {next_number}\n0000000000 65535 f \n".encode())
+    for number in range(1, next_number):
+        xref.write(f"{offsets.get(number, 0):010} 00000 n \n".encode())
+    xref.write(
+        f"trailer\n<< /Size {next_number} /Root {catalog_number} 0 R >>\nstartxref\n{position}\n%%EOF\n".encode()
+    )
+    yield xref.getvalue()
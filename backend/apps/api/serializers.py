@@ -58,7 +58,7 @@ class TutorialReadOnlySerializer(serializers.ModelSerializer):
     """Serializer for read-only access to Tutorial instances."""
 
     instructors = InstructorReadOnlySerializer(many=True, read_only=True)
-    subscriptions = serializers.IntegerField(source="confirmed_registrations.count", read_only=True)
+    subscriptions = serializers.SerializerMethodField()
 
     class Meta:
         model = models.Tutorial
@@ -76,3 +76,11 @@ class TutorialReadOnlySerializer(serializers.ModelSerializer):
             "instructors",
         ]
         read_only_fields = fields
+
+    def get_subscriptions(self, obj):
+        """
+        Returns the number of confirmed registrations, annotated by ``Tutorial.objects.with_subscriptions``.
+        """
+        if hasattr(obj, "confirmed_registrations_count"):
+            return obj.confirmed_registrations_count
+        return obj.confirmed_registrations.count()
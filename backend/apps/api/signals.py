@@ -1,8 +1,60 @@
 from django.contrib.auth.models import User
-from django.db.models.signals import pre_save
+from django.db import models
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 
+from apps.api.caching import forget_event_documents
+from apps.api.models import Event, Instructor, Tutorial
+from apps.api.utils import certificate_templates
+
 
 @receiver(pre_save, sender=User)
 def use_email_as_username(sender, instance, **kwargs):
     instance.username = instance.email
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def forget_certificate_template(sender, instance, **kwargs):
+    certificate_templates.discard(lambda key: key[0] == instance.pk)
+
+
+@receiver(pre_save, sender=Event)
+def forget_previous_event_document(sender, instance, **kwargs):
+    if instance.pk:
+        forget_event_documents(*Event.objects.filter(pk=instance.pk).values_list("slug", flat=True))
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def forget_event_document(sender, instance, **kwargs):
+    forget_event_documents(instance.slug)
+
+
+@receiver(post_save, sender=Tutorial)
+@receiver(post_delete, sender=Tutorial)
+def forget_tutorial_event_document(sender, instance, **kwargs):
+    # While the tutorial is saved, _schedule still holds the event it was loaded with.
+    event_ids = {instance.event_id}
+    if instance._schedule and instance._schedule is not models.DEFERRED:
+        event_ids.add(instance._schedule[0])
+    forget_event_documents(*Event.objects.filter(pk__in=event_ids).values_list("slug", flat=True))
+
+
+@receiver(post_save, sender=Instructor)
+@receiver(pre_delete, sender=Instructor)
+def forget_instructor_event_documents(sender, instance, **kwargs):
+    forget_event_documents(*Event.objects.filter(tutorials__instructors=instance).values_list("slug", flat=True))
+
+
+@receiver(m2m_changed, sender=Tutorial.instructors.through)
+def forget_instructors_event_documents(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        events = Event.objects.filter(tutorials=instance)
+    elif pk_set is None:
+        events = Event.objects.filter(tutorials__instructors=instance)
+    else:
+        events = Event.objects.filter(tutorials__in=pk_set)
+    forget_event_documents(*events.values_list("slug", flat=True))
@@ -1,8 +1,30 @@
 import pytest
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
 
 from apps.api.models import Attendee, Event, Tutorial
 
 
+@pytest.fixture(scope="session")
+def django_db_modify_db_settings(django_db_modify_db_settings_parallel_suffix, tmp_path_factory):
+    # Unlike the default in-memory database, a database file lets concurrent writers wait for each other, as
+    # they do in production, instead of failing with "database table is locked".
+    settings.DATABASES["default"].setdefault("TEST", {})["NAME"] = str(tmp_path_factory.mktemp("db") / "test.sqlite3")
+
+
+@pytest.fixture(autouse=True)
+def shared_caches(settings):
+    # Each test gets empty throttle buckets and event documents, instead of the ones left on disk by previous runs.
+    settings.CACHES = {
+        **settings.CACHES,
+        "throttle": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "throttle-tests"},
+        "events": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "events-tests"},
+    }
+    caches["throttle"].clear()
+    caches["events"].clear()
+
+
 @pytest.fixture
 @pytest.mark.django_db
 def event():
@@ -45,3 +67,20 @@ def attendee():
         birth_date="1990-01-01",
         cpf="52998224725",  # Example valid CPF for testing
     )
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    return tmp_path
+
+
+@pytest.fixture
+def event_with_image(db, media_root):
+    return Event.objects.create(
+        title="Event With Image",
+        slug="event-with-image",
+        start_date="2023-10-01",
+        end_date="2023-10-03",
+        image=SimpleUploadedFile("event.jpg", b"image"),
+    )
@@ -0,0 +1,226 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import EmailMessage
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+from model_bakery import baker
+from pypdf import PdfReader
+
+from apps.api import utils
+from apps.api.models import Attendee, OutboxEmail, Registration, Tutorial
+from apps.api.tests.test_utils import blank_pdf
+
+
+@pytest.fixture
+def certificate_event(event_with_image, settings, monkeypatch):
+    settings.EMAIL_RATE_LIMIT = 0
+    monkeypatch.setattr(
+        utils, "html_to_pdf", lambda html, width, height: blank_pdf(max(html.count('class="pyaba-batch-page"'), 1))
+    )
+    event = event_with_image
+    event.certificate_template = SimpleUploadedFile(
+        "certificate.html",
+        b"<html><head><title>C</title></head><body>{{ attendee_name }} {{ tutorial_title }}</body></html>",
+    )
+    event.save()
+    start = timezone.now()
+    for number in range(3):
+        tutorial = baker.make(
+            Tutorial,
+            event=event,
+            title=f"Tutorial {number}",
+            start_datetime=start,
+            end_datetime=start + timedelta(hours=1),
+            duration=timedelta(hours=1),
+        )
+        for attendee in range(5):
+            baker.make(
+                Registration,
+                tutorial=tutorial,
+                confirmed=True,
+                present=True,
+                attendee=baker.make(Attendee, full_name=f"Attendee {number}{attendee}", email="a@example.com"),
+            )
+    return event
+
+
+@pytest.mark.django_db(transaction=True)
+def test_certificate_command_with_workers_keeps_output_ordered(certificate_event):
+    """Test that certificates are generated and sent by worker threads while the output stays in order."""
+    output = StringIO()
+    call_command("certificate", certificate_event.slug, "--workers", "3", "--batch-size", "2", stdout=output)
+
+    assert Registration.objects.filter(certificate_sent=True).count() == 15
+    assert "❌" not in output.getvalue()
+    names = [line.split(":")[0].strip("- ").strip() for line in output.getvalue().splitlines() if "📄" in line]
+    assert names == [f"ATTENDEE {number}{attendee}" for number in range(3) for attendee in range(5)]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_certificate_command_only_regenerates_changed_certificates(certificate_event, monkeypatch):
+    """Test that certificates are printed again only when their rendered content changed."""
+    call_command("certificate", certificate_event.slug, "--skip-email", stdout=StringIO())
+    first_hashes = dict(Registration.objects.values_list("pk", "certificate_hash"))
+
+    printed = []
+    print_html = utils.html_to_pdf
+    monkeypatch.setattr(utils, "html_to_pdf", lambda html, *args: printed.append(html) or print_html(html, *args))
+    Tutorial.objects.filter(title="Tutorial 1").update(title="Tutorial One")
+    call_command("certificate", certificate_event.slug, "--skip-email", stdout=StringIO())
+
+    assert len(printed) == 1
+    assert printed[0].count('class="pyaba-batch-page"') == 5
+    changed = {
+        pk
+        for pk, content_hash in Registration.objects.values_list("pk", "certificate_hash")
+        if content_hash != first_hashes[pk]
+    }
+    assert changed == set(Registration.objects.filter(tutorial__title="Tutorial One").values_list("pk", flat=True))
+
+
+@pytest.mark.django_db(transaction=True)
+def test_certificate_command_stamps_names_on_tutorial_background(certificate_event, monkeypatch):
+    """Test that the stamp mode prints one background per tutorial and stamps every attendee name on it."""
+    printed = []
+
+    def fake_with_browser(render, html_content, page_width, page_height):
+        printed.append(html_content)
+        return blank_pdf(1), [{"x": 100, "y": 100, "align": "left", "font_size": 20, "color": (0, 0, 0)}]
+
+    monkeypatch.setattr(utils, "with_browser", fake_with_browser)
+    monkeypatch.setattr(utils, "certificate_backgrounds", utils.LRUCache(maxsize=3))
+    call_command("certificate", certificate_event.slug, "--stamp", "--skip-email", stdout=StringIO())
+
+    assert len(printed) == 3
+    assert all("data-pyaba-stamp" in html for html in printed)
+    registration = Registration.objects.get(attendee__full_name="Attendee 12")
+    with registration.certificate_pdf.open("rb") as certificate:
+        assert PdfReader(certificate).pages[0].extract_text() == "ATTENDEE 12"
+
+
+@pytest.mark.django_db
+def test_benchmark_certificates_reports_each_step(tmp_path):
+    """Test that the benchmark reports the time of each pipeline step per size and leaves no data behind."""
+    output = StringIO()
+    call_command(
+        "benchmark_certificates", "--sizes", "2,5", "--batch-size", "2", "--use-current-database", stdout=output
+    )
+
+    report = json.loads(output.getvalue())
+    assert report["renderer"] == "fake"
+    assert [result["registrations"] for result in report["results"]] == [2, 5]
+    assert set(report["results"][0]["steps"]) == {
+        "template_rendering",
+        "pdf_generation",
+        "storage_writes",
+        "email_building",
+    }
+    assert not Registration.objects.exists()
+
+    baseline = tmp_path / "baseline.json"
+    for result in report["results"]:
+        for timing in result["steps"].values():
+            timing["per_registration_ms"] = 1e-6
+    baseline.write_text(json.dumps(report))
+    with pytest.raises(CommandError, match="pdf_generation"):
+        call_command(
+            "benchmark_certificates",
+            "--sizes",
+            "2",
+            "--baseline",
+            str(baseline),
+            "--use-current-database",
+            stdout=StringIO(),
+        )
+
+
+@pytest.mark.django_db
+def test_send_emails_delivers_queued_emails_and_retries_failures(certificate_event, settings, mailoutbox, monkeypatch):
+    """Test that queued emails are delivered, and failed ones retried with backoff until the attempts run out."""
+    settings.EMAIL_OUTBOX_MAX_ATTEMPTS = 2
+    settings.EMAIL_OUTBOX_RETRY_DELAY = 60
+    assert OutboxEmail.objects.due().count() == 15
+
+    call_command("send_emails", "--once", stdout=StringIO())
+
+    assert len(mailoutbox) == 15
+    assert not OutboxEmail.objects.exclude(status=OutboxEmail.Status.SENT).exists()
+
+    registration = Registration.objects.first()
+    registration.save_certificate_pdf(blank_pdf(1))
+    registration.queue_certificate_email()
+    registration.queue_certificate_email()
+    email = OutboxEmail.objects.get(status=OutboxEmail.Status.PENDING)
+
+    def fail(self, fail_silently=False):
+        raise ConnectionError("SMTP indisponível")
+
+    monkeypatch.setattr(EmailMessage, "send", fail)
+    call_command("send_emails", "--once", stdout=StringIO())
+
+    email.refresh_from_db()
+    assert (email.status, email.attempts, email.last_error) == (OutboxEmail.Status.PENDING, 1, "SMTP indisponível")
+    assert email.next_attempt_at > timezone.now() + timedelta(seconds=50)
+
+    OutboxEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+    call_command("send_emails", "--once", stdout=StringIO())
+
+    email.refresh_from_db()
+    assert (email.status, email.attempts) == (OutboxEmail.Status.FAILED, 2)
+    registration.refresh_from_db()
+    assert not registration.certificate_sent
+
+
+def test_benchmark_emails_reports_messages_per_second():
+    """Test that the email benchmark delivers every email to the SMTP stand-in with each strategy."""
+    output = StringIO()
+    call_command(
+        "benchmark_emails",
+        "--messages",
+        "5",
+        "--connect-latency",
+        "0",
+        "--latency",
+        "0",
+        "--attachment-kb",
+        "1",
+        stdout=output,
+    )
+
+    report = json.loads(output.getvalue())
+    assert [result["strategy"] for result in report["results"]] == [
+        "connection_per_message",
+        "single_connection",
+        "pooled",
+    ]
+    assert all(result["received"] == result["sent"] == 5 for result in report["results"])
+    assert all(result["messages_per_second"] > 0 for result in report["results"])
+
+
+@pytest.mark.django_db(transaction=True)
+def test_certificate_command_sends_link_only_above_attachment_size(certificate_event, settings, mailoutbox):
+    """Test that certificates bigger than the event limit are emailed as a download link, without attachment."""
+    settings.CERTIFICATE_EMAIL_ATTACHMENT_MAX_KB = 1024
+    certificate_event.certificate_attachment_max_kb = 0
+    certificate_event.save()
+    output = StringIO()
+    call_command("certificate", certificate_event.slug, stdout=output)
+
+    certificate_emails = [email for email in mailoutbox if email.subject.startswith("Seu Certificado")]
+    assert len(certificate_emails) == 15
+    assert all(not email.attachments for email in certificate_emails)
+    assert all("Acesse seu certificado através do link abaixo" in email.body for email in certificate_emails)
+    assert "🔗 15 sent as a download link only" in output.getvalue()
+
+    certificate_event.certificate_attachment_max_kb = None
+    certificate_event.save()
+    Registration.objects.update(certificate_sent=False)
+    mailoutbox.clear()
+    call_command("certificate", certificate_event.slug, "--skip-generation", stdout=StringIO())
+
+    assert len(mailoutbox) == 15
+    assert all(len(email.attachments) == 1 for email in mailoutbox)
@@ -0,0 +1,123 @@
+import asyncio
+import base64
+import json
+from io import BytesIO
+
+import websockets
+import pytest
+from pypdf import PdfReader
+
+from apps.api.devtools import DevToolsRenderer
+from apps.api.tests.test_utils import blank_pdf
+
+
+def test_devtools_renderer_prints_in_concurrent_tabs():
+    """Test that documents are printed in separate tabs, never more at once than the tab limit."""
+    open_tabs = set()
+    most_open_tabs = 0
+
+    async def fake_chrome(connection):
+        nonlocal most_open_tabs
+        async for raw_message in connection:
+            message = json.loads(raw_message)
+            method, params, result = message["method"], message["params"], {}
+            if method == "Target.createTarget":
+                result = {"targetId": f"target-{message['id']}"}
+                open_tabs.add(result["targetId"])
+                most_open_tabs = max(most_open_tabs, len(open_tabs))
+            elif method == "Target.attachToTarget":
+                result = {"sessionId": f"session-{params['targetId']}"}
+            elif method == "Target.closeTarget":
+                open_tabs.discard(params["targetId"])
+            elif method == "Page.printToPDF":
+                await asyncio.sleep(0.01)
+                result = {"data": base64.b64encode(blank_pdf(1)).decode()}
+            await connection.send(json.dumps({"id": message["id"], "result": result}))
+            if method == "Page.navigate":
+                await connection.send(json.dumps({"method": "Page.loadEventFired", "sessionId": message["sessionId"]}))
+
+    async def render():
+        async with websockets.serve(fake_chrome, "127.0.0.1", 0) as server:
+            renderer = DevToolsRenderer("chrome", max_tabs=2)
+            await renderer.connect(f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}")
+            try:
+                return await renderer.print_many([f"<p>{number}</p>" for number in range(5)])
+            finally:
+                await renderer.close()
+
+    pdf_documents = asyncio.run(render())
+
+    assert [len(PdfReader(BytesIO(pdf)).pages) for pdf in pdf_documents] == [1] * 5
+    assert most_open_tabs == 2
+    assert not open_tabs
+
+
+def test_devtools_renderer_runs_script_before_printing():
+    """Test that print_with_script evaluates the script on the loaded page, before printing, and returns its value."""
+    methods = []
+
+    async def fake_chrome(connection):
+        async for raw_message in connection:
+            message = json.loads(raw_message)
+            method, params, result = message["method"], message["params"], {}
+            methods.append(method)
+            if method == "Target.createTarget":
+                result = {"targetId": "target"}
+            elif method == "Target.attachToTarget":
+                result = {"sessionId": "session"}
+            elif method == "Runtime.evaluate" and params.get("returnByValue"):
+                assert params["expression"] == "(() => {return [1, 2];})()"
+                result = {"result": {"type": "object", "value": [1, 2]}}
+            elif method == "Page.printToPDF":
+                result = {"data": base64.b64encode(blank_pdf(1)).decode()}
+            await connection.send(json.dumps({"id": message["id"], "result": result}))
+            if method == "Page.navigate":
+                await connection.send(json.dumps({"method": "Page.loadEventFired", "sessionId": "session"}))
+
+    async def render():
+        async with websockets.serve(fake_chrome, "127.0.0.1", 0) as server:
+            renderer = DevToolsRenderer("chrome")
+            await renderer.connect(f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}")
+            try:
+                return await renderer.print_with_script("<p>stamp</p>", "return [1, 2];")
+            finally:
+                await renderer.close()
+
+    pdf_content, result = asyncio.run(render())
+
+    assert len(PdfReader(BytesIO(pdf_content)).pages) == 1
+    assert result == [1, 2]
+    assert methods.index("Page.printToPDF") > max(i for i, method in enumerate(methods) if method == "Runtime.evaluate")
+
+
+def test_devtools_renderer_keeps_the_print_error_when_closing_the_tab_fails(caplog):
+    """Test that a page that never loads raises the timeout, not the error closing its tab, and is no longer waited."""
+
+    async def fake_chrome(connection):
+        async for raw_message in connection:
+            message = json.loads(raw_message)
+            method, response = message["method"], {"id": message["id"], "result": {}}
+            if method == "Target.createTarget":
+                response["result"] = {"targetId": "target"}
+            elif method == "Target.attachToTarget":
+                response["result"] = {"sessionId": "session"}
+            elif method == "Target.closeTarget":
+                response = {"id": message["id"], "error": {"message": "No target with given id found"}}
+            await connection.send(json.dumps(response))
+
+    async def render():
+        async with websockets.serve(fake_chrome, "127.0.0.1", 0) as server:
+            renderer = DevToolsRenderer("chrome", timeout=0.1)
+            await renderer.connect(f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}")
+            try:
+                with pytest.raises(asyncio.TimeoutError):
+                    await renderer.print_to_pdf("<p>never loads</p>")
+                return dict(renderer._waiters), dict(renderer._pending)
+            finally:
+                await renderer.close()
+
+    waiters, pending = asyncio.run(render())
+
+    assert waiters == {}
+    assert pending == {}
+    assert "No target with given id found" in caplog.text
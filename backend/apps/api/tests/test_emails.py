@@ -0,0 +1,73 @@
+import time
+
+import pytest
+from django.core.mail import EmailMessage
+from django.template.loader import render_to_string
+
+from apps.api import emails, utils
+
+
+class FakeConnection:
+    opened = 0
+
+    def __init__(self, fail_silently=False):
+        self.sent = []
+        self.closed = False
+
+    def open(self):
+        FakeConnection.opened += 1
+
+    def close(self):
+        self.closed = True
+
+    def send_messages(self, messages):
+        if any("fail" in message.to[0] for message in messages):
+            raise ConnectionError("recusado")
+        self.sent.extend(messages)
+        return len(messages)
+
+
+def test_send_messages_reuses_pooled_connections(monkeypatch):
+    """Test that many messages are sent through the pool connections, which are opened once each."""
+    monkeypatch.setattr(FakeConnection, "opened", 0)
+    pool = emails.SMTPConnectionPool(2, factory=FakeConnection)
+    messages = [EmailMessage(to=[f"{name}@example.com"]) for name in ["ana", "bia", "fail", "caio", "duda"]]
+
+    errors = emails.send_messages(messages, pool)
+    pool.close()
+
+    assert [error is None for error in errors] == [True, True, False, True, True]
+    assert FakeConnection.opened <= 3
+    assert sum(len(connection.sent) for connection in {message.connection for message in messages}) == 4
+
+
+def test_rate_limiter_spaces_calls():
+    """Test that the rate limiter lets at most the given number of calls through per second."""
+    rate_limiter = emails.RateLimiter(50)
+    start = time.monotonic()
+    for _ in range(6):
+        rate_limiter.wait()
+    assert time.monotonic() - start >= 0.1
+
+
+@pytest.mark.parametrize(
+    "template, prerendered",
+    [
+        ("<p>{{ title }}: {{ name }}</p>", True),
+        ("<p>{% if name %}{{ name }}{% else %}participante{% endif %}</p>", False),
+        ("<p>{{ name|default:'participante' }}</p>", False),
+        ("<p>{% autoescape off %}{{ name }}{% endautoescape %}</p>", False),
+    ],
+)
+def test_render_email_prerenders_only_plain_recipient_values(template, prerendered, settings, tmp_path, monkeypatch):
+    """Test that every recipient gets the output of a full render, prerendered only when values are written as is."""
+    (tmp_path / "email.html").write_text(template)
+    settings.TEMPLATES = [{**settings.TEMPLATES[0], "DIRS": [tmp_path]}]
+    monkeypatch.setattr(emails, "email_templates", utils.LRUCache(maxsize=4))
+
+    for name in ["Ana", "", "Bia & <Caio>"]:
+        expected = render_to_string("email.html", {"title": "Tutorial", "name": name})
+        assert emails.render_email("email.html", {"title": "Tutorial"}, {"name": name}) == expected
+
+    template = emails.email_templates.get(("email.html", (("title", "Tutorial"),), ("name",)))
+    assert template.fallback is not prerendered
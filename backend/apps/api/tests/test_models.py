@@ -1,10 +1,17 @@
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pytest
 from datetime import timedelta, date
+from io import BytesIO
+from PIL import Image
 from django.utils import timezone
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.db import IntegrityError
+from django.conf import settings
+from django.db import IntegrityError, connection
 from model_bakery import baker
-from apps.api.models import Event, Tutorial, Attendee, Registration
+from apps.api import emails, utils
+from apps.api.models import Event, Tutorial, Attendee, Registration, CertificateSigner, EventCertificateSigner
 
 
 @pytest.mark.django_db
@@ -227,3 +234,239 @@ def test_attendee_cpf_unique_constraint():
     baker.make(Attendee, cpf="52998224725")
     with pytest.raises(IntegrityError):
         baker.make(Attendee, cpf="52998224725")
+
+
+@pytest.mark.django_db
+def test_certificate_signer_encodes_scaled_signature_on_upload(media_root):
+    """Test that the signature is encoded once on upload, as a PNG scaled down to the maximum size."""
+    image = BytesIO()
+    Image.new("RGB", (2000, 1000), "white").save(image, format="JPEG")
+    signer = CertificateSigner.objects.create(
+        name="Ana", title="Chair", signature_image=SimpleUploadedFile("signature.jpg", image.getvalue())
+    )
+
+    data_uri = CertificateSigner.objects.get(pk=signer.pk).signature_image_base64
+    assert data_uri.startswith("data:image/png;base64,")
+    with Image.open(BytesIO(base64.b64decode(data_uri.split(",", 1)[1]))) as encoded:
+        assert encoded.format == "PNG"
+        assert encoded.size == (600, 300)
+
+
+@pytest.mark.django_db
+def test_event_certificate_signers_load_signer_in_same_query(event_with_image, django_assert_num_queries):
+    """Test that listing the signers of an event doesn't issue a query per signer."""
+    event = event_with_image
+    for order in range(3):
+        baker.make(EventCertificateSigner, event=event, order=order)
+
+    with django_assert_num_queries(1):
+        assert len([relation.signer.name for relation in event.certificate_signers.all()]) == 3
+
+
+@pytest.mark.django_db
+def test_event_inlines_remote_resources_of_uploaded_certificate_template(event_with_image, monkeypatch):
+    """Test that a newly uploaded certificate template is stored with its remote resources inlined."""
+    monkeypatch.setattr(utils, "fetch_asset", lambda url: ("image/png", b"png"))
+    event_with_image.certificate_template = SimpleUploadedFile(
+        "certificate.html", b'<img src="https://cdn.example.com/logo.png">{{ attendee_name }}'
+    )
+    event_with_image.save()
+
+    with event_with_image.certificate_template.open("rb") as template:
+        assert template.read() == b'<img src="data:image/png;base64,cG5n">{{ attendee_name }}'
+
+
+@pytest.mark.django_db
+def test_emails_render_tutorial_part_once_with_same_output(event_with_image, monkeypatch):
+    """Test that emails of a tutorial render the template once and match a full render for every attendee."""
+    rendered = []
+    full_render = emails.render_to_string
+    monkeypatch.setattr(emails, "render_to_string", lambda *args: rendered.append(args[0]) or full_render(*args))
+    monkeypatch.setattr(emails, "email_templates", utils.LRUCache(maxsize=4))
+    start = timezone.now()
+    tutorial = baker.make(
+        Tutorial, event=event_with_image, start_datetime=start, end_datetime=start + timedelta(hours=1)
+    )
+    names = ["Ana", "Bia & <Caio>", "João D'Ávila"]
+
+    for name in names:
+        registration = baker.make(Registration, tutorial=tutorial, attendee=baker.make(Attendee, full_name=name))
+        expected = full_render(
+            "email/tutorial_subscription_confirmation.html",
+            {
+                **tutorial.email_context(),
+                "name": name,
+                "confirmation_link": f"{settings.SITE_URL}/confirmation/{registration.uuid}",
+            },
+        )
+        assert registration.confirmation_email().body == expected
+
+    assert rendered.count("email/tutorial_subscription_confirmation.html") == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_confirmations_never_overbook_tutorial(event_with_image):
+    """Test that many threads confirming registrations of one tutorial at once take at most its vacancies."""
+    tutorial = baker.make(Tutorial, event=event_with_image, vacancies=5)
+    registrations = [baker.make(Registration, tutorial=tutorial) for _ in range(30)]
+    barrier = threading.Barrier(len(registrations))
+
+    def confirm(registration):
+        barrier.wait()
+        try:
+            return registration.confirm()
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=len(registrations)) as executor:
+        results = list(executor.map(confirm, registrations))
+
+    tutorial.refresh_from_db()
+    assert results.count(True) == 5
+    assert tutorial.confirmed_count == 5
+    assert tutorial.registrations.filter(confirmed=True).count() == 5
+
+    confirmed = tutorial.registrations.filter(confirmed=True).first()
+    confirmed.delete()
+    tutorial.refresh_from_db()
+    assert tutorial.confirmed_count == 4
+    assert tutorial.has_slots_available
+
+
+@pytest.mark.django_db
+def test_confirmed_count_follows_every_registration_change(event_with_image):
+    """Test that deleting, moving and bulk updating confirmed registrations keep the confirmed count right."""
+    tutorial, other = baker.make(Tutorial, event=event_with_image, vacancies=5, _quantity=2)
+    registrations = baker.make(Registration, tutorial=tutorial, confirmed=True, _quantity=4)
+
+    def counts():
+        return list(
+            Tutorial.objects.filter(pk__in=[tutorial.pk, other.pk])
+            .order_by("pk")
+            .values_list("confirmed_count", flat=True)
+        )
+
+    assert counts() == [4, 0]
+    Registration.objects.only("pk").get(pk=registrations[0].pk).delete()
+    assert counts() == [3, 0]
+    moved = Registration.objects.get(pk=registrations[1].pk)
+    moved.tutorial = other
+    moved.save()
+    assert counts() == [2, 1]
+    Registration.objects.filter(pk=registrations[2].pk).update(confirmed=False)
+    assert counts() == [1, 1]
+    Registration.objects.filter(tutorial=other).delete()
+    assert counts() == [1, 0]
+
+
+@pytest.mark.django_db
+def test_event_tutorial_conflicts_follow_tutorial_times(event_with_image):
+    """Test that the conflict map of the event is rebuilt when tutorials are created, moved and deleted."""
+    event = event_with_image
+    start = timezone.now()
+    first, second, third = (
+        baker.make(
+            Tutorial,
+            event=event,
+            start_datetime=start + timedelta(hours=hour),
+            end_datetime=start + timedelta(hours=hour + 2),
+        )
+        for hour in (0, 1, 2)
+    )
+    event.refresh_from_db()
+    assert event.tutorial_conflicts == {
+        str(first.pk): [second.pk],
+        str(second.pk): [first.pk, third.pk],
+        str(third.pk): [second.pk],
+    }
+
+    third.start_datetime = start + timedelta(hours=5)
+    third.end_datetime = start + timedelta(hours=6)
+    third.save()
+    second.delete()
+    event.refresh_from_db()
+    assert event.tutorial_conflicts == {str(first.pk): [], str(third.pk): []}
+
+
+@pytest.mark.django_db
+def test_tutorial_loaded_with_deferred_fields_saves(event_with_image):
+    """Test that a tutorial loaded with deferred fields can be saved, moving it still rebuilding both conflict maps."""
+    event = event_with_image
+    other_event = Event.objects.create(
+        title="Other Event",
+        start_date="2023-10-01",
+        end_date="2023-10-03",
+        image=SimpleUploadedFile("other.jpg", b"image"),
+    )
+    start = timezone.now()
+    first, second = (
+        baker.make(
+            Tutorial,
+            event=event,
+            start_datetime=start + timedelta(hours=hour),
+            end_datetime=start + timedelta(hours=hour + 2),
+        )
+        for hour in (0, 1)
+    )
+
+    tutorial = Tutorial.objects.only("pk", "title", "event").get(pk=second.pk)
+    tutorial.title = "Renamed"
+    tutorial.save()
+    assert Tutorial.objects.get(pk=second.pk).title == "Renamed"
+
+    tutorial = Tutorial.objects.only("pk", "title", "event").get(pk=second.pk)
+    tutorial.event = other_event
+    tutorial.save()
+    event.refresh_from_db()
+    other_event.refresh_from_db()
+    assert event.tutorial_conflicts == {str(first.pk): []}
+    assert other_event.tutorial_conflicts == {str(second.pk): []}
+
+
+@pytest.mark.django_db
+def test_event_attendee_schedule_matches_availability(event_with_image):
+    """Test that the schedule of an attendee agrees with Attendee.is_available_for, across events too."""
+    event = event_with_image
+    other_event = Event.objects.create(
+        title="Other Event",
+        start_date="2023-10-01",
+        end_date="2023-10-03",
+        image=SimpleUploadedFile("other.jpg", b"image"),
+    )
+    start = timezone.now()
+    subscribed, clashing, free, clashing_elsewhere = (
+        baker.make(
+            Tutorial,
+            event=event,
+            start_datetime=start + timedelta(hours=hour),
+            end_datetime=start + timedelta(hours=hour + 1),
+        )
+        for hour in (0, 0.5, 2, 4)
+    )
+    elsewhere = baker.make(
+        Tutorial,
+        event=other_event,
+        start_datetime=start + timedelta(hours=4.5),
+        end_datetime=start + timedelta(hours=5),
+    )
+    attendee = baker.make(Attendee, cpf="52998224725")
+    registration = baker.make(Registration, tutorial=subscribed, attendee=attendee, confirmed=True)
+    baker.make(Registration, tutorial=elsewhere, attendee=attendee)
+    Event.objects.filter(pk=event.pk).update(tutorial_conflicts={})
+    event.refresh_from_db()
+
+    assert event.attendee_schedule(attendee.cpf) == [
+        {"tutorial_id": subscribed.pk, "subscribed": True, "registration_id": registration.pk},
+        {"tutorial_id": clashing.pk, "subscribed": False, "available": False},
+        {"tutorial_id": free.pk, "subscribed": False, "available": True},
+        {"tutorial_id": clashing_elsewhere.pk, "subscribed": False, "available": False},
+    ]
+    for entry, tutorial in zip(event.attendee_schedule(attendee.cpf)[1:], (clashing, free, clashing_elsewhere)):
+        assert entry["available"] == attendee.is_available_for(tutorial)
+    assert event.tutorial_conflicts[str(clashing.pk)] == [subscribed.pk]
+    assert event.attendee_schedule("11144477735") == [
+        {"tutorial_id": tutorial.pk, "subscribed": False}
+        for tutorial in (subscribed, clashing, free, clashing_elsewhere)
+    ]
+    baker.make(Attendee, cpf="11144477735")
+    assert all(entry["available"] for entry in event.attendee_schedule("11144477735"))
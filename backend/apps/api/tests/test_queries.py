@@ -0,0 +1,188 @@
+"""
+Query budgets of the API endpoints.
+
+Each endpoint in ``apps/api/urls.py`` is requested against datasets of different sizes while its SQL is recorded.
+The number of queries must be the same for every size (no N+1) and stay within the budget declared below.
+"""
+
+from datetime import timedelta
+from itertools import count
+
+import pytest
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework.test import APIClient
+
+from apps.api.models import Attendee, Event, Instructor, Registration, SubscriptionRequest, Tutorial
+from apps.api.tests.test_utils import blank_pdf
+from apps.api.urls import urlpatterns
+
+SIZES = (1, 4)
+
+cpfs = (f"{number:011d}" for number in count(1))
+
+
+def build_dataset(size):
+    """
+    Create an event with ``size`` tutorials, each with ``size`` confirmed registrations with a certificate and
+    two instructors with a photo.
+    """
+    event = Event.objects.create(
+        title=f"Queries {size}",
+        start_date="2030-10-01",
+        end_date="2030-10-03",
+        image=ContentFile(b"image", name="event.jpg"),
+    )
+    start = timezone.now() + timedelta(days=30)
+    tutorials = []
+    for number in range(size):
+        tutorial = baker.make(
+            Tutorial,
+            event=event,
+            title=f"Tutorial {number}",
+            start_datetime=start + timedelta(hours=2 * number),
+            end_datetime=start + timedelta(hours=2 * number + 1),
+            vacancies=size + 10,
+        )
+        tutorial.instructors.set(baker.make(Instructor, photo=ContentFile(b"photo", name="photo.jpg"), _quantity=2))
+        for _ in range(size):
+            registration = baker.make(
+                Registration,
+                tutorial=tutorial,
+                confirmed=True,
+                present=True,
+                attendee=baker.make(Attendee, cpf=next(cpfs), full_name="Ana", email="ana@example.com"),
+            )
+            registration.save_certificate_pdf(blank_pdf(1))
+        tutorials.append(tutorial)
+
+    tutorial = tutorials[-1]
+    return {
+        "event": event,
+        "tutorial": tutorial,
+        "registration": tutorial.registrations.select_related("attendee").last(),
+        "pending": baker.make(Registration, tutorial=tutorial, attendee=baker.make(Attendee, cpf=next(cpfs))),
+        "instructor": tutorial.instructors.last(),
+        "ticket": SubscriptionRequest.objects.create(tutorial=tutorial, cpf=next(cpfs)),
+    }
+
+
+def post(client, url, data):
+    return client.post(url, data, format="json")
+
+
+# Endpoint name: (query budget, whether it needs an admin, request made with the client and a dataset).
+ENDPOINTS = {
+    "api-root": (0, False, lambda client, data: client.get("/api/")),
+    "event-image": (1, False, lambda client, data: client.get(f"/api/events/{data['event'].pk}/image/")),
+    "instructor-photo": (
+        1,
+        False,
+        lambda client, data: client.get(f"/api/instructors/{data['instructor'].pk}/photo/"),
+    ),
+    "events-list": (1, False, lambda client, data: client.get("/api/events/")),
+    "events-detail": (3, False, lambda client, data: client.get(f"/api/events/{data['event'].slug}/")),
+    "events-certificates": (
+        2,
+        True,
+        lambda client, data: client.get(f"/api/events/{data['event'].slug}/certificates/"),
+    ),
+    "events-schedule": (
+        3,
+        False,
+        lambda client, data: post(
+            client, f"/api/events/{data['event'].slug}/schedule/", {"cpf": data["registration"].attendee.cpf}
+        ),
+    ),
+    "tutorials-list": (2, False, lambda client, data: client.get("/api/tutorials/")),
+    "tutorials-detail": (3, False, lambda client, data: client.get(f"/api/tutorials/{data['tutorial'].pk}/")),
+    "tutorials-certificates": (
+        2,
+        True,
+        lambda client, data: client.get(f"/api/tutorials/{data['tutorial'].pk}/certificates/?bundle=pdf"),
+    ),
+    "tutorials-certificate": (
+        1,
+        False,
+        lambda client, data: client.get(f"/api/tutorials/certificate/{data['registration'].uuid}/"),
+    ),
+    "tutorials-confirm-subscription": (
+        9,
+        False,
+        lambda client, data: post(client, "/api/tutorials/confirm_subscription/", {"uuid": str(data["pending"].uuid)}),
+    ),
+    "tutorials-subscribe": (
+        14,
+        False,
+        lambda client, data: post(
+            client,
+            f"/api/tutorials/{data['tutorial'].pk}/subscribe/",
+            {"cpf": next(cpfs), "name": "Bia", "email": "bia@example.com", "birthday": "01/01/1990"},
+        ),
+    ),
+    "tutorials-subscription": (
+        2,
+        False,
+        lambda client, data: client.get(f"/api/tutorials/subscription/{data['ticket'].ticket}/"),
+    ),
+    "tutorials-unsubscribe": (
+        8,
+        False,
+        lambda client, data: post(
+            client,
+            f"/api/tutorials/{data['tutorial'].pk}/unsubscribe/",
+            {"cpf": data["pending"].attendee.cpf},
+        ),
+    ),
+    "tutorials-check-subscription": (
+        3,
+        False,
+        lambda client, data: post(
+            client,
+            "/api/tutorials/check_subscription/",
+            {"tutorial_id": data["tutorial"].pk, "cpf": data["registration"].attendee.cpf},
+        ),
+    ),
+}
+
+
+def count_queries(client, request, data):
+    """
+    Make the request, reading the whole response, and return the status code and the queries it issued.
+    """
+    with CaptureQueriesContext(connection) as queries:
+        response = request(client, data)
+        if response.streaming:
+            b"".join(response.streaming_content)
+    return response.status_code, queries.captured_queries
+
+
+def test_every_endpoint_has_a_budget():
+    """Test that no endpoint of apps/api/urls.py is left without a query budget."""
+    assert {pattern.name for pattern in urlpatterns if pattern.name} == set(ENDPOINTS)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("endpoint", list(ENDPOINTS))
+def test_endpoint_queries_stay_within_budget(endpoint, media_root, admin_user):
+    """Test that the number of queries of an endpoint doesn't grow with the data and stays within its budget."""
+    budget, needs_admin, request = ENDPOINTS[endpoint]
+    client = APIClient()
+    if needs_admin:
+        client.force_authenticate(admin_user)
+
+    counts = {}
+    for size in SIZES:
+        data = build_dataset(size)
+        status_code, queries = count_queries(client, request, data)
+        assert status_code < 400, f"{endpoint} answered {status_code}"
+        counts[size] = queries
+
+    numbers = {size: len(queries) for size, queries in counts.items()}
+    largest = counts[SIZES[-1]]
+    sql = "\n".join(query["sql"] for query in largest)
+    assert len(set(numbers.values())) == 1, f"{endpoint} queries grow with the data: {numbers}\n{sql}"
+    assert numbers[SIZES[-1]] <= budget, f"{endpoint} made {numbers[SIZES[-1]]} queries, budget is {budget}\n{sql}"
@@ -0,0 +1,333 @@
+import base64
+import re
+import socket
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import NameObject, NumberObject
+from selenium.common.exceptions import WebDriverException
+
+from apps.api import pdf, utils
+from apps.api.utils import BrowserPool
+
+
+class FakeDriver:
+    def __init__(self):
+        self.quitted = False
+
+    def quit(self):
+        self.quitted = True
+
+
+def test_browser_pool_reuses_warm_driver():
+    """Test that a returned driver is handed to the next borrower instead of starting a new one."""
+    pool = BrowserPool(size=1, factory=FakeDriver)
+    with pool.driver() as first:
+        pass
+    with pool.driver() as second:
+        pass
+    assert first is second
+    assert not first.quitted
+
+
+def test_browser_pool_recycles_after_max_renders():
+    """Test that a driver is quit and replaced after reaching the render limit."""
+    pool = BrowserPool(size=1, max_renders=2, factory=FakeDriver)
+    drivers = []
+    for _ in range(3):
+        with pool.driver() as driver:
+            drivers.append(driver)
+    assert drivers[0] is drivers[1]
+    assert drivers[0].quitted
+    assert drivers[2] is not drivers[0]
+
+
+def test_browser_pool_replaces_crashed_driver():
+    """Test that a driver raising a WebDriverException is discarded."""
+    pool = BrowserPool(size=1, factory=FakeDriver)
+    with pytest.raises(WebDriverException):
+        with pool.driver() as crashed:
+            raise WebDriverException("chrome not reachable")
+    with pool.driver() as driver:
+        pass
+    assert crashed.quitted
+    assert driver is not crashed
+
+
+def blank_pdf(pages):
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=595, height=842)
+    output = BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def test_html_to_pdf_batch_prints_once_and_splits(monkeypatch):
+    """Test that documents sharing a head are printed in a single job and split back into one PDF each."""
+    printed = []
+
+    def fake_html_to_pdf(html_content, page_width, page_height):
+        printed.append(html_content)
+        return blank_pdf(html_content.count('class="pyaba-batch-page"'))
+
+    monkeypatch.setattr(utils, "html_to_pdf", fake_html_to_pdf)
+    documents = [f"<html><head><title>C</title></head><body><p>{name}</p></body></html>" for name in "ABC"]
+
+    pdf_documents = utils.html_to_pdf_batch(documents)
+
+    assert len(printed) == 1
+    assert all(name in printed[0] for name in "ABC")
+    assert [len(PdfReader(BytesIO(pdf)).pages) for pdf in pdf_documents] == [1, 1, 1]
+
+
+@pytest.mark.django_db
+def test_certificate_template_is_cached_until_a_new_one_is_uploaded(event_with_image):
+    """Test that the compiled template is reused and replaced when the event gets a new template file."""
+    event = event_with_image
+    event.certificate_template = SimpleUploadedFile("certificate.html", b"old {{ attendee_name }}")
+    event.save()
+
+    template = utils.get_certificate_template(event)
+    assert utils.get_certificate_template(event) is template
+
+    event.certificate_template = SimpleUploadedFile("certificate.html", b"new {{ attendee_name }}")
+    event.save()
+
+    assert utils.get_certificate_template(event).render(Context({"attendee_name": "ANA"})) == "new ANA"
+
+
+def test_normalize_pdf_drops_timestamps():
+    """Test that PDFs differing only in their creation date are normalized to the same bytes."""
+    documents = []
+    for creation_date in ("D:20250101000000", "D:20260101000000"):
+        writer = PdfWriter()
+        writer.add_blank_page(width=595, height=842)
+        writer.add_metadata({"/CreationDate": creation_date})
+        output = BytesIO()
+        writer.write(output)
+        documents.append(output.getvalue())
+
+    assert documents[0] != documents[1]
+    assert pdf.normalize(documents[0]) == pdf.normalize(documents[1])
+
+
+def test_html_to_stamped_pdfs_prints_background_once(monkeypatch):
+    """Test that the background is printed once and each name is stamped on a copy of it."""
+    anchor = {"x": 297.5, "y": 400, "align": "center", "font_size": 24, "bold": True, "color": (0, 0, 0)}
+    printed = []
+
+    def fake_with_browser(render, html_content, page_width, page_height):
+        printed.append(html_content)
+        return blank_pdf(1), [anchor]
+
+    monkeypatch.setattr(utils, "with_browser", fake_with_browser)
+    monkeypatch.setattr(utils, "certificate_backgrounds", utils.LRUCache(maxsize=1))
+
+    first = utils.html_to_stamped_pdfs("<html>background</html>", ["ANA", "JOÃO"])
+    second = utils.html_to_stamped_pdfs("<html>background</html>", ["MARIA"])
+
+    assert len(printed) == 1
+    texts = [PdfReader(BytesIO(document)).pages[0].extract_text() for document in first + second]
+    assert texts == ["ANA", "JOÃO", "MARIA"]
+
+
+def test_single_flight_shares_result_with_concurrent_callers():
+    """Test that callers arriving while a key is running wait for it instead of running it again."""
+    single_flight = utils.SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def render():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return "pdf"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        leader = executor.submit(single_flight.do, "uuid", render)
+        started.wait()
+        followers = [executor.submit(single_flight.do, "uuid", render) for _ in range(3)]
+        release.set()
+        results = [leader.result()] + [follower.result() for follower in followers]
+
+    assert calls == [1]
+    assert results == ["pdf"] * 4
+
+
+def test_stream_merged_joins_every_page_in_order():
+    """Test that merged documents keep all their pages, in order, in a valid PDF."""
+    documents = [pdf.stamp_text(blank_pdf(1), name, [{"x": 100, "y": 100, "font_size": 20}]) for name in "ABC"]
+
+    merged = b"".join(pdf.stream_merged(BytesIO(document) for document in documents))
+
+    reader = PdfReader(BytesIO(merged), strict=True)
+    assert [page.extract_text() for page in reader.pages] == ["A", "B", "C"]
+
+
+def test_stream_merged_keeps_attributes_inherited_from_the_page_tree():
+    """Test that pages taking their media box and rotation from the page tree keep them once merged."""
+    writer = PdfWriter()
+    page = writer.add_blank_page(width=200, height=300)
+    page_tree = writer.root_object["/Pages"].get_object()
+    page_tree[NameObject("/MediaBox")] = page.pop("/MediaBox")
+    page_tree[NameObject("/Rotate")] = NumberObject(90)
+    document = BytesIO()
+    writer.write(document)
+
+    merged = b"".join(pdf.stream_merged(BytesIO(document.getvalue()) for _ in range(2)))
+
+    reader = PdfReader(BytesIO(merged), strict=True)
+    assert [(page.mediabox.width, page.mediabox.height, page.rotation) for page in reader.pages] == [(200, 300, 90)] * 2
+
+
+def test_stream_zip_yields_archive_in_chunks():
+    """Test that files are streamed as a ZIP archive, in chunks no larger than the files' chunks."""
+    files = [("a.pdf", BytesIO(b"a" * 100)), ("b.pdf", BytesIO(b"b" * 100))]
+
+    chunks = list(utils.stream_zip(files, chunk_size=10))
+
+    archive = zipfile.ZipFile(BytesIO(b"".join(chunks)))
+    assert archive.namelist() == ["a.pdf", "b.pdf"]
+    assert archive.read("b.pdf") == b"b" * 100
+    assert max(len(chunk) for chunk in chunks) < 200
+
+
+def test_localize_assets_inlines_remote_resources():
+    """Test that remote images, stylesheets and their fonts are inlined, leaving links and local paths alone."""
+    assets = {
+        "https://cdn.example.com/logo.png": ("image/png", b"png"),
+        "https://fonts.example.com/css?family=Lato": ("text/css", b"@font-face { src: url(lato.woff2); }"),
+        "https://fonts.example.com/lato.woff2": ("font/woff2", b"woff2"),
+    }
+    fetched = []
+
+    def fake_fetch(url):
+        fetched.append(url)
+        return assets[url]
+
+    html = (
+        '<html><head><link rel="stylesheet" href="//fonts.example.com/css?family=Lato"></head>'
+        '<body style="background: url(local.png)"><img src="https://cdn.example.com/logo.png">'
+        '<img src="https://cdn.example.com/logo.png"><a href="https://example.com">{{ attendee_name }}</a></body></html>'
+    )
+
+    localized = utils.localize_assets(html, fetch=fake_fetch)
+
+    assert utils.remote_references(html) == ["https://cdn.example.com/logo.png", "//fonts.example.com/css?family=Lato"]
+    assert utils.remote_references(localized) == []
+    assert sorted(fetched) == sorted(assets)
+    assert 'href="https://example.com"' in localized
+    assert "url(local.png)" in localized
+    assert "{{ attendee_name }}" in localized
+
+
+def test_localize_assets_keeps_resources_that_cannot_be_fetched():
+    """Test that a resource that fails to download is left as it is."""
+
+    def failing_fetch(url):
+        raise OSError("offline")
+
+    html = '<img src="https://cdn.example.com/logo.png">'
+    assert utils.localize_assets(html, fetch=failing_fetch) == html
+
+
+def test_localize_assets_leaves_non_http_resources_alone():
+    """Test that a stylesheet can't make the server read local files through ``file:`` or other schemes."""
+    assets = {
+        "https://cdn.example.com/style.css": (
+            "text/css",
+            b"body { background: url(file:///etc/hostname); } @font-face { src: url(ftp://example.com/a.woff2); }",
+        ),
+    }
+    fetched = []
+
+    def fake_fetch(url):
+        fetched.append(url)
+        return assets[url]
+
+    html = '<link rel="stylesheet" href="https://cdn.example.com/style.css"><img src="file:///etc/passwd">'
+    localized = utils.localize_assets(html, fetch=fake_fetch)
+
+    assert fetched == ["https://cdn.example.com/style.css"]
+    stylesheet = base64.b64decode(re.search(r"data:text/css;base64,([^\"]+)", localized).group(1))
+    assert b"url(file:///etc/hostname)" in stylesheet
+    assert b"url(ftp://example.com/a.woff2)" in stylesheet
+    assert '<img src="file:///etc/passwd">' in localized
+
+
+@pytest.mark.parametrize(
+    "url", ["file:///etc/passwd", "ftp://example.com/logo.png", "http://127.0.0.1/logo.png", "http://[::1]/logo.png"]
+)
+def test_fetch_asset_refuses_local_resources(url):
+    """Test that assets are only downloaded over http(s) from public hosts."""
+    with pytest.raises(ValueError):
+        utils.fetch_asset(url)
+
+
+def test_fetch_asset_refuses_big_resources(settings, monkeypatch):
+    """Test that an asset bigger than CERTIFICATE_ASSET_MAX_KB isn't downloaded."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.end_headers()
+            self.wfile.write(b"x" * 2048 if self.path == "/big.png" else b"x" * 512)
+
+        def log_message(self, *args):
+            pass
+
+    settings.CERTIFICATE_ASSET_MAX_KB = 1
+    monkeypatch.setattr(
+        utils, "asset_addresses", lambda hostname, port: socket.getaddrinfo(hostname, port, type=socket.SOCK_STREAM)
+    )
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}"
+        assert utils.fetch_asset(f"{url}/small.png") == ("image/png", b"x" * 512)
+        with pytest.raises(ValueError):
+            utils.fetch_asset(f"{url}/big.png")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_fetch_asset_connects_to_the_checked_address(monkeypatch):
+    """Test that a host resolving to a public address when checked and to a local one afterwards is refused."""
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    resolved = iter(["93.184.215.14", "127.0.0.1", "127.0.0.1"])
+    monkeypatch.setattr(
+        socket,
+        "getaddrinfo",
+        lambda host, port, **kwargs: [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (next(resolved), port))],
+    )
+    try:
+        with pytest.raises(ValueError):
+            utils.fetch_asset(f"http://rebinding.example.com:{server.server_port}/logo.png")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert requests == []
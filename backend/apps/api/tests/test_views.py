@@ -0,0 +1,409 @@
+import hashlib
+import json
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from types import SimpleNamespace
+
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework.test import APIClient
+
+from apps.api import models
+from apps.api.models import Attendee, OutboxEmail, Registration, Tutorial
+from apps.api.serializers import TutorialReadOnlySerializer
+from apps.api.throttling import RegistrationThrottle, check_rates
+from apps.api.tests.test_utils import blank_pdf
+
+
+@pytest.fixture
+def registration(event_with_image):
+    event = event_with_image
+    event.certificate_template = SimpleUploadedFile(
+        "certificate.html", b"<html><body>{{ attendee_name }}</body></html>"
+    )
+    event.save()
+    start = timezone.now()
+    tutorial = baker.make(
+        Tutorial,
+        event=event,
+        start_datetime=start,
+        end_datetime=start + timedelta(hours=1),
+        duration=timedelta(hours=1),
+    )
+    return baker.make(
+        Registration,
+        tutorial=tutorial,
+        confirmed=True,
+        present=True,
+        attendee=baker.make(Attendee, full_name="Ana", email="ana@example.com"),
+    )
+
+
+@pytest.fixture
+def open_tutorial(registration):
+    start = timezone.now() + timedelta(days=1)
+    return baker.make(
+        Tutorial,
+        event=registration.tutorial.event,
+        start_datetime=start,
+        end_datetime=start + timedelta(hours=1),
+        vacancies=10,
+    )
+
+
+@pytest.mark.django_db
+def test_certificate_download_generates_certificate_on_demand(registration, settings, monkeypatch):
+    """Test that a certificate not generated yet is generated when it is downloaded."""
+    settings.CERTIFICATE_ON_DEMAND = True
+    monkeypatch.setattr(models, "html_to_pdf", lambda html, *args: blank_pdf(1))
+
+    response = APIClient().get(f"/api/tutorials/certificate/{registration.uuid}/")
+
+    assert response.status_code == 200
+    registration.refresh_from_db()
+    assert registration.certificate_generated
+
+
+@pytest.mark.django_db
+def test_certificate_download_without_on_demand_generation(registration, settings):
+    """Test that certificates aren't generated on download unless enabled."""
+    settings.CERTIFICATE_ON_DEMAND = False
+
+    response = APIClient().get(f"/api/tutorials/certificate/{registration.uuid}/")
+
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_event_certificates_bundle_streams_generated_certificates(registration, admin_user):
+    """Test that admins can download the generated certificates of an event as a ZIP archive."""
+    registration.save_certificate_pdf(blank_pdf(1))
+    baker.make(Registration, tutorial=registration.tutorial)
+    client = APIClient()
+    url = f"/api/events/{registration.tutorial.event.slug}/certificates/"
+
+    assert client.get(url).status_code in (401, 403)
+
+    client.force_authenticate(admin_user)
+    response = client.get(url)
+
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+    assert len(archive.namelist()) == 1
+    assert archive.namelist()[0].endswith(f"/ana-{str(registration.uuid)[:8]}.pdf")
+
+
+@pytest.mark.django_db
+def test_event_schedule_asks_new_attendees_for_their_data(registration):
+    """Test that the schedule of an unknown CPF, like check_subscription, says nothing about availability."""
+    client = APIClient()
+    url = f"/api/events/{registration.tutorial.event.slug}/schedule/"
+
+    response = client.post(url, {"cpf": "52998224725"}, format="json")
+    assert response.status_code == 200
+    assert response.json() == {"tutorials": [{"tutorial_id": registration.tutorial_id, "subscribed": False}]}
+
+    baker.make(Attendee, cpf="52998224725")
+    response = client.post(url, {"cpf": "52998224725"}, format="json")
+    assert response.json() == {
+        "tutorials": [{"tutorial_id": registration.tutorial_id, "subscribed": False, "available": True}]
+    }
+
+
+@pytest.mark.django_db
+def test_subscribe_queues_confirmation_email_without_sending(open_tutorial, mailoutbox):
+    """Test that subscribing writes the confirmation email to the outbox instead of sending it."""
+    response = APIClient().post(
+        f"/api/tutorials/{open_tutorial.pk}/subscribe/",
+        {"cpf": "52998224725", "name": "Bia", "email": "bia@example.com", "birthday": "01/01/1990"},
+        format="json",
+    )
+
+    assert response.status_code == 200
+    assert mailoutbox == []
+    email = OutboxEmail.objects.get(registration=response.data["registration_id"])
+    assert email.kind == OutboxEmail.Kind.CONFIRMATION
+    assert email.status == OutboxEmail.Status.PENDING
+
+
+@pytest.mark.django_db
+def test_subscribe_with_admission_queue_answers_with_a_ticket(open_tutorial, settings):
+    """Test that queued subscriptions are processed in arrival order and their outcome is read with the ticket."""
+    settings.REGISTRATION_ADMISSION_QUEUE = True
+    client = APIClient()
+    data = {"cpf": "52998224725", "name": "Bia", "email": "bia@example.com", "birthday": "01/01/1990"}
+    first = client.post(f"/api/tutorials/{open_tutorial.pk}/subscribe/", data, format="json")
+    second = client.post(f"/api/tutorials/{open_tutorial.pk}/subscribe/", data, format="json")
+
+    assert first.status_code == second.status_code == 202
+    assert (first.data["status"], first.data["position"]) == ("queued", 1)
+    assert second.data["position"] == 2
+    assert second.headers["Retry-After"] == str(settings.REGISTRATION_QUEUE_RETRY_AFTER)
+    assert not Registration.objects.filter(tutorial=open_tutorial).exists()
+
+    assert models.SubscriptionRequest.process_queue() == (1, 1)
+
+    response = client.get(f"/api/tutorials/subscription/{first.data['ticket']}/")
+    registration = Registration.objects.get(tutorial=open_tutorial, attendee__cpf="52998224725")
+    assert response.data["status"] == "subscribed"
+    assert response.data["registration_id"] == registration.pk
+    assert OutboxEmail.objects.filter(registration=registration, kind=OutboxEmail.Kind.CONFIRMATION).count() == 1
+
+    response = client.get(f"/api/tutorials/subscription/{second.data['ticket']}/")
+    assert response.data["status"] == "rejected"
+    assert response.data["error"] == "Este participante já está inscrito neste tutorial."
+    assert models.SubscriptionRequest.process_queue() is None
+
+
+@pytest.mark.django_db
+def test_admission_queue_rejects_requests_that_fail(open_tutorial, monkeypatch):
+    """Test that an unexpected error rejects only the request that raised it, not the rest of the batch."""
+    data = {"full_name": "Bia", "email": "bia@example.com", "birthday": "1990-01-01"}
+    failing = models.SubscriptionRequest.objects.create(tutorial=open_tutorial, cpf="52998224725", **data)
+    queued = models.SubscriptionRequest.objects.create(tutorial=open_tutorial, cpf="11144477735", **data)
+    subscribe = models.SubscriptionRequest.subscribe
+
+    def flaky_subscribe(self):
+        if self.pk == failing.pk:
+            raise RuntimeError("boom")
+        return subscribe(self)
+
+    monkeypatch.setattr(models.SubscriptionRequest, "subscribe", flaky_subscribe)
+
+    assert models.SubscriptionRequest.process_queue() == (1, 1)
+    failing.refresh_from_db()
+    queued.refresh_from_db()
+    assert (failing.status, failing.error) == (models.SubscriptionRequest.Status.REJECTED, "boom")
+    assert queued.status == models.SubscriptionRequest.Status.SUBSCRIBED
+    assert models.SubscriptionRequest.process_queue() is None
+
+
+@pytest.mark.django_db
+def test_subscribe_retried_with_idempotency_key_replays_the_response(open_tutorial):
+    """Test that a subscription repeated with the same key gets the first response without touching registrations."""
+    client = APIClient()
+    url = f"/api/tutorials/{open_tutorial.pk}/subscribe/"
+    data = {"cpf": "52998224725", "name": "Bia", "email": "bia@example.com", "birthday": "01/01/1990"}
+    first = client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY="retry-1")
+
+    with CaptureQueriesContext(connection) as queries:
+        retry = client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY="retry-1")
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == {"registration_id": first.data["registration_id"], "subscribed": True}
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert not any("api_registration" in query["sql"] for query in queries.captured_queries)
+    assert OutboxEmail.objects.filter(registration__tutorial=open_tutorial).count() == 1
+
+    other = client.post(url, {**data, "cpf": "11144477735"}, format="json", HTTP_IDEMPOTENCY_KEY="retry-1")
+    assert other.status_code == 422
+    assert Registration.objects.filter(tutorial=open_tutorial).count() == 1
+
+
+@pytest.mark.django_db
+def test_idempotency_key_is_reserved_per_client(open_tutorial, settings):
+    """Test that a retry sent while the first request runs gets 409, and that other clients don't share the key."""
+    client = APIClient()
+    url = f"/api/tutorials/{open_tutorial.pk}/subscribe/"
+    data = {"cpf": "52998224725", "name": "Bia", "email": "bia@example.com", "birthday": "01/01/1990"}
+    request_hash = hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+    reserved, created = models.IdempotencyKey.reserve("retry-1", url, "ip:127.0.0.1", request_hash)
+    assert created
+
+    retry = client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY="retry-1")
+    assert retry.status_code == 409
+    assert not Registration.objects.filter(tutorial=open_tutorial).exists()
+
+    other = client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY="retry-1", REMOTE_ADDR="10.0.0.2")
+    assert other.status_code == 200
+    assert "Idempotent-Replayed" not in other.headers
+
+    settings.IDEMPOTENCY_KEY_LOCK_TIMEOUT = 0
+    retry = client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY="retry-1")
+    assert retry.status_code == 400
+    assert retry.data["error"] == "Este participante já está inscrito neste tutorial."
+    reserved.refresh_from_db()
+    assert (reserved.status_code, reserved.body) == (400, retry.data)
+
+
+@pytest.mark.django_db
+def test_registration_endpoints_are_throttled_per_cpf_and_ip(registration, settings):
+    """Test that a CPF or an IP that used up its bucket is rejected with 429 until tokens come back."""
+    settings.REGISTRATION_THROTTLE_RATES = {"check_subscription": "ip=3/min,cpf=2/min"}
+    client = APIClient()
+    url = "/api/tutorials/check_subscription/"
+    tutorial_id = registration.tutorial.pk
+
+    responses = [client.post(url, {"tutorial_id": tutorial_id, "cpf": "52998224725"}) for _ in range(2)]
+    with CaptureQueriesContext(connection) as queries:
+        responses.append(client.post(url, {"tutorial_id": tutorial_id, "cpf": "52998224725"}))
+    assert [response.status_code for response in responses] == [200, 200, 429]
+    assert len(queries) == 0
+    assert 0 < int(responses[-1].headers["Retry-After"]) <= 30
+
+    assert client.post(url, {"tutorial_id": tutorial_id, "cpf": "11144477735"}).status_code == 200
+    assert client.post(url, {"tutorial_id": tutorial_id, "cpf": "98765432100"}).status_code == 429
+
+    settings.REGISTRATION_THROTTLE_RATES = {"check_subscription": ""}
+    assert client.post(url, {"tutorial_id": tutorial_id, "cpf": "52998224725"}).status_code == 200
+
+
+def test_registration_throttle_bucket_is_not_overdrawn_by_concurrent_requests(settings, monkeypatch):
+    """Test that concurrent requests against one bucket never take more tokens than it holds."""
+    settings.REGISTRATION_THROTTLE_RATES = {"check_subscription": "cpf=5/min"}
+    get_many = LocMemCache.get_many
+
+    def slow_get_many(self, *args, **kwargs):
+        # Widens the window between reading and writing the bucket back.
+        stored = get_many(self, *args, **kwargs)
+        time.sleep(0.01)
+        return stored
+
+    monkeypatch.setattr(LocMemCache, "get_many", slow_get_many)
+    request = SimpleNamespace(data={"cpf": "52998224725"}, META={"REMOTE_ADDR": "127.0.0.1"})
+    view = SimpleNamespace(action="check_subscription")
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        allowed = list(executor.map(lambda _: RegistrationThrottle().allow_request(request, view), range(20)))
+
+    assert allowed.count(True) == 5
+
+
+@pytest.mark.django_db
+def test_registration_throttle_ignores_forged_forwarded_for(registration, settings):
+    """Test that a client rotating X-Forwarded-For still shares one IP bucket, unless proxies are trusted."""
+    settings.REGISTRATION_THROTTLE_RATES = {"check_subscription": "ip=2/min"}
+    client = APIClient()
+    url = "/api/tutorials/check_subscription/"
+    data = {"tutorial_id": registration.tutorial.pk, "cpf": "52998224725"}
+
+    statuses = [client.post(url, data, HTTP_X_FORWARDED_FOR=f"10.0.0.{number}").status_code for number in range(3)]
+    assert statuses == [200, 200, 429]
+
+    settings.REST_FRAMEWORK = {**settings.REST_FRAMEWORK, "NUM_PROXIES": 1}
+    assert client.post(url, data, HTTP_X_FORWARDED_FOR="10.0.1.1").status_code == 200
+    assert client.post(url, data, HTTP_X_FORWARDED_FOR="10.0.1.2").status_code == 200
+
+
+def test_registration_throttle_rejects_bad_rates_at_startup(settings):
+    """Test that a malformed limit is reported when the app starts instead of failing its requests."""
+    settings.REGISTRATION_THROTTLE_RATES = {"subscribe": "ip=60/min,cpf=5/fortnight", "unsubscribe": "ip=lots"}
+    with pytest.raises(ImproperlyConfigured, match="ip=lots|cpf=5/fortnight"):
+        check_rates()
+
+
+@pytest.mark.django_db
+def test_tutorial_listings_match_the_unannotated_serialization(registration):
+    """Test that the annotated read path serializes tutorials exactly as counting registrations one by one does."""
+    tutorial = registration.tutorial
+    tutorial.instructors.set(baker.make(models.Instructor, _quantity=2))
+    baker.make(Registration, tutorial=tutorial, confirmed=True, attendee=baker.make(Attendee, cpf="11144477735"))
+    baker.make(Registration, tutorial=tutorial, attendee=baker.make(Attendee, cpf="98765432100"))
+    expected = TutorialReadOnlySerializer(Tutorial.objects.filter(event=tutorial.event), many=True).data
+
+    client = APIClient()
+    assert client.get(f"/api/events/{tutorial.event.slug}/").json()["tutorials"] == json.loads(json.dumps(expected))
+    assert client.get("/api/tutorials/").json() == json.loads(json.dumps(expected))
+    assert expected[0]["subscriptions"] == 2
+
+
+@pytest.mark.django_db
+def test_event_detail_is_cached_until_its_data_changes(registration, django_capture_on_commit_callbacks):
+    """Test that the event document is served from the cache and dropped when a tutorial, instructor or seat changes."""
+    tutorial = registration.tutorial
+    event = tutorial.event
+    pending = baker.make(Registration, tutorial=tutorial, attendee=baker.make(Attendee, cpf="11144477735"))
+    client = APIClient()
+    url = f"/api/events/{event.slug}/"
+
+    def subscriptions():
+        return client.get(url).json()["tutorials"][0]["subscriptions"]
+
+    assert subscriptions() == 1
+    with CaptureQueriesContext(connection) as queries:
+        assert client.get(url).status_code == 200
+    assert len(queries) == 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        client.post("/api/tutorials/confirm_subscription/", {"uuid": str(pending.uuid)}, format="json")
+    assert subscriptions() == 2
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Registration.objects.get(pk=pending.pk).delete()
+    assert subscriptions() == 1
+
+    with django_capture_on_commit_callbacks(execute=True):
+        tutorial.title = "Renamed"
+        tutorial.save()
+    assert client.get(url).json()["tutorials"][0]["title"] == "Renamed"
+
+    instructor = baker.make(models.Instructor, name="Ana")
+    with django_capture_on_commit_callbacks(execute=True):
+        tutorial.instructors.add(instructor)
+    assert client.get(url).json()["tutorials"][0]["instructors"][0]["name"] == "Ana"
+
+    with django_capture_on_commit_callbacks(execute=True):
+        instructor.name = "Bia"
+        instructor.save()
+    assert client.get(url).json()["tutorials"][0]["instructors"][0]["name"] == "Bia"
+
+
+@pytest.mark.django_db
+def test_event_detail_cache_expires(registration, settings, monkeypatch):
+    """Test that a missed invalidation is bounded by EVENT_CACHE_TIMEOUT, and that 0 disables the cache."""
+    tutorial = registration.tutorial
+    url = f"/api/events/{tutorial.event.slug}/"
+    client = APIClient()
+    client.get(url)
+    Tutorial.objects.filter(pk=tutorial.pk).update(title="Renamed")
+
+    assert client.get(url).json()["tutorials"][0]["title"] != "Renamed"
+    later = time.time() + settings.EVENT_CACHE_TIMEOUT + 1
+    with monkeypatch.context() as patch:
+        patch.setattr(time, "time", lambda: later)
+        assert client.get(url).json()["tutorials"][0]["title"] == "Renamed"
+
+    settings.EVENT_CACHE_TIMEOUT = 0
+    Tutorial.objects.filter(pk=tutorial.pk).update(title="Again")
+    assert client.get(url).json()["tutorials"][0]["title"] == "Again"
+
+
+@pytest.mark.django_db
+def test_read_endpoints_answer_not_modified_until_the_event_changes(registration, django_capture_on_commit_callbacks):
+    """Test that the read endpoints send an ETag and answer 304 to it until a change replaces the version stamp."""
+    tutorial = registration.tutorial
+    pending = baker.make(Registration, tutorial=tutorial, attendee=baker.make(Attendee, cpf="11144477735"))
+    client = APIClient()
+    urls = [
+        "/api/events/",
+        f"/api/events/{tutorial.event.slug}/",
+        "/api/tutorials/",
+        f"/api/tutorials/{tutorial.pk}/",
+    ]
+    etags = {url: client.get(url).headers["ETag"] for url in urls}
+
+    for url, etag in etags.items():
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+        assert len(queries) <= 1, url
+
+    with django_capture_on_commit_callbacks(execute=True):
+        client.post("/api/tutorials/confirm_subscription/", {"uuid": str(pending.uuid)}, format="json")
+
+    for url, etag in etags.items():
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200, url
+        assert response.headers["ETag"] != etag
+    assert client.get(f"/api/tutorials/{tutorial.pk}/").json()["subscriptions"] == 2
@@ -0,0 +1,154 @@
+"""Token bucket throttles for the registration endpoints."""
+
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.throttling import BaseThrottle
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Seconds in each period a rate may be given in, by its first letter.
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """
+    Parse a rate like ``"5/min"`` into the bucket capacity and the seconds it takes to refill.
+    """
+    requests, period = rate.split("/")
+    return int(requests), PERIODS[period.strip()[0].lower()]
+
+
+@lru_cache(maxsize=None)
+def parse_limits(limits):
+    """
+    Parse the limits of an action, like ``"ip=60/min,cpf=5/min"``, into a tuple of ``(scope, capacity, period)``.
+
+    Empty limits, or a limit of 0 requests, are left out.
+    """
+    parsed = []
+    for limit in limits.split(","):
+        if not limit.strip():
+            continue
+        try:
+            scope, rate = limit.split("=")
+            capacity, period = parse_rate(rate)
+        except (IndexError, KeyError, ValueError):
+            raise ImproperlyConfigured(
+                f"Limite inválido em REGISTRATION_THROTTLE_RATES: {limit.strip()!r} (use, por exemplo, ip=60/min)."
+            )
+        if capacity > 0:
+            parsed.append((scope.strip(), capacity, period))
+    return tuple(parsed)
+
+
+def check_rates():
+    """
+    Parse every limit of ``REGISTRATION_THROTTLE_RATES``, so a bad one stops the app from starting instead of
+    failing every request of its action.
+    """
+    for limits in settings.REGISTRATION_THROTTLE_RATES.values():
+        parse_limits(limits or "")
+
+
+_buckets_lock = threading.Lock()
+
+
+@contextmanager
+def buckets_lock(cache):
+    """
+    Lock held while the buckets are read and written back, so concurrent requests can't take the same token.
+
+    Uses the lock of the cache when it has one (e.g. django-redis), shared by every machine. Otherwise it locks the
+    threads of the process and, through a lock file next to the cache, the processes of the machine.
+    """
+    if hasattr(cache, "lock"):
+        with cache.lock("throttle:lock", timeout=5):
+            yield
+        return
+
+    with _buckets_lock:
+        if fcntl is None:
+            yield
+            return
+        directory = getattr(cache, "_dir", None) or tempfile.gettempdir()
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "throttle.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class RegistrationThrottle(BaseThrottle):
+    """
+    Token bucket throttle for the actions listed in ``REGISTRATION_THROTTLE_RATES``.
+
+    Every action has a bucket per client IP (scope ``ip``) and per value of a request field, like ``cpf``. Each
+    bucket holds up to ``capacity`` requests and refills at ``capacity`` requests per period; a request is rejected,
+    before the view touches the database, when any of its buckets is empty.
+
+    Buckets are kept in the ``throttle`` cache, which must be shared by every worker (the default file cache is,
+    on the same machine), and updated under :func:`buckets_lock`. The client IP is the connection address, or the one written in X-Forwarded-For by the
+    ``NUM_PROXIES`` trusted proxies in front of the app.
+    """
+
+    cache_alias = "throttle"
+
+    def __init__(self):
+        self.wait_time = None
+
+    def bucket_keys(self, request, view):
+        """
+        The cache key and limits of every bucket the request takes a token from.
+        """
+        limits = settings.REGISTRATION_THROTTLE_RATES.get(getattr(view, "action", None))
+        if not limits:
+            return []
+
+        buckets = []
+        for scope, capacity, period in parse_limits(limits):
+            if scope == "ip":
+                ident = self.get_ident(request)
+            else:
+                ident = request.data.get(scope)
+            if not ident or not isinstance(ident, str):
+                continue
+            buckets.append((f"throttle:{view.action}:{scope}:{ident}", capacity, period))
+        return buckets
+
+    def allow_request(self, request, view):
+        buckets = self.bucket_keys(request, view)
+        if not buckets:
+            return True
+
+        cache = caches[self.cache_alias]
+        with buckets_lock(cache):
+            now = time.time()
+            stored = cache.get_many([key for key, _capacity, _period in buckets])
+            refilled = {}
+            for key, capacity, period in buckets:
+                tokens, updated_at = stored.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated_at) * capacity / period)
+                if tokens < 1:
+                    self.wait_time = (1 - tokens) * period / capacity
+                    return False
+                refilled[key] = (tokens, period)
+
+            for key, (tokens, period) in refilled.items():
+                cache.set(key, (tokens - 1, now), timeout=period)
+            return True
+
+    def wait(self):
+        return self.wait_time
@@ -1,47 +1,1058 @@
-import tempfile
+import atexit
 import base64
+import hashlib
+import http.client
+import ipaddress
+import logging
+import mimetypes
+import re
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from io import BytesIO
 
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.template import Template
+from django.utils.safestring import mark_safe
+from django.utils.module_loading import import_string
+from django.utils.text import slugify
+from PIL import Image, UnidentifiedImageError
+from pypdf import PageObject
 from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 
+from apps.api.devtools import DevToolsError, DevToolsRenderer, SyncDevToolsRenderer, find_chrome
+from apps.api.pdf import normalize, split_pages, stamp_text, stream_merged, write_pages
 
-def html_to_pdf(html_content, page_width=8.27, page_height=11.69):
+
+class LRUCache:
+    """
+    Thread-safe mapping that keeps at most ``maxsize`` entries, evicting the least recently used one.
     """
-    Converts HTML content to PDF using Selenium and ChromeDriver.
 
-    :param html_content: HTML content to convert.
-    :param page_width: Width of the PDF page in inches.
-    :param page_height: Height of the PDF page in inches.
-    :return: PDF content as bytes.
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, predicate):
+        """
+        Removes every entry whose key matches the predicate.
+        """
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+certificate_templates = LRUCache(maxsize=settings.CERTIFICATE_TEMPLATE_CACHE_SIZE)
+
+
+def certificate_template_version(event):
+    """
+    Identifies the current certificate template file of an event: its name plus modification time, or plus
+    a hash of its content when the storage can't tell modification times.
+    """
+    template_file = event.certificate_template
+    try:
+        modified_time = template_file.storage.get_modified_time(template_file.name)
+        return f"{template_file.name}@{modified_time.timestamp()}"
+    except NotImplementedError:
+        with template_file.open("rb") as content:
+            return f"{template_file.name}#{hashlib.sha256(content.read()).hexdigest()}"
+
+
+def get_certificate_template(event):
+    """
+    Returns the compiled certificate template of an event, parsing the file only when it isn't cached yet.
+
+    Templates still loading remote resources are flagged with a warning when they are parsed.
+    """
+    key = (event.pk, certificate_template_version(event))
+    template = certificate_templates.get(key)
+    if template is None:
+        with event.certificate_template.open("rb") as template_file:
+            source = template_file.read().decode("utf-8")
+        remote = remote_references(source)
+        if remote:
+            logging.warning(
+                "O modelo de certificado do evento %s ainda carrega recursos remotos: %s", event.pk, ", ".join(remote)
+            )
+        template = Template(source)
+        certificate_templates.set(key, template)
+    return template
+
+
+def certificate_content_hash(event, html_content, stamp=False):
+    """
+    Fingerprints a rendered certificate: a SHA-256 of the event template version, the rendered HTML and
+    whether the PDF is stamped.
+
+    Certificates whose hash didn't change since their PDF was generated would print to the same PDF.
+    """
+    content = f"{certificate_template_version(event)}\n{'stamp' if stamp else 'print'}\n{html_content}"
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+# Remote resources a certificate template may load: ``src`` attributes, ``href`` of ``<link>`` tags and CSS
+# ``url()``, with absolute or protocol-relative URLs.
+REMOTE_SRC_RE = re.compile(r"""(\bsrc\s*=\s*["'])((?:https?:)?//[^"'\s]+)""", re.IGNORECASE)
+LINK_TAG_RE = re.compile(r"<link\b[^>]*>", re.IGNORECASE)
+LINK_HREF_RE = re.compile(r"""(\bhref\s*=\s*["'])((?:https?:)?//[^"'\s]+)""", re.IGNORECASE)
+CSS_URL_RE = re.compile(r"""(url\(\s*["']?)(?!data:)([^"')\s]+)""", re.IGNORECASE)
+
+ASSET_USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36"
+
+
+# Schemes certificate templates may load resources from; anything else (file:, ftp:...) is never fetched.
+ASSET_SCHEMES = ("http", "https")
+
+
+def asset_addresses(hostname, port):
+    """
+    Resolves the host of an asset, refusing it when any of its addresses isn't on the public internet.
+
+    :return: List of ``getaddrinfo`` results of the host.
+    :raises ValueError: When the host has an internal address.
+    """
+    addresses = socket.getaddrinfo(hostname, port, type=socket.SOCK_STREAM)
+    for *_, address in addresses:
+        if not ipaddress.ip_address(address[0].split("%")[0]).is_global:
+            raise ValueError(f"Endereço interno não permitido: {hostname}")
+    return addresses
+
+
+def check_asset_url(url):
+    """
+    Refuses to download an asset from an URL that isn't http(s), or whose host isn't on the public internet, so
+    templates can't read local files or reach internal services.
+
+    :raises ValueError: When the URL is refused.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ASSET_SCHEMES or not parts.hostname:
+        raise ValueError(f"Endereço não permitido: {url}")
+    asset_addresses(parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+
+
+class AssetHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection to the very addresses :func:`asset_addresses` checked, resolving the host only once, so a
+    host can't resolve to a public address when checked and to an internal one when connected to.
+    """
+
+    def connect(self):
+        error = None
+        for family, socket_type, proto, _, address in asset_addresses(self.host, self.port):
+            sock = socket.socket(family, socket_type, proto)
+            try:
+                sock.settimeout(self.timeout)
+                sock.connect(address)
+            except OSError as e:
+                sock.close()
+                error = e
+                continue
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock = sock
+            return
+        raise error or OSError(f"Não foi possível conectar a {self.host}")
+
+
+class AssetHTTPSConnection(http.client.HTTPSConnection, AssetHTTPConnection):
+    """
+    HTTPS version of :class:`AssetHTTPConnection`: the TLS handshake still checks the certificate of, and sends
+    as SNI, the host name of the URL.
+    """
+
+
+class AssetHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, request):
+        return self.do_open(AssetHTTPConnection, request)
+
+
+class AssetHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, request):
+        return self.do_open(AssetHTTPSConnection, request, context=self._context)
+
+
+class AssetRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """
+    Follows redirects only to URLs :func:`check_asset_url` accepts.
+    """
+
+    def redirect_request(self, request, fp, code, msg, headers, newurl):
+        check_asset_url(newurl)
+        return super().redirect_request(request, fp, code, msg, headers, newurl)
+
+
+def fetch_asset(url):
+    """
+    Downloads a remote asset, of at most ``CERTIFICATE_ASSET_MAX_KB``, straight from its host: proxies would
+    connect to it on our behalf, out of reach of the address checks.
+
+    :return: Tuple with the content type and the content of the asset.
+    :raises ValueError: When the URL is refused (see :func:`check_asset_url`) or the asset is too big.
+    """
+    check_asset_url(url)
+    max_size = settings.CERTIFICATE_ASSET_MAX_KB * 1024
+    request = urllib.request.Request(url, headers={"User-Agent": ASSET_USER_AGENT})
+    opener = urllib.request.build_opener(
+        urllib.request.ProxyHandler({}), AssetHTTPHandler, AssetHTTPSHandler, AssetRedirectHandler
+    )
+    with opener.open(request, timeout=settings.CERTIFICATE_ASSET_TIMEOUT) as response:
+        content_type = response.headers.get_content_type()
+        if content_type in ("application/octet-stream", "text/plain"):
+            content_type = mimetypes.guess_type(urllib.parse.urlsplit(url).path)[0] or content_type
+        content = response.read(max_size + 1)
+        if len(content) > max_size:
+            raise ValueError(f"Recurso maior que {settings.CERTIFICATE_ASSET_MAX_KB} KB: {url}")
+        return content_type, content
+
+
+def is_remote_url(url):
+    return url.startswith(("http://", "https://", "//"))
+
+
+def remote_references(html_content):
+    """
+    Lists the remote resources an HTML content still loads.
+    """
+    urls = [match.group(2) for match in REMOTE_SRC_RE.finditer(html_content)]
+    for tag in LINK_TAG_RE.findall(html_content):
+        urls.extend(match.group(2) for match in LINK_HREF_RE.finditer(tag))
+    urls.extend(url for _, url in CSS_URL_RE.findall(html_content) if is_remote_url(url))
+    return list(dict.fromkeys(urls))
+
+
+def localize_assets(html_content, fetch=None):
+    """
+    Downloads the remote resources of an HTML content (images, stylesheets, fonts) and inlines them as data
+    URIs, so printing it never touches the network. Stylesheets have their own resources inlined as well.
+
+    Only http(s) resources are downloaded; others (e.g. ``file:``) and those that can't be downloaded are logged
+    and left untouched.
+
+    :param html_content: HTML content, e.g. a certificate template.
+    :param fetch: Function downloading an URL, returning its content type and content (:func:`fetch_asset`).
+    :return: The HTML content with its remote resources inlined.
+    """
+    fetch = fetch or fetch_asset
+    data_uris = {}
+
+    def data_uri(url, base_url=None):
+        url = urllib.parse.urljoin(base_url or "https:", url)
+        if urllib.parse.urlsplit(url).scheme not in ASSET_SCHEMES:
+            logging.warning("Recurso %s do modelo de certificado ignorado: só http e https são baixados", url)
+            return None
+        if url not in data_uris:
+            try:
+                content_type, content = fetch(url)
+                if content_type == "text/css":
+                    content = localize_css(content.decode("utf-8"), url).encode("utf-8")
+                data_uris[url] = f"data:{content_type};base64,{base64.b64encode(content).decode('ascii')}"
+            except Exception as e:
+                logging.warning("Não foi possível baixar o recurso %s do modelo de certificado: %s", url, e)
+                data_uris[url] = None
+        return data_uris[url]
+
+    def inline(match, base_url=None):
+        return match.group(1) + (data_uri(match.group(2), base_url) or match.group(2))
+
+    def localize_css(css, base_url):
+        return CSS_URL_RE.sub(lambda match: inline(match, base_url), css)
+
+    html_content = REMOTE_SRC_RE.sub(inline, html_content)
+    html_content = LINK_TAG_RE.sub(lambda tag: LINK_HREF_RE.sub(inline, tag.group(0)), html_content)
+    return CSS_URL_RE.sub(
+        lambda match: inline(match) if is_remote_url(match.group(2)) else match.group(0), html_content
+    )
+
+
+SIGNATURE_IMAGE_MAX_SIZE = (800, 300)
+
+
+def encode_signature_image(content):
+    """
+    Encodes a signature image as a PNG data URI, down-scaled to fit ``SIGNATURE_IMAGE_MAX_SIZE``.
+
+    Content Pillow can't read is encoded as it is.
+    """
+    try:
+        with Image.open(BytesIO(content)) as image:
+            image = image.convert("RGBA")
+            image.thumbnail(SIGNATURE_IMAGE_MAX_SIZE)
+            output = BytesIO()
+            image.save(output, format="PNG", optimize=True)
+            content = output.getvalue()
+    except (UnidentifiedImageError, OSError) as e:
+        logging.warning("Não foi possível normalizar a imagem da assinatura: %s", e)
+
+    return f"data:image/png;base64,{base64.b64encode(content).decode('utf-8')}"
+
+
+@lru_cache(maxsize=None)
+def chromedriver_path():
+    """
+    Resolves the ChromeDriver executable once per process.
+
+    The ``CHROMEDRIVER_PATH`` setting and a ``chromedriver`` found on ``PATH`` are tried first, so no network
+    access is needed. webdriver-manager is only used as a fallback and, when it fails (e.g. offline without a
+    cached driver), ``None`` is returned to let Selenium Manager look for a local driver.
+    """
+    path = settings.CHROMEDRIVER_PATH or shutil.which("chromedriver")
+    if path:
+        return path
+
+    try:
+        return ChromeDriverManager().install()
+    except Exception as e:
+        logging.warning("Não foi possível resolver o ChromeDriver pelo webdriver-manager: %s", e)
+        return None
+
+
+def start_chrome():
+    """
+    Starts a new headless Chrome session.
     """
     options = webdriver.ChromeOptions()
     options.add_argument("--no-sandbox")
     options.add_argument("--headless")
     options.add_argument("--disable-gpu")
     options.add_argument("--disable-dev-shm-usage")
-    ChromeDriverManager().install()
-    driver = webdriver.Chrome(options=options)
+    return webdriver.Chrome(options=options, service=Service(executable_path=chromedriver_path()))
 
-    try:
-        temp_html_file = tempfile.NamedTemporaryFile(delete=True, suffix=".html")
+
+def process_tree_memory(pid):
+    """
+    Returns the resident memory, in bytes, of a process and all of its descendants.
+
+    Reads ``/proc`` and therefore only works on Linux; elsewhere it returns 0.
+    """
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            with open(f"/proc/{current}/task/{current}/children") as children:
+                pending.extend(int(child) for child in children.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+class BrowserSession:
+    """
+    A warm browser kept by the :class:`BrowserPool`, with the bookkeeping used to decide when to recycle it.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.renders = 0
+
+    @property
+    def memory_usage(self):
+        """
+        Resident memory of the driver and the browser processes it spawned, in bytes.
+        """
+        process = getattr(getattr(self.driver, "service", None), "process", None)
+        if process is None:
+            return 0
+        return process_tree_memory(process.pid)
+
+    def quit(self):
+        """
+        Shuts the browser down, ignoring errors from sessions that already crashed.
+        """
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logging.warning("Erro ao encerrar o navegador: %s", e)
+
+
+class BrowserPool:
+    """
+    Bounded pool of long-lived headless browser sessions.
+
+    At most ``size`` sessions exist at the same time; callers beyond that wait for a session to be returned.
+    A session is recycled after ``max_renders`` renders or once its processes use more than ``max_memory_mb``
+    megabytes, and it is discarded whenever it raises a :class:`WebDriverException`, so the next borrower
+    gets a fresh browser.
+    """
+
+    def __init__(self, size, max_renders=0, max_memory_mb=0, factory=start_chrome):
+        self.max_renders = max_renders
+        self.max_memory = max_memory_mb * 1024 * 1024
+        self.factory = factory
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def driver(self):
+        """
+        Borrows a driver from the pool for the duration of the ``with`` block.
+        """
+        with self._slots:
+            with self._lock:
+                session = self._idle.pop() if self._idle else None
+            if session is None:
+                session = BrowserSession(self.factory())
+
+            try:
+                yield session.driver
+            except WebDriverException:
+                session.quit()
+                raise
+            except BaseException:
+                self._release(session)
+                raise
+            else:
+                session.renders += 1
+                self._release(session)
+
+    def _release(self, session):
+        """
+        Returns a session to the pool, or quits it when it is due for recycling.
+        """
+        if (self.max_renders and session.renders >= self.max_renders) or (
+            self.max_memory and session.memory_usage > self.max_memory
+        ):
+            session.quit()
+            return
+
+        with self._lock:
+            self._idle.append(session)
+
+    def close(self):
+        """
+        Quits every idle session.
+        """
+        with self._lock:
+            sessions, self._idle = self._idle, []
+        for session in sessions:
+            session.quit()
+
+
+_browser_pool = None
+_browser_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """
+    Returns the process-wide :class:`BrowserPool`, creating it on first use.
+    """
+    global _browser_pool
+
+    with _browser_pool_lock:
+        if _browser_pool is None:
+            _browser_pool = BrowserPool(
+                size=settings.CERTIFICATE_BROWSER_POOL_SIZE,
+                max_renders=settings.CERTIFICATE_BROWSER_MAX_RENDERS,
+                max_memory_mb=settings.CERTIFICATE_BROWSER_MAX_MEMORY_MB,
+            )
+            atexit.register(_browser_pool.close)
+        return _browser_pool
+
+
+@contextmanager
+def loaded_html(driver, html_content):
+    """
+    Loads the HTML content in the given driver, waiting for its fonts, for the duration of the ``with`` block.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".html") as temp_html_file:
         temp_html_file.write(html_content.encode("utf-8"))
         temp_html_file.flush()
 
         driver.get(f"file://{temp_html_file.name}")
         driver.execute_script("return document.fonts.ready")
-        pdf_content = driver.execute_cdp_cmd(
-            "Page.printToPDF",
-            {
-                "printBackground": True,
-                "paperWidth": page_width,
-                "paperHeight": page_height,
-                "marginTop": 0,
-                "marginBottom": 0,
-                "marginLeft": 0,
-                "marginRight": 0,
-            },
+        yield
+
+
+def print_page(driver, page_width, page_height):
+    """
+    Prints the page loaded in the given driver to PDF.
+
+    The PDF is normalized, dropping the timestamps Chrome embeds, so the same HTML always prints the same bytes.
+    """
+    pdf_content = driver.execute_cdp_cmd(
+        "Page.printToPDF",
+        {
+            "printBackground": True,
+            "paperWidth": page_width,
+            "paperHeight": page_height,
+            "marginTop": 0,
+            "marginBottom": 0,
+            "marginLeft": 0,
+            "marginRight": 0,
+        },
+    )
+    return normalize(base64.b64decode(pdf_content["data"]))
+
+
+def print_to_pdf(driver, html_content, page_width, page_height):
+    """
+    Loads the HTML content in the given driver and prints it to PDF.
+    """
+    with loaded_html(driver, html_content):
+        return print_page(driver, page_width, page_height)
+
+
+def with_browser(render, *args):
+    """
+    Calls ``render(driver, *args)`` with a browser borrowed from the process-wide pool.
+
+    If the browser crashes during the render it is replaced and the render is retried once.
+    """
+    pool = get_browser_pool()
+    try:
+        with pool.driver() as driver:
+            return render(driver, *args)
+    except WebDriverException as e:
+        logging.warning("Navegador falhou ao gerar PDF, tentando novamente: %s", e)
+
+    with pool.driver() as driver:
+        return render(driver, *args)
+
+
+_devtools_renderer = None
+_devtools_renderer_lock = threading.Lock()
+
+
+def get_devtools_renderer():
+    """
+    Returns the process-wide :class:`SyncDevToolsRenderer`, creating it on first use.
+    """
+    global _devtools_renderer
+
+    with _devtools_renderer_lock:
+        if _devtools_renderer is None:
+            _devtools_renderer = SyncDevToolsRenderer(
+                DevToolsRenderer(find_chrome(settings.CHROME_PATH), max_tabs=settings.CERTIFICATE_RENDERER_TABS)
+            )
+            atexit.register(_devtools_renderer.close)
+        return _devtools_renderer
+
+
+def with_devtools(render, *args):
+    """
+    Calls ``render(renderer, *args)`` with the process-wide DevTools renderer.
+
+    If the connection to the browser is lost during the render, the browser is restarted and the render is
+    retried once.
+    """
+    renderer = get_devtools_renderer()
+    try:
+        return render(renderer, *args)
+    except DevToolsError as e:
+        logging.warning("Navegador falhou ao gerar PDF, tentando novamente: %s", e)
+    return render(renderer, *args)
+
+
+class PDFRenderer:
+    """
+    Prints HTML contents to PDF. The renderer used by :func:`html_to_pdf` and friends is chosen by the
+    ``CERTIFICATE_RENDERER`` setting, see :func:`get_pdf_renderer`.
+    """
+
+    # Whether print_many prints the documents at the same time instead of one after the other.
+    concurrent = False
+
+    def print_to_pdf(self, html_content, page_width, page_height):
+        """
+        Prints an HTML content to PDF.
+
+        :return: PDF content as bytes.
+        """
+        raise NotImplementedError
+
+    def print_many(self, html_documents, page_width, page_height):
+        """
+        Prints many HTML contents to PDF.
+
+        :return: List with the PDF content of each document, in the same order.
+        """
+        return [self.print_to_pdf(html_content, page_width, page_height) for html_content in html_documents]
+
+    def print_stamp_background(self, html_content, page_width, page_height):
+        """
+        Prints a certificate background and measures its stamp anchors, like :func:`print_stamp_background`.
+        """
+        return with_browser(print_stamp_background, html_content, page_width, page_height)
+
+
+class SeleniumPDFRenderer(PDFRenderer):
+    """
+    Prints each document in a browser borrowed from the process-wide pool.
+    """
+
+    def print_to_pdf(self, html_content, page_width, page_height):
+        return with_browser(print_to_pdf, html_content, page_width, page_height)
+
+
+class DevToolsPDFRenderer(PDFRenderer):
+    """
+    Prints documents concurrently, in up to ``CERTIFICATE_RENDERER_TABS`` tabs of the DevTools renderer.
+    """
+
+    concurrent = True
+
+    def print_to_pdf(self, html_content, page_width, page_height):
+        return with_devtools(SyncDevToolsRenderer.print_to_pdf, html_content, page_width, page_height)
+
+    def print_many(self, html_documents, page_width, page_height):
+        return with_devtools(SyncDevToolsRenderer.print_many, list(html_documents), page_width, page_height)
+
+    def print_stamp_background(self, html_content, page_width, page_height):
+        pdf_content, anchors = with_devtools(
+            SyncDevToolsRenderer.print_with_script, html_content, STAMP_ANCHORS_SCRIPT, page_width, page_height
+        )
+        return pdf_content, scale_stamp_anchors(anchors)
+
+
+class FakePDFRenderer(PDFRenderer):
+    """
+    Prints blank pages in-process, without a browser: one page per document, or per certificate of a batch job.
+
+    Meant for tests and for benchmarking everything around the browser, e.g. with the ``benchmark_certificates``
+    command.
+    """
+
+    def print_to_pdf(self, html_content, page_width, page_height):
+        pages = max(html_content.count('class="pyaba-batch-page"'), 1)
+        return write_pages(
+            PageObject.create_blank_page(width=page_width * 72, height=page_height * 72) for _ in range(pages)
         )
 
-        return base64.b64decode(pdf_content["data"])
+    def print_stamp_background(self, html_content, page_width, page_height):
+        anchors = []
+        if "data-pyaba-stamp" in html_content:
+            anchors.append(
+                {"x": page_width * 36, "y": page_height * 36, "align": "center", "font_size": 24, "color": (0, 0, 0)}
+            )
+        return self.print_to_pdf(html_content, page_width, page_height), anchors
+
+
+CERTIFICATE_RENDERERS = {
+    "selenium": SeleniumPDFRenderer,
+    "devtools": DevToolsPDFRenderer,
+    "fake": FakePDFRenderer,
+}
+
+
+@lru_cache(maxsize=None)
+def load_pdf_renderer(name):
+    """
+    Returns the renderer registered in :data:`CERTIFICATE_RENDERERS` with the given name, or an instance of the
+    :class:`PDFRenderer` subclass at the given dotted path, creating it on first use.
+    """
+    renderer_class = CERTIFICATE_RENDERERS.get(name) or import_string(name)
+    return renderer_class()
+
+
+def get_pdf_renderer():
+    """
+    Returns the renderer chosen by the ``CERTIFICATE_RENDERER`` setting.
+    """
+    return load_pdf_renderer(settings.CERTIFICATE_RENDERER)
+
+
+def html_to_pdf(html_content, page_width=8.27, page_height=11.69):
+    """
+    Converts HTML content to PDF with the renderer chosen by ``CERTIFICATE_RENDERER``: by default in a browser
+    borrowed from the process-wide pool, or in a tab of the DevTools renderer when it is ``devtools``.
+
+    If the browser crashes during the render it is replaced and the render is retried once.
+
+    :param html_content: HTML content to convert.
+    :param page_width: Width of the PDF page in inches.
+    :param page_height: Height of the PDF page in inches.
+    :return: PDF content as bytes.
+    """
+    return get_pdf_renderer().print_to_pdf(html_content, page_width, page_height)
+
+
+def html_to_pdfs(html_documents, page_width=8.27, page_height=11.69):
+    """
+    Converts many HTML contents to PDF: all at once with a concurrent renderer (e.g. in up to
+    ``CERTIFICATE_RENDERER_TABS`` tabs with the DevTools renderer), or one after the other with :func:`html_to_pdf`.
+
+    :param html_documents: Iterable with the HTML content of each document.
+    :param page_width: Width of the PDF pages in inches.
+    :param page_height: Height of the PDF pages in inches.
+    :return: List with the PDF content of each document, in the same order.
+    """
+    html_documents = list(html_documents)
+    renderer = get_pdf_renderer()
+    if renderer.concurrent:
+        return renderer.print_many(html_documents, page_width, page_height)
+    return [html_to_pdf(html_content, page_width, page_height) for html_content in html_documents]
+
+
+# Stands for the attendee name when printing the certificate background: it keeps the layout of the name but
+# isn't printed, and marks the place where the name is stamped afterwards.
+STAMP_PLACEHOLDER = mark_safe('<span data-pyaba-stamp style="visibility: hidden">NOME DO PARTICIPANTE</span>')
+
+# Finds the stamp placeholders on the loaded page and returns where, and how, the name is written in each.
+STAMP_ANCHORS_SCRIPT = """
+return Array.from(document.querySelectorAll("[data-pyaba-stamp]")).map((placeholder) => {
+  const probe = document.createElement("span");
+  probe.style.display = "inline-block";
+  placeholder.appendChild(probe);
+  const baseline = probe.getBoundingClientRect().bottom;
+  probe.remove();
+
+  const rect = placeholder.getBoundingClientRect();
+  const style = getComputedStyle(placeholder);
+  const textAlign = getComputedStyle(placeholder.parentElement).textAlign;
+  const align = textAlign === "center" ? "center" : ["right", "end"].includes(textAlign) ? "right" : "left";
+  return {
+    x: { left: rect.left, center: rect.left + rect.width / 2, right: rect.right }[align],
+    y: baseline,
+    align: align,
+    font_size: parseFloat(style.fontSize),
+    bold: parseInt(style.fontWeight, 10) >= 600,
+    color: (style.color.match(/[\\d.]+/g) || [0, 0, 0]).slice(0, 3).map(Number),
+  };
+});
+"""
+
+# Chrome lays pages out at 96 CSS pixels per inch, and PDFs measure 72 points per inch.
+POINTS_PER_PIXEL = 72 / 96
+
+certificate_backgrounds = LRUCache(maxsize=settings.CERTIFICATE_BACKGROUND_CACHE_SIZE)
+
+
+def print_stamp_background(driver, html_content, page_width, page_height):
+    """
+    Loads an HTML content rendered with :data:`STAMP_PLACEHOLDER` in the given driver, prints it to PDF and
+    measures where the placeholders are.
+
+    :return: Tuple with the PDF content and the stamp anchors, in points, as expected by :func:`pdf.stamp_text`.
+    """
+    with loaded_html(driver, html_content):
+        anchors = driver.execute_script(STAMP_ANCHORS_SCRIPT)
+        pdf_content = print_page(driver, page_width, page_height)
+    return pdf_content, scale_stamp_anchors(anchors)
+
+
+def scale_stamp_anchors(anchors):
+    """
+    Converts the stamp anchors measured by :data:`STAMP_ANCHORS_SCRIPT`, in CSS pixels and 0-255 colors, to the
+    points and 0-1 colors expected by :func:`pdf.stamp_text`.
+    """
+    for anchor in anchors:
+        anchor["x"] *= POINTS_PER_PIXEL
+        anchor["y"] *= POINTS_PER_PIXEL
+        anchor["font_size"] *= POINTS_PER_PIXEL
+        anchor["color"] = tuple(component / 255 for component in anchor["color"])
+    return anchors
+
+
+def html_to_stamped_pdfs(background_html, texts, page_width=8.27, page_height=11.69):
+    """
+    Converts a certificate background to PDF once and stamps each text on a copy of it, without a browser.
+
+    The background is an HTML content rendered with :data:`STAMP_PLACEHOLDER` in place of the attendee name;
+    its PDF and stamp anchors are cached by content, so every batch of the same tutorial reuses them. The
+    texts are written with the standard Helvetica fonts, at the size, weight, color and alignment of the
+    placeholder.
+
+    :param background_html: HTML content of the background.
+    :param texts: Iterable with the text stamped on each document.
+    :param page_width: Width of the PDF page in inches.
+    :param page_height: Height of the PDF page in inches.
+    :return: List with the PDF content of each document, in the same order as the texts, or None when the
+        background has no placeholder to stamp.
+    """
+    key = (hashlib.sha256(background_html.encode("utf-8")).hexdigest(), page_width, page_height)
+    background = certificate_backgrounds.get(key)
+    if background is None:
+        background = get_pdf_renderer().print_stamp_background(background_html, page_width, page_height)
+        certificate_backgrounds.set(key, background)
+
+    pdf_content, anchors = background
+    if not anchors:
+        return None
+    return [stamp_text(pdf_content, text, anchors) for text in texts]
+
+
+HTML_HEAD_RE = re.compile(r"<head[^>]*>(.*?)</head>", re.IGNORECASE | re.DOTALL)
+HTML_BODY_RE = re.compile(r"<body\s*>(.*?)</body>", re.IGNORECASE | re.DOTALL)
+
+BATCH_PAGE_STYLE = """
+<style>
+  body {{ margin: 0; }}
+  .pyaba-batch-page {{
+    position: relative;
+    overflow: hidden;
+    width: {width}in;
+    height: {height}in;
+    break-after: page;
+  }}
+</style>
+"""
+
+
+def html_to_pdf_batch(html_documents, page_width=8.27, page_height=11.69, batch_size=50):
+    """
+    Converts many single-page HTML documents to PDF, printing each group of documents as one job.
+
+    Documents sharing the same ``<head>`` (e.g. certificates rendered from the same template) have their
+    bodies laid out one per page in a single document, which is printed once and split back into one PDF
+    per document. Documents that can't be combined (no ``<head>``, attributes on ``<body>``), and groups
+    whose printed page count doesn't match the number of documents, fall back to printing each document on
+    its own. All jobs go through :func:`html_to_pdfs`, so the DevTools renderer prints them concurrently.
+
+    :param html_documents: Iterable with the HTML content of each document.
+    :param page_width: Width of the PDF pages in inches.
+    :param page_height: Height of the PDF pages in inches.
+    :param batch_size: Maximum number of documents printed in a single job.
+    :return: List with the PDF content of each document, in the same order.
+    """
+    html_documents = list(html_documents)
+    pdf_documents = [None] * len(html_documents)
+
+    # Each print job holds the indexes of the documents it prints and its HTML content.
+    jobs = []
+    groups = {}
+    for index, html_content in enumerate(html_documents):
+        head = HTML_HEAD_RE.search(html_content)
+        body = HTML_BODY_RE.search(html_content)
+        if head and body:
+            groups.setdefault(head.group(1), []).append((index, body.group(1)))
+        else:
+            jobs.append(([index], html_content))
+
+    page_style = BATCH_PAGE_STYLE.format(width=page_width, height=page_height)
+    for head, documents in groups.items():
+        for start in range(0, len(documents), batch_size):
+            batch = documents[start : start + batch_size]
+            if len(batch) == 1:
+                index, _ = batch[0]
+                jobs.append(([index], html_documents[index]))
+                continue
+
+            html_content = "<!DOCTYPE html><html><head>{}{}</head><body>{}</body></html>".format(
+                head,
+                page_style,
+                "".join(f'<div class="pyaba-batch-page">{body}</div>' for _, body in batch),
+            )
+            jobs.append(([index for index, _ in batch], html_content))
+
+    reprint = []
+    for (indexes, _), pdf_content in zip(jobs, html_to_pdfs([html for _, html in jobs], page_width, page_height)):
+        if len(indexes) == 1:
+            pdf_documents[indexes[0]] = pdf_content
+            continue
+
+        pages = split_pages(pdf_content)
+        if len(pages) != len(indexes):
+            logging.warning(
+                "Impressão em lote gerou %s páginas para %s documentos, gerando um a um.", len(pages), len(indexes)
+            )
+            reprint.extend(indexes)
+            continue
+
+        for index, page in zip(indexes, pages):
+            pdf_documents[index] = page
+
+    pages = html_to_pdfs([html_documents[index] for index in reprint], page_width, page_height)
+    for index, page in zip(reprint, pages):
+        pdf_documents[index] = page
+
+    return pdf_documents
+
+
+class SingleFlight:
+    """
+    Runs a function at most once at a time per key: callers arriving while it runs wait for it and share its
+    result or exception instead of running it again.
+    """
+
+    class Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self.Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class RenderCapacityError(RuntimeError):
+    """
+    Raised when no render slot becomes free within the timeout.
+    """
+
+
+certificate_generations = SingleFlight()
+_on_demand_render_slots = threading.BoundedSemaphore(settings.CERTIFICATE_ON_DEMAND_MAX_RENDERS)
+
+
+@contextmanager
+def on_demand_render_slot(timeout=None):
+    """
+    Holds one of the ``CERTIFICATE_ON_DEMAND_MAX_RENDERS`` slots of the process for on-demand renders.
+
+    Raises :class:`RenderCapacityError` if no slot becomes free within ``timeout`` seconds (defaults to
+    ``CERTIFICATE_ON_DEMAND_TIMEOUT``).
+    """
+    if timeout is None:
+        timeout = settings.CERTIFICATE_ON_DEMAND_TIMEOUT
+    if not _on_demand_render_slots.acquire(timeout=timeout):
+        raise RenderCapacityError("Nenhuma vaga livre para gerar o certificado.")
+    try:
+        yield
     finally:
-        driver.quit()
+        _on_demand_render_slots.release()
+
+
+class ChunkBuffer:
+    """
+    Write-only, unseekable file that keeps what is written until it is taken with :meth:`take`.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(files, chunk_size=64 * 1024):
+    """
+    Writes files to a ZIP archive, yielding the archive in chunks as it is written.
+
+    Entries are stored without compression, as PDFs are already compressed, and only one chunk of one file is
+    held in memory at a time.
+
+    :param files: Iterable with the name and binary file-like object of each file.
+    :param chunk_size: Size of the chunks read from each file.
+    :return: Generator of the ZIP content, in chunks of bytes.
+    """
+    buffer = ChunkBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, file in files:
+            with archive.open(name, "w") as entry:
+                while chunk := file.read(chunk_size):
+                    entry.write(chunk)
+                    yield buffer.take()
+            yield buffer.take()
+    yield buffer.take()
+
+
+def certificate_files(registrations):
+    """
+    Opens the certificate of each registration in turn, yielding its name in a bundle and its file.
+
+    Certificates missing from the storage are skipped.
+    """
+    for registration in registrations:
+        name = "{}/{}-{}.pdf".format(
+            slugify(registration.tutorial.title), slugify(registration.certificate_name), str(registration.uuid)[:8]
+        )
+        try:
+            certificate = registration.certificate_pdf.open("rb")
+        except FileNotFoundError:
+            logging.warning("Certificado não encontrado no armazenamento: %s", registration.certificate_pdf.name)
+            continue
+        with certificate:
+            yield name, certificate
+
+
+CERTIFICATE_BUNDLES = {"zip": "application/zip", "pdf": "application/pdf"}
+
+
+def certificate_bundle_response(registrations, bundle, filename):
+    """
+    Streams the generated certificates of the registrations as one ZIP archive or one merged PDF.
+
+    Registrations are read from the database in chunks and each certificate is read only while it is sent,
+    so memory use doesn't grow with the number of certificates.
+
+    :param registrations: Queryset of the registrations to include; those without a certificate are skipped.
+    :param bundle: ``zip`` or ``pdf``.
+    :param filename: Name of the downloaded file, without extension.
+    """
+    registrations = (
+        registrations.filter(certificate_pdf__gt="")
+        .select_related("attendee", "tutorial")
+        .order_by("tutorial__start_datetime", "tutorial__title", "attendee__full_name")
+        .iterator(chunk_size=200)
+    )
+    files = certificate_files(registrations)
+    if bundle == "pdf":
+        content = stream_merged(certificate for _, certificate in files)
+    else:
+        content = stream_zip(files)
+
+    response = StreamingHttpResponse(content, content_type=CERTIFICATE_BUNDLES[bundle])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{bundle}"'
+    return response
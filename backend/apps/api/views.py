@@ -1,4 +1,7 @@
+import hashlib
+import json
 import uuid
+from functools import wraps
 
 from django.http import FileResponse, Http404
 from django.utils.translation import gettext_lazy as _
@@ -7,14 +10,33 @@ from django.db import transaction
 from django.conf import settings
 from django.shortcuts import render
 from django.urls import reverse
+from django.utils.text import slugify
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 
 from rest_framework import viewsets
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework import status
-
-from apps.api.models import Event, Tutorial, Instructor, Registration, Attendee
+from rest_framework.permissions import IsAdminUser
+
+from apps.api.caching import event_version, get_event_document, set_event_document
+from apps.api.models import (
+    Event,
+    Tutorial,
+    Instructor,
+    Registration,
+    Attendee,
+    IdempotencyKey,
+    SubscriptionRequest,
+)
 from apps.api.serializers import EventReadOnlySerializer, TutorialReadOnlySerializer
+from apps.api.throttling import RegistrationThrottle
+from apps.api.utils import (
+    CERTIFICATE_BUNDLES,
+    RenderCapacityError,
+    certificate_bundle_response,
+)
 
 
 def index(request, slug=None):
@@ -49,6 +71,20 @@ def index(request, slug=None):
     )
 
 
+def certificates_bundle(request, registrations, filename):
+    """
+    Streams the certificates of the registrations in the bundle chosen by the ``bundle``
+    query parameter: ``zip`` (default) or ``pdf``.
+    """
+    bundle = request.query_params.get("bundle", "zip")
+    if bundle not in CERTIFICATE_BUNDLES:
+        return Response(
+            {"error": _("Invalid bundle, use zip or pdf")},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return certificate_bundle_response(registrations, bundle, filename)
+
+
 def event_image(request, pk):
     """
     View that serves the image file for an Event instance.
@@ -91,6 +127,159 @@ def instructor_photo(request, pk):
     )
 
 
+def subscription_request_response(subscription_request, status_code=status.HTTP_200_OK):
+    """
+    Response with the state of a subscription request of the admission queue.
+    """
+    data = {
+        "ticket": subscription_request.ticket,
+        "status": subscription_request.status,
+    }
+    headers = None
+    if subscription_request.status == SubscriptionRequest.Status.QUEUED:
+        data["position"] = subscription_request.position
+        headers = {"Retry-After": str(settings.REGISTRATION_QUEUE_RETRY_AFTER)}
+    elif subscription_request.status == SubscriptionRequest.Status.SUBSCRIBED:
+        data["registration_id"] = subscription_request.registration_id
+        data["subscribed"] = True
+    else:
+        data["error"] = subscription_request.error
+    return Response(data, status=status_code, headers=headers)
+
+
+def queue_subscription(tutorial_id, cpf, name, email, birthday):
+    """
+    Put a subscription in the admission queue, answering right away with its ticket.
+    """
+    if not Tutorial.objects.filter(id=tutorial_id).exists():
+        return Response(
+            {"error": _("Tutorial with this ID does not exist")},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    subscription_request = SubscriptionRequest.objects.create(
+        tutorial_id=tutorial_id,
+        cpf=cpf,
+        full_name=name or "",
+        email=email or "",
+        birthday=birthday or None,
+    )
+    return subscription_request_response(subscription_request, status.HTTP_202_ACCEPTED)
+
+
+def idempotent(view):
+    """
+    Decorator for actions that, when the request has an ``Idempotency-Key`` header,
+    replays the response stored for the first request from the same client with that
+    key and path instead of running the action again.
+
+    The key is reserved before the action runs: retries sent while the first request is
+    still running get 409 Conflict. Server errors are not stored, so the client may
+    retry them with the same key.
+    """
+
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if not key:
+            return view(self, request, *args, **kwargs)
+
+        if len(key) > 255:
+            return Response(
+                {"error": _("Idempotency-Key must have at most 255 characters")},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if request.user.is_authenticated:
+            client = f"user:{request.user.pk}"
+        else:
+            client = f"ip:{RegistrationThrottle().get_ident(request)}"
+        request_hash = hashlib.sha256(
+            json.dumps(request.data, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        reserved, created = IdempotencyKey.reserve(
+            key, request.path, client[:255], request_hash
+        )
+        if not created:
+            if reserved.request_hash != request_hash:
+                return Response(
+                    {"error": _("Idempotency-Key already used with another request")},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if reserved.in_progress:
+                return Response(
+                    {"error": _("A request with this Idempotency-Key is in progress")},
+                    status=status.HTTP_409_CONFLICT,
+                    headers={"Retry-After": "1"},
+                )
+            return Response(
+                reserved.body,
+                status=reserved.status_code,
+                headers={"Idempotent-Replayed": "true"},
+            )
+
+        try:
+            response = view(self, request, *args, **kwargs)
+        except BaseException:
+            reserved.release()
+            raise
+        if response.status_code < 500:
+            reserved.finish(response.status_code, response.data)
+        else:
+            reserved.release()
+        return response
+
+    return wrapper
+
+
+def versioned(version_of):
+    """
+    Decorator for read actions that tags the response with a strong ETag made from the
+    version stamp returned by ``version_of`` (called with the URL kwargs), and answers
+    304 Not Modified, without running the action, to requests whose ``If-None-Match``
+    holds it.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            version = version_of(**kwargs)
+            if version is None:
+                return view(self, request, *args, **kwargs)
+
+            etag = quote_etag(version)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view(self, request, *args, **kwargs)
+            if response.status_code in (
+                status.HTTP_200_OK,
+                status.HTTP_304_NOT_MODIFIED,
+            ):
+                response.headers["ETag"] = etag
+                # Lets browsers keep the response, but revalidate it on every request
+                response.headers["Cache-Control"] = "no-cache"
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def tutorial_event_version(pk=None, **kwargs):
+    """
+    Version stamp of the event of the tutorial, or None when the tutorial doesn't exist.
+    """
+    try:
+        slug = (
+            Event.objects.filter(tutorials=int(pk))
+            .values_list("slug", flat=True)
+            .first()
+        )
+    except (TypeError, ValueError):
+        return None
+    return event_version(slug) if slug else None
+
+
 class EventViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for reading Event instances.
@@ -99,20 +288,63 @@ class EventViewSet(viewsets.ReadOnlyModelViewSet):
     lookup_field = "slug"
     queryset = Event.objects.all().order_by("-start_date")
     serializer_class = EventReadOnlySerializer
+    throttle_classes = [RegistrationThrottle]
+
+    @versioned(lambda **kwargs: event_version())
+    def list(self, request, *args, **kwargs):
+        """
+        List the events.
+        """
+        return super().list(request, *args, **kwargs)
 
+    @versioned(lambda slug=None, **kwargs: event_version(slug))
     def retrieve(self, request, *args, **kwargs):
         """
-        Retrieve a single Event instance by slug.
+        Retrieve a single Event instance by slug, with its tutorials.
+
+        The document is cached per slug, see ``EVENT_CACHE_TIMEOUT``.
         """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        return Response(
-            {
+        slug = kwargs[self.lookup_field]
+        version = event_version(slug)
+        document = get_event_document(slug, version)
+        if document is None:
+            instance = self.get_object()
+            serializer = self.get_serializer(instance)
+            document = {
                 **serializer.data,
                 "tutorials": TutorialReadOnlySerializer(
-                    instance.tutorials.all(), many=True
+                    instance.tutorials.with_subscriptions(), many=True
                 ).data,
             }
+            set_event_document(slug, version, document)
+        return Response(document)
+
+    @action(detail=True, methods=["post"])
+    def schedule(self, request, slug=None):
+        """
+        Check the subscription of an attendee in every tutorial of the event at once.
+        """
+        cpf = request.data.get("cpf")
+
+        if not cpf or len(cpf) != 11 or not cpf.isdigit():
+            return Response(
+                {"error": _("Correct cpf is required")},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        event = self.get_object()
+        return Response({"tutorials": event.attendee_schedule(cpf)})
+
+    @action(detail=True, methods=["get"], permission_classes=[IsAdminUser])
+    def certificates(self, request, slug=None):
+        """
+        Download the generated certificates of every tutorial of the event.
+        """
+        event = self.get_object()
+        return certificates_bundle(
+            request,
+            Registration.objects.filter(tutorial__event=event),
+            f"certificados-{event.slug}",
         )
 
 
@@ -123,7 +355,33 @@ class TutorialViewSet(viewsets.ReadOnlyModelViewSet):
 
     queryset = Tutorial.objects.all()
     serializer_class = TutorialReadOnlySerializer
+    throttle_classes = [RegistrationThrottle]
+
+    @versioned(lambda **kwargs: event_version())
+    def list(self, request, *args, **kwargs):
+        """
+        List the tutorials of every event.
+        """
+        return super().list(request, *args, **kwargs)
+
+    @versioned(tutorial_event_version)
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Retrieve a single Tutorial instance.
+        """
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_queryset(self):
+        """
+        Annotate the confirmed registrations and prefetch the instructors of the
+        serialized tutorials.
+        """
+        queryset = super().get_queryset()
+        if self.action in ("list", "retrieve"):
+            queryset = queryset.with_subscriptions()
+        return queryset
 
+    @idempotent
     @transaction.atomic
     @action(detail=False, methods=["post"])
     def confirm_subscription(self, request):
@@ -147,9 +405,7 @@ class TutorialViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        if registration.tutorial.has_slots_available:
-            registration.confirmed = True
-            registration.save()
+        registration.confirm()
 
         return Response(
             {
@@ -160,6 +416,7 @@ class TutorialViewSet(viewsets.ReadOnlyModelViewSet):
             }
         )
 
+    @idempotent
     @transaction.atomic
     @action(detail=True, methods=["post"])
     def subscribe(self, request, pk=None):
@@ -186,6 +443,9 @@ class TutorialViewSet(viewsets.ReadOnlyModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
+        if settings.REGISTRATION_ADMISSION_QUEUE:
+            return queue_subscription(pk, cpf, name, email, birthday)
+
         attendee, created = Attendee.objects.get_or_create(cpf=cpf)
 
         if created and (not name or not email or not birthday):
@@ -212,6 +472,29 @@ class TutorialViewSet(viewsets.ReadOnlyModelViewSet):
         except ValueError as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=["get"], url_path="subscription/(?P<ticket>[^/.]+)")
+    def subscription(self, request, ticket=None):
+        """
+        Check the outcome of a subscription put in the admission queue.
+        """
+        try:
+            uuid.UUID(ticket)
+        except ValueError:
+            return Response(
+                {"error": _("Invalid UUID")}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            subscription_request = SubscriptionRequest.objects.get(ticket=ticket)
+        except SubscriptionRequest.DoesNotExist:
+            return Response(
+                {"error": _("Subscription request not found")},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        return subscription_request_response(subscription_request)
+
+    @idempotent
     @transaction.atomic
     @action(detail=True, methods=["post"])
     def unsubscribe(self, request, pk=None):
@@ -292,10 +575,25 @@ class TutorialViewSet(viewsets.ReadOnlyModelViewSet):
                 {"subscribed": False, "available": attendee.is_available_for(tutorial)}
             )
 
+    @action(detail=True, methods=["get"], permission_classes=[IsAdminUser])
+    def certificates(self, request, pk=None):
+        """
+        Download the generated certificates of the tutorial.
+        """
+        tutorial = self.get_object()
+        return certificates_bundle(
+            request,
+            tutorial.registrations.all(),
+            f"certificados-{slugify(tutorial.title)}",
+        )
+
     @action(detail=False, methods=["get"], url_path="certificate/(?P<uuid>[^/.]+)")
     def certificate(self, request, uuid=None):
         """
         Download the attendee's certificate for a tutorial if generated.
+
+        With ``CERTIFICATE_ON_DEMAND`` enabled, certificates not generated yet are generated for eligible
+        registrations before the download.
         """
         if not uuid:
             return Response(
@@ -309,6 +607,28 @@ class TutorialViewSet(viewsets.ReadOnlyModelViewSet):
                 {"error": _("Registration not found")}, status=status.HTTP_404_NOT_FOUND
             )
 
+        if not registration.certificate_generated and settings.CERTIFICATE_ON_DEMAND:
+            try:
+                registration = registration.ensure_certificate()
+            except ValueError:
+                pass
+            except RenderCapacityError:
+                return Response(
+                    {
+                        "error": _(
+                            "Too many certificates being generated, try again later"
+                        )
+                    },
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={
+                        "Retry-After": str(settings.CERTIFICATE_ON_DEMAND_TIMEOUT)
+                    },
+                )
+            except RuntimeError as e:
+                return Response(
+                    {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+
         if not registration.certificate_generated:
             return Response(
                 {"error": _("Certificate not generated yet")},
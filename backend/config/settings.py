@@ -169,12 +169,79 @@ EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD", default="my_pass")
 EMAIL_USE_TLS = config("EMAIL_USE_TLS", default=True, cast=bool)
 DEFAULT_FROM_EMAIL = f"Pyaba 🐟 <{config('DEFAULT_FROM_EMAIL', default='noreply@mail.com')}>"
 
+# Emails queued in the outbox, delivered by the "send_emails" command
+EMAIL_OUTBOX_MAX_ATTEMPTS = config("EMAIL_OUTBOX_MAX_ATTEMPTS", default=5, cast=int)
+EMAIL_OUTBOX_RETRY_DELAY = config("EMAIL_OUTBOX_RETRY_DELAY", default=60, cast=int)
+EMAIL_OUTBOX_MAX_RETRY_DELAY = config("EMAIL_OUTBOX_MAX_RETRY_DELAY", default=3600, cast=int)
+EMAIL_OUTBOX_POLL_INTERVAL = config("EMAIL_OUTBOX_POLL_INTERVAL", default=5, cast=int)
+EMAIL_POOL_SIZE = config("EMAIL_POOL_SIZE", default=4, cast=int)
+EMAIL_RATE_LIMIT = config("EMAIL_RATE_LIMIT", default=10, cast=float)
+
+# Subscriptions answered with a queue ticket, processed by the "process_subscriptions" command
+REGISTRATION_ADMISSION_QUEUE = config("REGISTRATION_ADMISSION_QUEUE", default=False, cast=bool)
+REGISTRATION_QUEUE_BATCH_SIZE = config("REGISTRATION_QUEUE_BATCH_SIZE", default=50, cast=int)
+REGISTRATION_QUEUE_POLL_INTERVAL = config("REGISTRATION_QUEUE_POLL_INTERVAL", default=1, cast=float)
+REGISTRATION_QUEUE_RETRY_AFTER = config("REGISTRATION_QUEUE_RETRY_AFTER", default=2, cast=int)
+
+# Seconds during which a request repeated with the same Idempotency-Key header gets the stored response back
+IDEMPOTENCY_KEY_WINDOW = config("IDEMPOTENCY_KEY_WINDOW", default=86400, cast=int)
+# Seconds after which a key whose first request never answered may be used again
+IDEMPOTENCY_KEY_LOCK_TIMEOUT = config("IDEMPOTENCY_KEY_LOCK_TIMEOUT", default=60, cast=int)
+
 SITE_URL = config("SITE_URL", default="http://localhost:9000")
 
 CSRF_TRUSTED_ORIGINS = config("CSRF_TRUSTED_ORIGINS", default="http://localhost", cast=Csv())
 
+# Certificates
+CHROMEDRIVER_PATH = config("CHROMEDRIVER_PATH", default="")
+CHROME_PATH = config("CHROME_PATH", default="")
+CERTIFICATE_RENDERER = config("CERTIFICATE_RENDERER", default="selenium")
+CERTIFICATE_RENDERER_TABS = config("CERTIFICATE_RENDERER_TABS", default=4, cast=int)
+CERTIFICATE_BROWSER_POOL_SIZE = config("CERTIFICATE_BROWSER_POOL_SIZE", default=2, cast=int)
+CERTIFICATE_BROWSER_MAX_RENDERS = config("CERTIFICATE_BROWSER_MAX_RENDERS", default=200, cast=int)
+CERTIFICATE_BROWSER_MAX_MEMORY_MB = config("CERTIFICATE_BROWSER_MAX_MEMORY_MB", default=1024, cast=int)
+CERTIFICATE_ASSET_TIMEOUT = config("CERTIFICATE_ASSET_TIMEOUT", default=10, cast=int)
+CERTIFICATE_ASSET_MAX_KB = config("CERTIFICATE_ASSET_MAX_KB", default=5120, cast=int)
+CERTIFICATE_TEMPLATE_CACHE_SIZE = config("CERTIFICATE_TEMPLATE_CACHE_SIZE", default=32, cast=int)
+CERTIFICATE_BACKGROUND_CACHE_SIZE = config("CERTIFICATE_BACKGROUND_CACHE_SIZE", default=16, cast=int)
+CERTIFICATE_EMAIL_ATTACHMENT_MAX_KB = config("CERTIFICATE_EMAIL_ATTACHMENT_MAX_KB", default=1024, cast=int)
+CERTIFICATE_ON_DEMAND = config("CERTIFICATE_ON_DEMAND", default=False, cast=bool)
+CERTIFICATE_ON_DEMAND_MAX_RENDERS = config("CERTIFICATE_ON_DEMAND_MAX_RENDERS", default=2, cast=int)
+CERTIFICATE_ON_DEMAND_TIMEOUT = config("CERTIFICATE_ON_DEMAND_TIMEOUT", default=30, cast=int)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Shared by every gunicorn worker, holds the throttle buckets of the registration endpoints
+    "throttle": {
+        "BACKEND": config("THROTTLE_CACHE_BACKEND", default="django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": config("THROTTLE_CACHE_LOCATION", default="") or str(STORAGE_BASE_DIR / "cache" / "throttle"),
+    },
+    # Shared by every gunicorn worker, holds the event detail documents
+    "events": {
+        "BACKEND": config("EVENT_CACHE_BACKEND", default="django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": config("EVENT_CACHE_LOCATION", default="") or str(STORAGE_BASE_DIR / "cache" / "events"),
+    },
+}
+
+# Seconds an event detail document (with the tutorial vacancies) may be served from the cache, 0 disables it
+EVENT_CACHE_TIMEOUT = config("EVENT_CACHE_TIMEOUT", default=10, cast=int)
+
+# Token bucket limits of the registration endpoints, per client IP and per CPF ("requests/period", empty disables)
+REGISTRATION_THROTTLE_RATES = {
+    "subscribe": config("THROTTLE_SUBSCRIBE", default="ip=60/min,cpf=5/min"),
+    "unsubscribe": config("THROTTLE_UNSUBSCRIBE", default="ip=30/min,cpf=5/min"),
+    "check_subscription": config("THROTTLE_CHECK_SUBSCRIPTION", default="ip=120/min,cpf=20/min"),
+    "schedule": config("THROTTLE_SCHEDULE", default="ip=120/min,cpf=20/min"),
+    "confirm_subscription": config("THROTTLE_CONFIRM_SUBSCRIPTION", default="ip=30/min"),
+}
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.BasicAuthentication",
-    ]
+    ],
+    # Number of reverse proxies in front of the app whose X-Forwarded-For is trusted to tell the client IP used by
+    # the throttles; with 0 the connection address is used and the header is ignored, as clients can forge it
+    "NUM_PROXIES": config("NUM_PROXIES", default=0, cast=int),
 }
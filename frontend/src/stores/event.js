@@ -8,6 +8,8 @@ export const useEventStore = defineStore('event', {
     tutorialsLoading: true,
     events: [],
     selectedEvent: null,
+    // Situação do participante em todos os tutoriais do evento, por "slug:cpf", buscada uma só vez
+    schedules: {},
     loadingMessages: [
       // Mensagens de loading geradas carinhosamente pelo chat gpt 🤣
       "🥹 É lento, mas é honesto...",
@@ -96,19 +98,56 @@ export const useEventStore = defineStore('event', {
     fetchEventBySlug(slug) {
       return api.get(`/events/${slug}`)  
     },
-    checkSubscription(tutorialId, cpf) {
-      return api.post(`/tutorials/check_subscription/`, {
-        cpf: cpf,
-        tutorial_id: tutorialId
-      })
+    fetchSchedule(slug, cpf) {
+      const key = `${slug}:${cpf}`
+      if (!this.schedules[key]) {
+        this.schedules[key] = api.post(`/events/${slug}/schedule/`, { cpf })
+          .then(response => response.data.tutorials)
+          .catch(error => {
+            delete this.schedules[key]
+            throw error
+          })
+      }
+      return this.schedules[key]
+    },
+    forgetSchedules(cpf) {
+      Object.keys(this.schedules)
+        .filter(key => !cpf || key.endsWith(`:${cpf}`))
+        .forEach(key => delete this.schedules[key])
+    },
+    async checkSubscription(tutorialId, cpf) {
+      const slug = this.selectedEvent?.slug
+      if (!slug) {
+        return api.post(`/tutorials/check_subscription/`, {
+          cpf: cpf,
+          tutorial_id: tutorialId
+        })
+      }
+      // Uma só requisição traz a situação do participante em todos os tutoriais do evento; os outros
+      // formulários do mesmo CPF usam a resposta guardada. Participante novo vem sem "available".
+      const tutorials = await this.fetchSchedule(slug, cpf)
+      return { data: tutorials.find(tutorial => tutorial.tutorial_id === tutorialId) || { subscribed: false } }
     },
-    subscribe(tutorialId, attendeeData) {
-      return api.post(`/tutorials/${tutorialId}/subscribe/`, attendeeData)
+    async subscribe(tutorialId, attendeeData) {
+      this.forgetSchedules(attendeeData.cpf)
+      let response = await api.post(`/tutorials/${tutorialId}/subscribe/`, attendeeData)
+      // Com a fila de admissão ligada, a inscrição recebe uma senha e é feita depois: consulta até sair da fila
+      while (response.data.status === 'queued') {
+        const seconds = Number(response.headers['retry-after']) || 2
+        await new Promise(resolve => setTimeout(resolve, seconds * 1000))
+        response = await api.get(`/tutorials/subscription/${response.data.ticket}/`)
+      }
+      if (response.data.status === 'rejected') {
+        throw { response }
+      }
+      return response
     },
     unsubscribe(tutorialId, cpf) {
+      this.forgetSchedules(cpf)
       return api.post(`/tutorials/${tutorialId}/unsubscribe/`, { cpf })
     },
     confirmSubscription(uuid) {
+      this.forgetSchedules()
       return api.post(`/tutorials/confirm_subscription/`, { uuid })
     }
   }